@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Встраиваемый API looper: декомпозиция, сценарии и воспроизведение из кода Python.
+
+    from api import Looper
+
+    looper = Looper()
+    looper.decompose('open_notepad')
+    with looper.session() as session:
+        result = session.play('open_notepad', dynamic=True)
+        if not result.success:
+            for step in result.failed_actions:
+                print(step.index, step.name, step.error)
+
+В отличие от CLI (looper.py) функции API не печатают итог и не вызывают
+sys.exit: ошибки - исключения LooperError, итог воспроизведения -
+results.PlaybackResult со статусом, временем и совпадениями каждого действия.
+Состояние воспроизведения (ESC, stop(), слушатель клавиатуры, кэш
+подготовленных сценариев) принадлежит сеансу, а не модулю: несколько
+сеансов в одном процессе не мешают друг другу (экран и ввод у них все же
+общие, поэтому одновременно воспроизводить стоит только в одном).
+"""
+
+import json
+
+from config import get_config
+from results import PLAYBACK_COMPLETED, PLAYBACK_ERROR
+from scenario_cut import CutSpecError
+from scenario_flow import FlowError
+from scenario_plan import PlanError, ScenarioCache
+
+
+class LooperError(Exception):
+    """Базовое исключение API"""
+
+
+class ActionNotFoundError(LooperError):
+    """Нет папки действия или его записи"""
+
+
+class ScenarioError(LooperError):
+    """Сценарий не найден, не создан или не прошел проверку"""
+
+
+class DecomposeError(LooperError):
+    """Декомпозиция записи не удалась"""
+
+
+class PlaybackError(LooperError):
+    """Воспроизведение прервано ошибкой или не завершено при check=True; итог - в result"""
+
+    def __init__(self, result):
+        self.result = result
+        reason = result.error or result.status
+        super().__init__(f"Воспроизведение '{result.action_name}' не завершено: {reason}")
+
+
+def _check_action(action_name):
+    action_dir = get_config().get_action_path(action_name)
+    if not action_dir.exists():
+        raise ActionNotFoundError(f"Действие '{action_name}' не найдено: {action_dir}")
+    return action_dir
+
+
+class Session:
+    """Сеанс воспроизведения: несколько запусков подряд с общими кэшами.
+
+    start_delay - пауза перед каждым запуском (0 - только проверка готовности
+    экрана и ввода). listen_keyboard - прерывать воспроизведение по ESC
+    (иначе - только stop() из другого потока).
+    """
+
+    def __init__(self, start_delay=0, listen_keyboard=True):
+        from play import PlaybackControl
+
+        self.start_delay = start_delay
+        self.listen_keyboard = listen_keyboard
+        self.control = PlaybackControl()
+        self.scenarios = ScenarioCache()
+        self.closed = False
+
+    def play(self, action_name, scenario=None, dynamic=False, wait_for_target=None, delay=None,
+             typing_params=None, sleep_time=3, cut_mode=False, record_actions=True, check=False):
+        """Воспроизводит действие или его сценарий и возвращает PlaybackResult.
+
+        Параметры - как у looper -p: scenario (-f), delay, typing_params,
+        sleep_time. cut_mode - остановка по F1 (статус 'cut', last_index).
+        check=True - бросить PlaybackError, если воспроизведение не завершено.
+        Любая ошибка до первого действия - ActionNotFoundError или ScenarioError;
+        исключение после начала воспроизведения - всегда PlaybackError с
+        частичным результатом (статус 'error').
+        """
+        import play
+
+        if self.closed:
+            raise LooperError("Сеанс закрыт")
+        _check_action(action_name)
+        from playlist import prepare_play_scenario
+        try:
+            actions_file = prepare_play_scenario(action_name, scenario, delay, typing_params, sleep_time)
+        except FileNotFoundError as e:
+            raise ActionNotFoundError(str(e)) from e
+        except Exception as e:
+            raise ScenarioError(f"Ошибка при создании сценария: {e}") from e
+
+        if self.listen_keyboard:
+            self.control.start_listener()
+        try:
+            result = play.run_playback(action_name, actions_file, dynamic, cut_mode, wait_for_target,
+                                       start_delay=self.start_delay, scenarios=self.scenarios,
+                                       control=self.control, record_actions=record_actions)
+        except FileNotFoundError as e:
+            raise ScenarioError(f"Файл не найден: {e.filename or e}") from e
+        except json.JSONDecodeError as e:
+            raise ScenarioError(f"Ошибка декодирования JSON: {e}") from e
+        except (PlanError, FlowError) as e:
+            raise ScenarioError(str(e)) from e
+        except Exception as e:
+            # run_playback бросает исключения только до первого действия (ошибки
+            # после начала - в статусе результата): неподдерживаемый или
+            # поврежденный файл сценария, ошибка кэша плана, загрузки шаблонов
+            raise ScenarioError(f"Ошибка подготовки сценария: {e}") from e
+        if result.status == PLAYBACK_ERROR:
+            raise PlaybackError(result) from result.exception
+        if check and result.status != PLAYBACK_COMPLETED:
+            raise PlaybackError(result)
+        return result
+
+    def stop(self):
+        """Прерывает текущее воспроизведение (можно вызывать из другого потока)"""
+        self.control.stop()
+
+    def close(self):
+        self.control.stop()
+        self.control.stop_listener()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Looper:
+    """Точка входа API: действия в ACTION_FOLDER из looper.config"""
+
+    def __init__(self):
+        self.config = get_config()
+
+    def session(self, start_delay=0, listen_keyboard=True):
+        """Новый сеанс воспроизведения (см. Session)"""
+        return Session(start_delay, listen_keyboard)
+
+    def play(self, action_name, **kwargs):
+        """Одно воспроизведение в отдельном сеансе; параметры - как у Session.play"""
+        with self.session() as session:
+            return session.play(action_name, **kwargs)
+
+    def decompose(self, action_name, force=False):
+        """Декомпозиция записи на базовые действия (по кэшу, как looper -d).
+
+        Возвращает путь к actions_base.json.
+        """
+        from decomposer import decompose_action
+
+        _check_action(action_name)
+        log_file = self.config.get_log_file_path(action_name)
+        if not log_file.exists():
+            raise ActionNotFoundError(f"Файл лога '{log_file}' не найден")
+        try:
+            success = decompose_action(action_name, force)
+        except Exception as e:
+            raise DecomposeError(f"Ошибка при декомпозиции: {e}") from e
+        if not success:
+            raise DecomposeError(f"Декомпозиция '{action_name}' не удалась")
+        return self.config.get_actions_base_file_path(action_name)
+
+    def create_scenario(self, action_name, output_name, delay=None, typing_params=None, sleep_time=3,
+                        cut=None, source_name=None, expand=False):
+        """Создает сценарий (как looper -s) и возвращает путь к его файлу.
+
+        cut - спецификация отрезков для обрезки без воспроизведения (см.
+        scenario_cut); source_name - сценарий-источник для нее. Интерактивная
+        обрезка по F1 - Session.play(..., cut_mode=True).
+        """
+        from scenario_creator import ScenarioCreator
+
+        _check_action(action_name)
+        try:
+            creator = ScenarioCreator(action_name)
+            if cut:
+                creator.create_offline_cut_scenario(output_name, cut, source_name)
+            else:
+                creator.create_complex_scenario(
+                    output_name=output_name,
+                    delay=delay,
+                    typing_params_file=self.config.get_get_typing_parameters_file_path(action_name,
+                                                                                       typing_params),
+                    sleep_time=sleep_time,
+                    expand=expand,
+                )
+        except FileNotFoundError as e:
+            raise ActionNotFoundError(str(e)) from e
+        except CutSpecError as e:
+            raise ScenarioError(f"Неверная спецификация обрезки: {e}") from e
+        except Exception as e:
+            raise ScenarioError(f"Ошибка при создании сценария: {e}") from e
+        return self.config.get_scenario_file_path(action_name, output_name)
+
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Сборка ресурсов действий: референсные прямоугольники *_rr.png.
+
+Для каждого клика со скриншотом вырезается прямоугольник 50x50 вокруг
+записанной точки клика. Каждый скриншот загружается один раз, даже если из
+него нужно несколько вырезок; вырезки новее своего скриншота не
+пересоздаются. Скриншоты обрабатываются параллельно в пуле процессов.
+
+Координаты клика переводятся в координаты скриншота по границам
+виртуального экрана из заголовка log.jsonl (границы на момент записи);
+если их нет - по текущим границам экрана.
+
+Запуск для всех действий ACTION_FOLDER:
+    python assets.py [ACTION_NAME ...] [--force] [--workers N]
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+
+from config import get_config
+from event_log import read_header
+from scenario_format import load_scenario
+
+RR_SIZE = 50  # сторона референсного прямоугольника
+# Меньше скриншотов обрабатывается в текущем процессе: запуск пула дороже
+MIN_POOL_JOBS = 4
+
+
+def get_rr_path(action_dir, screen_file):
+    """Путь к референсному прямоугольнику: 1.png -> 1_rr.png"""
+    return Path(action_dir) / screen_file.replace('.png', '_rr.png')
+
+
+def get_recording_bounds(action_dir):
+    """Границы виртуального экрана на момент записи (из заголовка лога) или текущие"""
+    log_file = Path(action_dir) / "log.jsonl"
+    if log_file.exists():
+        header = read_header(log_file)
+        if header and header.get('screen_bounds'):
+            return header['screen_bounds']
+    import mouse_clicker as mc
+    return mc.get_virtual_screen_bounds()
+
+
+def collect_crop_jobs(actions, action_dir, bounds=None, force=False):
+    """Группирует нужные вырезки по скриншотам: {путь к скриншоту: [(путь rr, (x, y)), ...]}.
+
+    Вырезки, которые новее своего скриншота, пропускаются (кроме force).
+    """
+    action_dir = Path(action_dir)
+    jobs = {}
+    targets = {}
+    for action in actions:
+        if action.get('name') not in ['click left', 'click right'] or not action.get('screen'):
+            continue
+        screen_path = action_dir / action['screen']
+        rr_path = get_rr_path(action_dir, action['screen'])
+        # Несколько кликов с одним скриншотом пишут один rr - как раньше, побеждает последний
+        targets[rr_path] = (screen_path, action.get('x', 0), action.get('y', 0))
+
+    for rr_path, (screen_path, x, y) in targets.items():
+        if not force and rr_path.exists() and screen_path.exists() \
+                and rr_path.stat().st_mtime >= screen_path.stat().st_mtime:
+            continue
+        if bounds is None:
+            bounds = get_recording_bounds(action_dir)
+        center = (int(x - bounds['min_x']), int(y - bounds['min_y']))
+        jobs.setdefault(screen_path, []).append((rr_path, center))
+    return jobs
+
+
+def crop_screen(screen_path, crops, size=RR_SIZE):
+    """Вырезает из одного скриншота все прямоугольники crops [(путь rr, (x, y)), ...].
+
+    Возвращает (список созданных файлов, список ошибок).
+    """
+    image = cv2.imread(str(screen_path), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return [], [f"Исходное изображение не найдено: {screen_path}"]
+
+    created = []
+    errors = []
+    half_size = size // 2
+    height, width = image.shape[:2]
+    for rr_path, (x, y) in crops:
+        left = max(0, x - half_size)
+        top = max(0, y - half_size)
+        right = min(width, x + half_size)
+        bottom = min(height, y + half_size)
+        if right <= left or bottom <= top:
+            errors.append(f"Точка клика ({x}, {y}) вне скриншота {screen_path}")
+            continue
+        try:
+            if cv2.imwrite(str(rr_path), image[top:bottom, left:right]):
+                created.append(rr_path)
+            else:
+                errors.append(f"Не удалось сохранить {rr_path}")
+        except cv2.error as e:
+            errors.append(f"Ошибка при создании {rr_path}: {e}")
+    return created, errors
+
+
+def _crop_job(args):
+    return crop_screen(*args)
+
+
+def build_reference_rectangles(actions, action_dir, bounds=None, force=False, workers=None):
+    """Создает недостающие и устаревшие *_rr.png для кликов из actions.
+
+    workers - число процессов (None - ASSET_WORKERS из конфигурации).
+    Возвращает (создано, пропущено, ошибок).
+    """
+    jobs = collect_crop_jobs(actions, action_dir, bounds, force)
+    clicks = {get_rr_path(action_dir, a['screen']) for a in actions
+              if a.get('name') in ['click left', 'click right'] and a.get('screen')}
+    to_create = sum(len(crops) for crops in jobs.values())
+    skipped = len(clicks) - to_create
+    if not jobs:
+        return 0, skipped, 0
+
+    if workers is None:
+        workers = get_config().get_asset_workers()
+    workers = min(workers, len(jobs))
+
+    items = [(screen_path, crops) for screen_path, crops in jobs.items()]
+    if workers > 1 and len(items) >= MIN_POOL_JOBS:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_crop_job, items))
+    else:
+        results = [crop_screen(screen_path, crops) for screen_path, crops in items]
+
+    created = 0
+    errors = 0
+    for paths, messages in results:
+        created += len(paths)
+        errors += len(messages)
+        for message in messages:
+            print(message)
+    return created, skipped, errors
+
+
+def load_action_clicks(action_name):
+    """Действия, по которым строятся ресурсы: базовые действия действия"""
+    actions_file = get_config().get_actions_base_file_path(action_name)
+    if not actions_file.exists():
+        return None
+    return load_scenario(actions_file)
+
+
+def build_action_assets(action_name, force=False, workers=None):
+    """Собирает ресурсы одного действия. Возвращает (создано, пропущено, ошибок) или None"""
+    actions = load_action_clicks(action_name)
+    if actions is None:
+        print(f"{action_name}: нет actions_base.json, пропускаем")
+        return None
+    action_dir = get_config().get_action_path(action_name)
+    result = build_reference_rectangles(actions, action_dir, force=force, workers=workers)
+    created, skipped, errors = result
+    print(f"{action_name}: создано {created}, актуальных {skipped}, ошибок {errors}")
+    return result
+
+
+def build_all_assets(action_names=None, force=False, workers=None):
+    """Собирает ресурсы для действий action_names (по умолчанию - всех в ACTION_FOLDER).
+
+    Возвращает число ошибок.
+    """
+    action_folder = get_config().get_action_folder()
+    if not action_names:
+        if not action_folder.exists():
+            print(f"Папка действий не найдена: {action_folder}")
+            return 1
+        action_names = sorted(d.name for d in action_folder.iterdir() if d.is_dir())
+
+    errors = 0
+    for action_name in action_names:
+        result = build_action_assets(action_name, force, workers)
+        if result is not None:
+            errors += result[2]
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка референсных прямоугольников *_rr.png")
+    parser.add_argument('actions', nargs='*', metavar='ACTION_NAME',
+                        help='Действия (по умолчанию - все в ACTION_FOLDER)')
+    parser.add_argument('--force', action='store_true', help='Пересоздать все вырезки')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Число процессов (по умолчанию ASSET_WORKERS из конфигурации)')
+    args = parser.parse_args()
+    sys.exit(1 if build_all_assets(args.actions, args.force, args.workers) else 0)
+
+
+if __name__ == "__main__":
+    main()
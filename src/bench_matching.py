@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк движков поиска шаблонов на записанных скриншотах действия.
+
+Для каждого клика со скриншотом ищет его референсный прямоугольник (*_rr.png)
+на исходном скриншоте полным перебором и пирамидальным движком, сравнивает
+найденные позиции и время поиска.
+
+Использование: python bench_matching.py <имя_действия> [--levels 2] [--repeat 5]
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+
+from config import get_config
+from event_log import iter_events
+import matching
+
+
+def load_click_actions(action_name):
+    """Возвращает клики со скриншотами из actions_base.json (или журнала записи)"""
+    cfg = get_config()
+    actions_file = cfg.get_actions_base_file_path(action_name)
+    if not actions_file.exists():
+        actions_file = cfg.get_log_file_path(action_name)
+
+    clicks = []
+    for action in iter_events(actions_file):
+        is_click = action.get('name') in ['click left', 'click right'] or \
+            (action.get('source') == 'mouse' and action.get('dir') == 'down')
+        if is_click and action.get('screen'):
+            clicks.append(action)
+    return clicks
+
+
+def load_template(action_dir, action, offset):
+    """Загружает *_rr.png или вырезает 50x50 из скриншота по записанным координатам"""
+    screen_file = action['screen']
+    rr_path = action_dir / screen_file.replace('.png', '_rr.png')
+    if rr_path.exists():
+        return cv2.imread(str(rr_path), cv2.IMREAD_COLOR)
+
+    screen = cv2.imread(str(action_dir / screen_file), cv2.IMREAD_COLOR)
+    if screen is None:
+        return None
+    x = action.get('x', 0) - offset[0]
+    y = action.get('y', 0) - offset[1]
+    return screen[max(0, y - 25):y + 25, max(0, x - 25):x + 25].copy()
+
+
+def timed(func, repeat):
+    """Выполняет func repeat раз, возвращает (результат, среднее время в мс)"""
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def run_benchmark(action_name, levels, repeat, threshold, offset):
+    cfg = get_config()
+    action_dir = cfg.get_action_path(action_name)
+    clicks = load_click_actions(action_name)
+    if not clicks:
+        print(f"Клики со скриншотами для действия '{action_name}' не найдены")
+        return False
+
+    same = 0
+    ties = 0
+    total = 0
+    time_exhaustive = 0.0
+    time_pyramid = 0.0
+
+    print(f"{'скриншот':<12} {'exhaustive':>22} {'pyramid':>22} {'мс (exh/pyr)':>16}")
+    for action in clicks:
+        screen = cv2.imread(str(action_dir / action['screen']), cv2.IMREAD_COLOR)
+        template = load_template(action_dir, action, offset)
+        if screen is None or template is None or template.size == 0:
+            print(f"{action['screen']:<12} пропущен (нет изображения)")
+            continue
+
+        pyramid = matching.build_pyramid(template, levels)
+        (val_e, loc_e), ms_e = timed(lambda: matching.match_exhaustive(screen, template), repeat)
+        (val_p, loc_p), ms_p = timed(lambda: matching.match_pyramid(screen, pyramid, threshold), repeat)
+
+        total += 1
+        time_exhaustive += ms_e
+        time_pyramid += ms_p
+        if tuple(loc_e) == tuple(loc_p):
+            same += 1
+            mark = ""
+        elif abs(val_e - val_p) < 1e-4:
+            # Шаблон неоднозначен: обе позиции дают одинаковое совпадение
+            ties += 1
+            mark = "  (равноценная позиция)"
+        else:
+            mark = "  <-- расхождение"
+        print(f"{action['screen']:<12} {str(tuple(loc_e)):>14} {val_e:.3f} {str(tuple(loc_p)):>14} {val_p:.3f} "
+              f"{ms_e:>7.1f}/{ms_p:<7.1f}{mark}")
+
+    if total == 0:
+        return False
+
+    print()
+    print(f"Совпадение позиций: {same}/{total}, равноценных (неоднозначный шаблон): {ties}, "
+          f"расхождений: {total - same - ties}")
+    print(f"Среднее время: exhaustive {time_exhaustive / total:.1f} мс, pyramid {time_pyramid / total:.1f} мс "
+          f"(ускорение x{time_exhaustive / max(time_pyramid, 1e-9):.1f})")
+    return same + ties == total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение движков поиска шаблонов на записанных скриншотах")
+    parser.add_argument('action_name', help='Имя действия')
+    parser.add_argument('--levels', type=int, default=get_config().get_pyramid_levels(),
+                        help='Количество уровней пирамиды')
+    parser.add_argument('--repeat', type=int, default=5, help='Количество повторов для замера времени')
+    parser.add_argument('--threshold', type=float, default=0.9, help='Порог совпадения')
+    parser.add_argument('--offset', type=int, nargs=2, default=[0, 0], metavar=('MIN_X', 'MIN_Y'),
+                        help='Начало виртуального экрана при записи (если *_rr.png еще не созданы)')
+    args = parser.parse_args()
+
+    ok = run_benchmark(args.action_name, args.levels, args.repeat, args.threshold, args.offset)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
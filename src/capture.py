@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Источники кадров экрана для записи и воспроизведения.
+
+Все источники возвращают кадры в виде BGR ndarray в координатах виртуального
+экрана: (0, 0) - левый верхний угол области, охватывающей все мониторы.
+Регион задается как (left, top, right, bottom) в тех же координатах.
+"""
+
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import get_config
+
+# Попытка импорта PIL для захвата через ImageGrab
+try:
+    from PIL import ImageGrab
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# mss (необязательная зависимость) умеет захватывать только нужный регион
+try:
+    import mss
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+
+class CaptureBackend:
+    """Базовый класс источника кадров"""
+
+    def __init__(self):
+        # Буферы кадров свои у каждого потока: захват идет и из фонового поиска
+        self._local = threading.local()
+
+    def size(self):
+        """Возвращает (ширина, высота) виртуального экрана"""
+        raise NotImplementedError
+
+    def monitors(self):
+        """Возвращает список регионов мониторов [(left, top, right, bottom), ...]"""
+        width, height = self.size()
+        return [(0, 0, width, height)]
+
+    def grab(self, region=None, monitor=None, reuse_buffer=True):
+        """Захватывает кадр целиком, регион region или монитор с индексом monitor.
+
+        При reuse_buffer=True кадр пишется в заранее выделенный буфер потока и
+        перезаписывается следующим захватом; для хранения кадра передайте False.
+        """
+        if monitor is not None:
+            region = self.monitors()[monitor]
+        region = self._clip_region(region)
+        return self._grab(region, reuse_buffer)
+
+    def _grab(self, region, reuse_buffer):
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождает ресурсы источника"""
+        return
+
+    def _clip_region(self, region):
+        width, height = self.size()
+        if region is None:
+            return (0, 0, width, height)
+        left, top, right, bottom = region
+        return (max(0, left), max(0, top), min(width, right), min(height, bottom))
+
+    def _buffer(self, shape):
+        """Возвращает буфер потока нужного размера (выделяется заново только при смене размера)"""
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(shape)
+        if buffer is None:
+            buffer = buffers[shape] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _output(self, shape, reuse_buffer):
+        return self._buffer(shape) if reuse_buffer else np.empty(shape, dtype=np.uint8)
+
+
+class ImageGrabBackend(CaptureBackend):
+    """Захват через PIL.ImageGrab (весь виртуальный экран, регион вырезается после захвата)"""
+
+    def size(self):
+        # Размер виртуального экрана берем из WinAPI, без захвата кадра
+        import mouse_clicker as mc
+        bounds = mc.get_virtual_screen_bounds()
+        return (bounds['max_x'] - bounds['min_x'] + 1, bounds['max_y'] - bounds['min_y'] + 1)
+
+    def monitors(self):
+        try:
+            import win32api
+            import mouse_clicker as mc
+            bounds = mc.get_virtual_screen_bounds()
+            return [
+                (left - bounds['min_x'], top - bounds['min_y'], right - bounds['min_x'], bottom - bounds['min_y'])
+                for _, _, (left, top, right, bottom) in win32api.EnumDisplayMonitors()
+            ]
+        except Exception:
+            return super().monitors()
+
+    def grab(self, region=None, monitor=None, reuse_buffer=True):
+        if monitor is not None:
+            region = self.monitors()[monitor]
+        # Размер экрана известен только после захвата, поэтому обрезаем регион позже
+        return self._grab(region, reuse_buffer)
+
+    def _grab(self, region, reuse_buffer):
+        image = np.asarray(ImageGrab.grab(all_screens=True))
+        height, width = image.shape[:2]
+        if region is not None:
+            left, top, right, bottom = region
+            image = image[max(0, top):min(height, bottom), max(0, left):min(width, right)]
+        out = self._output(image.shape[:2] + (3,), reuse_buffer)
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=out)
+
+
+class MssBackend(CaptureBackend):
+    """Захват через mss: с экрана читается только запрошенный регион"""
+
+    def _sct(self):
+        # Объект mss нельзя использовать из разных потоков
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+        return sct
+
+    def _virtual(self):
+        return self._sct().monitors[0]
+
+    def size(self):
+        virtual = self._virtual()
+        return (virtual['width'], virtual['height'])
+
+    def monitors(self):
+        virtual = self._virtual()
+        return [
+            (m['left'] - virtual['left'], m['top'] - virtual['top'],
+             m['left'] - virtual['left'] + m['width'], m['top'] - virtual['top'] + m['height'])
+            for m in self._sct().monitors[1:]
+        ]
+
+    def _grab(self, region, reuse_buffer):
+        virtual = self._virtual()
+        left, top, right, bottom = region
+        shot = self._sct().grab({
+            'left': virtual['left'] + left,
+            'top': virtual['top'] + top,
+            'width': right - left,
+            'height': bottom - top,
+        })
+        out = self._output((bottom - top, right - left, 3), reuse_buffer)
+        return cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2BGR, dst=out)
+
+    def close(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class FrameSource(CaptureBackend):
+    """Источник заранее подготовленных кадров (для тестов и бенчмарков без дисплея).
+
+    frames - список BGR ndarray. Каждый вызов grab возвращает следующий кадр;
+    после последнего кадра источник начинает сначала (loop=True) или
+    продолжает отдавать последний кадр.
+    """
+
+    def __init__(self, frames, loop=True):
+        super().__init__()
+        if not frames:
+            raise ValueError("Источник кадров пуст")
+        self.frames = list(frames)
+        self.loop = loop
+        self.index = 0
+        self._lock = threading.Lock()
+
+    def _frame(self, index):
+        return self.frames[index]
+
+    def size(self):
+        height, width = self._frame(0).shape[:2]
+        return (width, height)
+
+    def _next_frame(self):
+        with self._lock:
+            frame = self._frame(self.index)
+            if self.index + 1 < len(self.frames):
+                self.index += 1
+            elif self.loop:
+                self.index = 0
+        return frame
+
+    def _grab(self, region, reuse_buffer):
+        left, top, right, bottom = region
+        view = self._next_frame()[top:bottom, left:right]
+        out = self._output(view.shape, reuse_buffer)
+        np.copyto(out, view)
+        return out
+
+
+class FileFrameSource(FrameSource):
+    """Источник кадров из файлов изображений (например, записанных скриншотов действия)"""
+
+    def __init__(self, paths, loop=True):
+        paths = [Path(p) for p in paths]
+        if len(paths) == 1 and paths[0].is_dir():
+            # Берем только полные скриншоты: 1.png, 2.png, ...
+            paths = sorted((p for p in paths[0].glob('*.png') if p.stem.isdigit()), key=lambda p: int(p.stem))
+        self._cache = {}
+        super().__init__(paths, loop)
+
+    def _frame(self, index):
+        frame = self._cache.get(index)
+        if frame is None:
+            frame = cv2.imread(str(self.frames[index]), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise IOError(f"Не удалось загрузить кадр: {self.frames[index]}")
+            self._cache = {index: frame}  # храним в памяти только текущий кадр
+        return frame
+
+
+def create_capture_backend(name=None):
+    """Создает источник кадров по имени: auto, mss, imagegrab или files:<папка>"""
+    name = get_config().get_capture_backend() if name is None else name
+    if name.startswith('files:'):
+        return FileFrameSource([name[len('files:'):]])
+    if name == 'mss' or (name == 'auto' and MSS_AVAILABLE):
+        if not MSS_AVAILABLE:
+            raise ImportError("Для CAPTURE_BACKEND = mss требуется установить mss: pip install mss")
+        return MssBackend()
+    if not PIL_AVAILABLE:
+        raise ImportError("Для захвата экрана требуется установить Pillow: pip install pillow")
+    return ImageGrabBackend()
+
+
+# Глобальный источник кадров
+_capture_backend = None
+
+
+def get_capture_backend():
+    """Возвращает глобальный источник кадров (создается при первом обращении)"""
+    global _capture_backend
+    if _capture_backend is None:
+        _capture_backend = create_capture_backend()
+    return _capture_backend
+
+
+def set_capture_backend(backend):
+    """Подменяет глобальный источник кадров (например, на FrameSource в тестах)"""
+    global _capture_backend
+    if _capture_backend is not None and _capture_backend is not backend:
+        _capture_backend.close()
+    _capture_backend = backend
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Каталог файлов действий: SQLite-индекс в ACTION_FOLDER (catalog.sqlite).
+
+Для каждого лога, actions_base.json и сценария хранятся размер, mtime,
+SHA-256 и число действий каждого типа. Запись обновляется, когда файл пишет
+looper (сохранение сценария, декомпозиция, рекордер), а при чтении
+сверяется с размером и mtime файла (у параметризованного сценария - и его
+CSV): устаревшая запись пересчитывается, поэтому ручные правки тоже учитываются. Список действий и сценариев строится
+по stat() файлов без разбора JSON.
+
+Каталог - только кэш: его можно удалить, он будет построен заново.
+"""
+
+import hashlib
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from config import get_config
+from event_log import iter_events
+from scenario_binary import BINARY_SUFFIX, BinaryScenario
+from scenario_format import ParameterizedScenario, count_actions, file_state, load_scenario
+
+CATALOG_VERSION = 2
+
+KIND_LOG = 'log'
+KIND_BASE = 'base'
+KIND_SCENARIO = 'scenario'
+
+COUNT_COLUMNS = ['click', 'typing', 'wait', 'enter', 'space']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    action TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    total INTEGER,
+    click INTEGER,
+    typing INTEGER,
+    wait INTEGER,
+    enter INTEGER,
+    space INTEGER,
+    error TEXT,
+    csv TEXT,
+    PRIMARY KEY (action, name)
+)
+"""
+
+
+def file_kind(name):
+    """Тип файла действия по имени: log, base или scenario"""
+    if name in ("log.jsonl", "log.json"):
+        return KIND_LOG
+    if name == "actions_base.json":
+        return KIND_BASE
+    return KIND_SCENARIO
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _csv_state(typing_params_file):
+    """JSON [путь CSV, [size, mtime_ns] или null] - от него зависит число действий"""
+    try:
+        state = file_state(typing_params_file)
+    except OSError:
+        state = None
+    return json.dumps([str(typing_params_file), state])
+
+
+def is_fresh(row, st):
+    """Запись соответствует файлу (и CSV параметризованного сценария)"""
+    if row['size'] != st.st_size or row['mtime_ns'] != st.st_mtime_ns:
+        return False
+    if row['csv']:
+        typing_params_file, _ = json.loads(row['csv'])
+        return _csv_state(typing_params_file) == row['csv']
+    return True
+
+
+def scan_file(action_dir, path):
+    """Собирает запись каталога для файла: размер, mtime, хэш и число действий"""
+    st = path.stat()
+    entry = {
+        'name': path.name,
+        'kind': file_kind(path.name),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': hash_file(path),
+        'total': None,
+        'error': None,
+        'csv': None,
+    }
+    for column in COUNT_COLUMNS:
+        entry[column] = None
+    try:
+        if entry['kind'] == KIND_LOG:
+            entry['total'] = sum(1 for _ in iter_events(path))
+            return entry
+        actions = load_scenario(path, action_dir)
+        counts = count_actions(actions)
+        entry['total'] = len(actions)
+        if isinstance(actions, ParameterizedScenario):
+            entry['csv'] = _csv_state(actions.typing_params_file)
+        if isinstance(actions, BinaryScenario):
+            actions.close()
+        entry['click'] = counts.get('click left', 0) + counts.get('click right', 0)
+        for column in COUNT_COLUMNS[1:]:
+            entry[column] = counts.get(column, 0)
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+
+class Catalog:
+    """Доступ к catalog.sqlite. Соединение открывается на время каждой операции"""
+
+    def __init__(self, path=None):
+        cfg = get_config()
+        self.path = Path(path) if path else cfg.get_catalog_file_path()
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=10)
+        connection.row_factory = sqlite3.Row
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != CATALOG_VERSION:
+            connection.execute("DROP TABLE IF EXISTS files")
+            connection.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        connection.execute(_SCHEMA)
+        return connection
+
+    def _store(self, connection, action_name, entry):
+        columns = ['action'] + list(entry)
+        connection.execute(
+            f"INSERT OR REPLACE INTO files ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [action_name] + list(entry.values())
+        )
+
+    def update_file(self, action_name, path):
+        """Пересчитывает запись для файла действия (после его записи)"""
+        path = Path(path)
+        action_dir = get_config().get_action_path(action_name)
+        with closing(self._connect()) as connection, connection:
+            if not path.exists():
+                connection.execute("DELETE FROM files WHERE action = ? AND name = ?", (action_name, path.name))
+                return None
+            entry = scan_file(action_dir, path)
+            self._store(connection, action_name, entry)
+        return entry
+
+    def action_files(self, action_name):
+        """Актуальные записи всех файлов действия {имя: запись}.
+
+        Записи сверяются с размером и mtime файлов; устаревшие и новые файлы
+        пересчитываются, записи удаленных файлов убираются.
+        """
+        action_dir = get_config().get_action_path(action_name)
+        files = {}
+        if action_dir.exists():
+            for path in action_dir.iterdir():
+                if path.name in ("log.jsonl", "log.json") or path.suffix in ('.json', BINARY_SUFFIX):
+                    files[path.name] = path
+
+        with closing(self._connect()) as connection, connection:
+            rows = {row['name']: dict(row) for row in
+                    connection.execute("SELECT * FROM files WHERE action = ?", (action_name,))}
+            result = {}
+            for name, path in files.items():
+                st = path.stat()
+                row = rows.pop(name, None)
+                if row is None or not is_fresh(row, st):
+                    row = scan_file(action_dir, path)
+                    self._store(connection, action_name, row)
+                result[name] = row
+            for name in rows:
+                connection.execute("DELETE FROM files WHERE action = ? AND name = ?", (action_name, name))
+        return result
+
+    def file_info(self, action_name, path):
+        """Актуальная запись одного файла или None, если его нет"""
+        path = Path(path)
+        if not path.exists():
+            return None
+        st = path.stat()
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute("SELECT * FROM files WHERE action = ? AND name = ?",
+                                     (action_name, path.name)).fetchone()
+            if row is not None and is_fresh(row, st):
+                return dict(row)
+            entry = scan_file(get_config().get_action_path(action_name), path)
+            self._store(connection, action_name, entry)
+        return entry
+
+    def scenarios(self, action_name):
+        """Записи сценариев действия, отсортированные по имени"""
+        files = self.action_files(action_name)
+        return [files[name] for name in sorted(files) if files[name]['kind'] == KIND_SCENARIO]
+
+
+def get_catalog():
+    return Catalog()
+
+
+def record_file(action_name, path):
+    """Обновляет каталог после записи файла. Ошибки каталога не мешают основной работе"""
+    try:
+        get_catalog().update_file(action_name, path)
+    except Exception as e:
+        print(f"Предупреждение: не удалось обновить каталог ({e})")
+
+
+def scenario_info(entry, scenario_file):
+    """Запись каталога в виде словаря get_scenario_info"""
+    if entry is None:
+        return None
+    if entry['error']:
+        return {'error': entry['error']}
+    return {
+        'file': str(scenario_file),
+        'total_actions': entry['total'],
+        'click_actions': entry['click'],
+        'typing_actions': entry['typing'],
+        'wait_actions': entry['wait'],
+        'enter_actions': entry['enter'],
+        'space_actions': entry['space'],
+    }
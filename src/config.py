@@ -62,8 +62,20 @@ class LooperConfig:
         return self.get_action_folder() / action_name
     
     def get_log_file_path(self, action_name):
-        """Возвращает путь к файлу лога для действия"""
-        return self.get_action_path(action_name) / "log.json"
+        """Возвращает путь к файлу лога для действия.
+
+        Новые записи хранятся в log.jsonl; если его нет, но есть старый log.json,
+        возвращается log.json.
+        """
+        stream_path = self.get_log_stream_path(action_name)
+        legacy_path = self.get_action_path(action_name) / "log.json"
+        if not stream_path.exists() and legacy_path.exists():
+            return legacy_path
+        return stream_path
+    
+    def get_log_stream_path(self, action_name):
+        """Возвращает путь к журналу событий log.jsonl, в который пишет рекордер"""
+        return self.get_action_path(action_name) / "log.jsonl"
     
     def get_actions_base_file_path(self, action_name):
         """Возвращает путь к файлу базовых действий для действия"""
@@ -86,7 +98,131 @@ class LooperConfig:
     def get_typing_parameters_base_file_path(self, action_name):
         """Возвращает путь к файлу базовых параметров typing для действия"""
         return self.get_get_typing_parameters_file_path(action_name,'typing_parameters_base')
-    
+
+    def get_catalog_file_path(self):
+        """Возвращает путь к каталогу файлов действий (SQLite) в папке действий"""
+        return self.get_action_folder() / "catalog.sqlite"
+
+    def get_decompose_cache_file_path(self, action_name):
+        """Возвращает путь к кэшу декомпозиции (не .json, чтобы не считаться сценарием)"""
+        return self.get_action_path(action_name) / "actions_base.cache"
+
+    def get_template_cache_size(self):
+        """Возвращает лимит памяти кэша шаблонов в мегабайтах"""
+        return self.config.getint('DEFAULT', 'TEMPLATE_CACHE_MB', fallback=256)
+
+    def get_search_radius(self):
+        """Возвращает начальный радиус поиска вокруг записанной точки клика (0 - сразу весь экран)"""
+        return self.config.getint('DEFAULT', 'SEARCH_RADIUS', fallback=100)
+
+    def get_search_growth(self):
+        """Возвращает множитель увеличения радиуса поиска на каждом шаге"""
+        return self.config.getfloat('DEFAULT', 'SEARCH_GROWTH', fallback=3.0)
+
+    def get_search_steps(self):
+        """Возвращает количество шагов расширения окна до поиска по всему экрану"""
+        return self.config.getint('DEFAULT', 'SEARCH_STEPS', fallback=3)
+
+    def get_match_engine(self):
+        """Возвращает движок поиска шаблонов: exhaustive (полный перебор) или pyramid"""
+        engine = self.config.get('DEFAULT', 'MATCH_ENGINE', fallback='exhaustive').strip().lower()
+        if engine not in ('exhaustive', 'pyramid'):
+            print(f"Неизвестный MATCH_ENGINE '{engine}', используется exhaustive")
+            return 'exhaustive'
+        return engine
+
+    def get_pyramid_levels(self):
+        """Возвращает количество уменьшенных уровней пирамиды для движка pyramid"""
+        return self.config.getint('DEFAULT', 'PYRAMID_LEVELS', fallback=1)
+
+    def get_match_policy(self):
+        """Возвращает политику выбора среди нескольких совпадений: best, nearest или strict"""
+        policy = self.config.get('DEFAULT', 'MATCH_POLICY', fallback='best').strip().lower()
+        if policy not in ('best', 'nearest', 'strict'):
+            print(f"Неизвестная MATCH_POLICY '{policy}', используется best")
+            return 'best'
+        return policy
+
+    def get_prefetch_enabled(self):
+        """Нужно ли в динамическом режиме заранее искать цель следующего клика в фоне"""
+        return self.config.getboolean('DEFAULT', 'PREFETCH', fallback=True)
+
+    def get_frame_tile_size(self):
+        """Возвращает размер плитки детектора изменений экрана (0 - сравнение кадров отключено)"""
+        return self.config.getint('DEFAULT', 'FRAME_TILE', fallback=64)
+
+    def get_wait_compensation(self):
+        """Сокращать ли ожидания на величину отставания от записанного таймлайна"""
+        return self.config.getboolean('DEFAULT', 'WAIT_COMPENSATION', fallback=False)
+
+    def get_wait_for_target(self):
+        """Заканчивать ли ожидание перед динамическим кликом при появлении его цели"""
+        return self.config.getboolean('DEFAULT', 'WAIT_FOR_TARGET', fallback=False)
+
+    def get_input_backend(self):
+        """Возвращает способ отправки ввода: auto, sendinput или recording"""
+        return self.config.get('DEFAULT', 'INPUT_BACKEND', fallback='auto').strip().lower()
+
+    def get_input_key_delay(self):
+        """Возвращает паузу между нажатиями клавиш при вводе текста (секунды, 0 - без пауз)"""
+        return self.config.getfloat('DEFAULT', 'INPUT_KEY_DELAY', fallback=0.0)
+
+    def get_input_click_hold(self):
+        """Возвращает паузу между нажатием и отпусканием кнопки мыши (секунды)"""
+        return self.config.getfloat('DEFAULT', 'INPUT_CLICK_HOLD', fallback=0.05)
+
+    def get_input_unicode(self):
+        """Вводить ли текст Unicode-символами вместо виртуальных клавиш"""
+        return self.config.getboolean('DEFAULT', 'INPUT_UNICODE', fallback=False)
+
+    def get_screenshot_queue_size(self):
+        """Возвращает длину очереди кадров, ожидающих записи при записи действий"""
+        return self.config.getint('DEFAULT', 'SCREENSHOT_QUEUE', fallback=8)
+
+    def get_screenshot_workers(self):
+        """Возвращает число потоков, сохраняющих скриншоты при записи действий"""
+        return self.config.getint('DEFAULT', 'SCREENSHOT_WORKERS', fallback=2)
+
+    def get_screenshot_queue_timeout(self):
+        """Возвращает, сколько секунд ждать места в очереди скриншотов, прежде чем отбросить кадр"""
+        return self.config.getfloat('DEFAULT', 'SCREENSHOT_QUEUE_TIMEOUT', fallback=2.0)
+
+    def get_log_fsync_interval(self):
+        """Возвращает, как часто (в секундах) журнал записи сбрасывается на диск"""
+        return self.config.getfloat('DEFAULT', 'LOG_FSYNC_INTERVAL', fallback=1.0)
+
+    def get_asset_workers(self):
+        """Возвращает число процессов для сборки *_rr.png (0 - по числу ядер)"""
+        workers = self.config.getint('DEFAULT', 'ASSET_WORKERS', fallback=0)
+        return workers if workers > 0 else (os.cpu_count() or 1)
+
+    def get_max_click_delay(self):
+        """Возвращает максимальную паузу (в секундах) между нажатием и отпусканием кнопки для клика"""
+        return self.config.getfloat('DEFAULT', 'MAX_CLICK_DELAY', fallback=50.5)
+
+    def get_wait_threshold(self):
+        """Возвращает минимальную паузу (в секундах) между действиями, для которой создается wait"""
+        return self.config.getfloat('DEFAULT', 'WAIT_THRESHOLD', fallback=0.1)
+
+    def get_plan_cache_enabled(self):
+        """Нужно ли кэшировать скомпилированный план сценария рядом с ним (NAME.plan)"""
+        return self.config.getboolean('DEFAULT', 'PLAN_CACHE', fallback=True)
+
+    def get_start_delay(self):
+        """Возвращает паузу перед первым действием (секунды; 0 - только проверка готовности)"""
+        return self.config.getfloat('DEFAULT', 'START_DELAY', fallback=3.0)
+
+    def get_serve_port(self):
+        """Возвращает порт демона воспроизведения looper serve (только localhost)"""
+        return self.config.getint('DEFAULT', 'SERVE_PORT', fallback=8765)
+
+    def get_capture_backend(self):
+        """Возвращает источник кадров экрана: auto, mss, imagegrab или files:<папка со скриншотами>"""
+        backend = self.config.get('DEFAULT', 'CAPTURE_BACKEND', fallback='auto').strip()
+        if backend.startswith('files:'):
+            return backend
+        return backend.lower()
+
 
 
 
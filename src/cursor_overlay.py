@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Скриншоты с отметкой курсора, построенные по запросу.
+
+При записи сохраняется только N.png, а положение курсора (относительно
+виртуального экрана) пишется в событие лога как 'cursor': [x, y].
+Здесь по этим данным рисуется N_c.png - скрин с красной точкой в месте курсора.
+"""
+
+import cv2
+
+from config import get_config
+from event_log import iter_events
+
+CURSOR_RADIUS = 5  # радиус кружка-курсора
+CURSOR_COLOR = (0, 0, 255)  # красный (BGR)
+
+
+def draw_cursor(image, cursor, radius=CURSOR_RADIUS):
+    """Рисует курсор на изображении (на месте) и возвращает его"""
+    x, y = cursor
+    cv2.circle(image, (int(x), int(y)), radius, CURSOR_COLOR, -1)
+    return image
+
+
+def get_cursor_image_path(action_dir, screen_file, output_dir=None):
+    """Путь к скрину с отметкой курсора: 1.png -> 1_c.png"""
+    return (output_dir or action_dir) / screen_file.replace('.png', '_c.png')
+
+
+def render_cursor_image(action_dir, entry, output_dir=None):
+    """Строит N_c.png для события лога со скриншотом и курсором. Возвращает путь или None"""
+    screen_file = entry.get('screen')
+    cursor = entry.get('cursor')
+    if not screen_file or cursor is None:
+        return None
+
+    image = cv2.imread(str(action_dir / screen_file), cv2.IMREAD_COLOR)
+    if image is None:
+        print(f"Не удалось загрузить скриншот: {action_dir / screen_file}")
+        return None
+
+    output_path = get_cursor_image_path(action_dir, screen_file, output_dir)
+    cv2.imwrite(str(output_path), draw_cursor(image, cursor))
+    return output_path
+
+
+def load_screen_entries(action_name):
+    """Возвращает события лога (или базовые действия) со скриншотами"""
+    cfg = get_config()
+    source = cfg.get_log_file_path(action_name)
+    if not source.exists():
+        source = cfg.get_actions_base_file_path(action_name)
+    return [entry for entry in iter_events(source) if entry.get('screen')]
+
+
+def render_action_cursors(action_name, screens=None, output_dir=None):
+    """Строит скрины с курсором для действия.
+
+    screens - имена скриншотов ('3.png' или '3'); по умолчанию все.
+    Возвращает список созданных файлов.
+    """
+    action_dir = get_config().get_action_path(action_name)
+    wanted = None
+    if screens:
+        wanted = {s if s.endswith('.png') else f"{s}.png" for s in screens}
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    created = []
+    for entry in load_screen_entries(action_name):
+        if wanted is not None and entry['screen'] not in wanted:
+            continue
+        if entry.get('cursor') is None:
+            # Старые записи хранят готовый N_c.png вместо координат курсора
+            print(f"Для {entry['screen']} нет координат курсора")
+            continue
+        path = render_cursor_image(action_dir, entry, output_dir)
+        if path:
+            created.append(path)
+    return created
@@ -1,21 +1,119 @@
+import hashlib
 import json
 import sys
 import os
-from typing import List, Dict, Any, Optional
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 from pathlib import Path
 from config import get_config
+from event_log import iter_events, iter_event_offsets, is_stream_log, read_header
+from catalog import record_file
+
+# Версия формата кэша декомпозиции (actions_base.cache)
+DECOMPOSE_CACHE_VERSION = 1
+
+
+class EventStream:
+    """Log events read one at a time with their indices and a small lookahead buffer"""
+    
+    def __init__(self, events: Iterable, start_index: int = 0, with_offsets: bool = False):
+        self._events = iter(events)
+        self._buffer = deque()  # (index, event) already read from the source
+        self.count = start_index  # index of the next event read from the source
+        # Source yields (byte offset, event) pairs; offsets of recent events are kept
+        self.with_offsets = with_offsets
+        self._offsets = deque()  # (index, offset)
+    
+    def _fill(self):
+        if not self._buffer:
+            try:
+                event = next(self._events)
+            except StopIteration:
+                return
+            if self.with_offsets:
+                offset, event = event
+                self._offsets.append((self.count, offset))
+            self._buffer.append((self.count, event))
+            self.count += 1
+    
+    def offset_of(self, index: int) -> Optional[int]:
+        """Byte offset of event index in the log (earlier offsets are forgotten)"""
+        while self._offsets and self._offsets[0][0] < index:
+            self._offsets.popleft()
+        if self._offsets and self._offsets[0][0] == index:
+            return self._offsets[0][1]
+        return None
+    
+    def peek(self) -> Optional[Dict]:
+        """Return the next event without taking it (None at the end)"""
+        self._fill()
+        return self._buffer[0][1] if self._buffer else None
+    
+    def take(self) -> Tuple[int, Dict]:
+        """Take the next event: (index, event)"""
+        self._fill()
+        return self._buffer.popleft()
+    
+    def push_back(self, items: List[Tuple[int, Dict]]):
+        """Return taken (index, event) pairs to the front of the stream"""
+        self._buffer.extendleft(reversed(items))
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> Dict:
+        if self.peek() is None:
+            raise StopIteration
+        return self.take()[1]
+
+
+def encode_array_item(item: Dict, first: bool, indent: int = 4) -> bytes:
+    """Encode one item of a JSON array written item by item.
+
+    Items joined and followed by b'\\n]' (or b'[]' for no items) are byte-identical
+    to json.dump(items, f, ensure_ascii=False, indent=indent).
+    """
+    prefix = ' ' * indent
+    text = json.dumps(item, ensure_ascii=False, indent=indent).replace('\n', '\n' + prefix)
+    return (('[\n' if first else ',\n') + prefix + text).encode('utf-8')
+
+
+def hash_file(path: Path, prefix_size: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Return (sha256 of file, sha256 of its first prefix_size bytes) in one pass"""
+    full = hashlib.sha256()
+    prefix_hash = None
+    read = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            if prefix_size is not None and prefix_hash is None and read + len(chunk) >= prefix_size:
+                full.update(chunk[:prefix_size - read])
+                prefix_hash = full.hexdigest()
+                full.update(chunk[prefix_size - read:])
+            else:
+                full.update(chunk)
+            read += len(chunk)
+    if prefix_size is not None and prefix_hash is None and read == prefix_size:
+        prefix_hash = full.hexdigest()
+    return full.hexdigest(), prefix_hash
+
 
 class BaseActionDecomposer:
-    def __init__(self, max_click_delay: float = 50.5):
+    def __init__(self, max_click_delay: float = 50.5, wait_threshold: float = 0.1):
         self.max_click_delay = max_click_delay
+        self.wait_threshold = wait_threshold  # shorter gaps between actions get no wait
         self.base_actions = []
         self.action_id_counter = 1
+        self.action_counts = {}  # base action name -> count, in order of first appearance
+        self.typing_texts = []
+        self.events_read = 0
+        self.checkpoint = None  # decomposer state at the start of the last base action
+        self.log_header = None
     
     def load_actions(self, filename: str) -> List[Dict]:
-        """Load actions from JSON file"""
+        """Load actions from log.jsonl stream or legacy JSON array file"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            self.log_header = read_header(filename)
+            return list(iter_events(filename))
         except FileNotFoundError:
             print(f"Error: File {filename} not found")
             return []
@@ -32,13 +130,8 @@ class BaseActionDecomposer:
         except Exception as e:
             print(f"Error saving to {filename}: {e}")
     
-    def find_mouse_clicks(self, actions: List[Dict], start_index: int) -> Optional[Dict]:
-        """Find and create mouse click base action starting from given index"""
-        if start_index >= len(actions):
-            return None
-            
-        action = actions[start_index]
-        
+    def _read_mouse_click(self, index: int, action: Dict, stream: 'EventStream') -> Optional[Dict]:
+        """Create mouse click base action from a down event, taking the matching up event from the stream"""
         # Check if this is a mouse down event
         if (action.get('source') != 'mouse' or 
             action.get('dir') != 'down' or
@@ -50,55 +143,59 @@ class BaseActionDecomposer:
         x, y = action.get('x'), action.get('y')
         down_timestamp = action.get('timestamp')
         
-        # for i in range(start_index + 1, len(actions)):
-        i = min(start_index + 1, len(actions) -1)
-        next_action = actions[i]
+        next_action = stream.peek()
         
         # Check if this is the matching up event
-        if (next_action.get('source') == 'mouse' and
+        if (next_action is not None and
+            next_action.get('source') == 'mouse' and
             next_action.get('dir') == 'up' and
             next_action.get('button') == button):
 
-            consumed_indices = [start_index, i]
+            consumed_indices = [index, index + 1]
             up_timestamp = next_action.get('timestamp')
             delay = up_timestamp - down_timestamp
         else: # произошло залипание кнопки вверх
-            consumed_indices = [start_index]
+            consumed_indices = [index]
             delay = 0.05
             up_timestamp = down_timestamp + delay
             
-            
-            # Check if within max delay
-        if delay <= self.max_click_delay:
-            base_action = {
-                'id': self.action_id_counter,
-                'name': f'click {button}',
-                'type': 'mouse_click',
-                'button': button,
-                'x': x,
-                'y': y,
-                'start_timestamp': down_timestamp,
-                'end_timestamp': up_timestamp,
-                'delay': delay,
-                'consumed_indices': consumed_indices
-            }
-            
-            # Добавляем путь к скрину, если он есть в действии down
-            if 'screen' in action:
-                base_action['screen'] = action['screen']
-            
-            return base_action
-            
-        
-        return None
-    
-    def find_typing_sequence(self, actions: List[Dict], start_index: int) -> Optional[Dict]:
-        """Find and create typing sequence base action starting from given index"""
-        if start_index >= len(actions):
+        # Check if within max delay
+        if delay > self.max_click_delay:
             return None
-            
-        action = actions[start_index]
         
+        if len(consumed_indices) == 2:
+            stream.take()
+        
+        base_action = {
+            'id': self.action_id_counter,
+            'name': f'click {button}',
+            'type': 'mouse_click',
+            'button': button,
+            'x': x,
+            'y': y,
+            'start_timestamp': down_timestamp,
+            'end_timestamp': up_timestamp,
+            'delay': delay,
+            'consumed_indices': consumed_indices
+        }
+        
+        # Добавляем путь к скрину, если он есть в действии down
+        if 'screen' in action:
+            base_action['screen'] = action['screen']
+            if 'cursor' in action:
+                base_action['cursor'] = action['cursor']
+        
+        return base_action
+    
+    @staticmethod
+    def _is_typing_key(action: Dict) -> bool:
+        """Keyboard character input that can continue a typing sequence (space included)"""
+        return (action.get('source') == 'keyboard' and
+                action.get('key') not in ['\n'] and
+                action.get('key', '').isprintable())
+    
+    def _read_typing_sequence(self, index: int, action: Dict, stream: 'EventStream') -> Optional[Dict]:
+        """Create typing sequence base action, taking consecutive character inputs from the stream"""
         # Check if this is a keyboard character input (not enter or space)
         if (action.get('source') != 'keyboard' or 
             action.get('key') in ['\n', ' '] or
@@ -106,45 +203,38 @@ class BaseActionDecomposer:
             return None
         
         # Collect consecutive keyboard character inputs (including space)
-        typing_sequence = ""
-        consumed_indices = []
+        keys = [action.get('key', '')]
         start_timestamp = action.get('timestamp')
         end_timestamp = start_timestamp
+        # Events taken while the sequence is still empty (only for empty keys)
+        empty_run = None if keys[0] else []
         
-        for i in range(start_index, len(actions)):
-            curr_action = actions[i]
-            
-            # Check if this is a keyboard character input
-            if (curr_action.get('source') == 'keyboard' and
-                curr_action.get('key') not in ['\n'] and
-                curr_action.get('key', '').isprintable()):
-                
-                typing_sequence += curr_action.get('key', '')
-                consumed_indices.append(i)
-                end_timestamp = curr_action.get('timestamp')
-            else:
-                # Stop at first non-character input
-                break
-        
-        if typing_sequence:
-            return {
-                'name': 'typing',
-                'type': 'keyboard_typing',
-                'text': typing_sequence,
-                'start_timestamp': start_timestamp,
-                'end_timestamp': end_timestamp,
-                'consumed_indices': consumed_indices
-            }
+        while stream.peek() is not None and self._is_typing_key(stream.peek()):
+            curr_index, curr_action = stream.take()
+            keys.append(curr_action.get('key', ''))
+            end_timestamp = curr_action.get('timestamp')
+            if empty_run is not None:
+                if keys[-1]:
+                    empty_run = None
+                else:
+                    empty_run.append((curr_index, curr_action))
         
-        return None
-    
-    def find_enter_action(self, actions: List[Dict], start_index: int) -> Optional[Dict]:
-        """Find and create enter key base action"""
-        if start_index >= len(actions):
+        if empty_run is not None:
+            # Nothing typed: return the events so each is handled on its own
+            stream.push_back(empty_run)
             return None
-            
-        action = actions[start_index]
         
+        return {
+            'name': 'typing',
+            'type': 'keyboard_typing',
+            'text': "".join(keys),
+            'start_timestamp': start_timestamp,
+            'end_timestamp': end_timestamp,
+            'consumed_indices': list(range(index, index + len(keys)))
+        }
+    
+    def _read_enter_action(self, index: int, action: Dict) -> Optional[Dict]:
+        """Create enter key base action"""
         if (action.get('source') == 'keyboard' and action.get('key') == '\n'):
             base_action = {
                 'id': self.action_id_counter,
@@ -152,26 +242,23 @@ class BaseActionDecomposer:
                 'type': 'keyboard_enter',
                 'timestamp': action.get('timestamp'),
                 'layout': action.get('layout'),
-                'consumed_indices': [start_index]
+                'consumed_indices': [index]
             }
             
             # Добавляем путь к скрину, если он есть в действии
             if 'screen' in action:
                 base_action['screen'] = action['screen']
+                if 'cursor' in action:
+                    base_action['cursor'] = action['cursor']
             
             return base_action
         
         return None
     
-    def find_space_action(self, actions: List[Dict], start_index: int) -> Optional[Dict]:
-        """Find and create space key base action (standalone, not part of typing)"""
-        if start_index >= len(actions):
-            return None
-            
-        action = actions[start_index]
-        
-        # Space is now handled within typing sequences, so this method is kept for compatibility
-        # but will not be used in the main decomposition logic
+    def _read_space_action(self, index: int, action: Dict) -> Optional[Dict]:
+        """Create space key base action (standalone, not part of typing)"""
+        # Space inside typing sequences is handled by _read_typing_sequence;
+        # here only a space that starts a new sequence is matched
         if (action.get('source') == 'keyboard' and action.get('key') == ' '):
             base_action = {
                 'id': self.action_id_counter,
@@ -179,12 +266,14 @@ class BaseActionDecomposer:
                 'type': 'keyboard_space',
                 'timestamp': action.get('timestamp'),
                 'layout': action.get('layout'),
-                'consumed_indices': [start_index]
+                'consumed_indices': [index]
             }
             
             # Добавляем путь к скрину, если он есть в действии
             if 'screen' in action:
                 base_action['screen'] = action['screen']
+                if 'cursor' in action:
+                    base_action['cursor'] = action['cursor']
             
             return base_action
         
@@ -200,137 +289,179 @@ class BaseActionDecomposer:
         self.action_id_counter += 1
         return wait_action
 
-    def decompose_actions(self, actions: List[Dict]):
-        """Decompose actions into base actions"""
-        self.base_actions = []
-        self.action_id_counter = 1
-        consumed_indices = set()
+    def settings(self) -> Dict:
+        """Settings that affect the decomposition result"""
+        return {'max_click_delay': self.max_click_delay, 'wait_threshold': self.wait_threshold}
+    
+    def iter_base_actions(self, events: Iterable, resume: Optional[Dict] = None,
+                          with_offsets: bool = False) -> Iterator[Dict]:
+        """Decompose events into base actions in a single pass.
+
+        Events are read one at a time (with one event of lookahead), so any
+        iterable works, including a log.jsonl stream. Yields base actions and
+        the wait actions between them in output order.
         
-        i = 0
-        last_action_timestamp = 0
+        Before the first item of every base action self.checkpoint is updated,
+        so the tail of a grown log can later be decomposed from there (resume).
+        with_offsets - events are (byte offset, event) pairs from iter_event_offsets.
+        """
+        if resume:
+            self.action_id_counter = resume['action_id']
+            self.action_counts = dict(resume['action_counts'])
+            self.typing_texts = list(resume['typing_texts'])
+            last_action_timestamp = resume['last_action_timestamp']
+            stream = EventStream(events, resume['index'], with_offsets)
+        else:
+            self.action_id_counter = 1
+            self.action_counts = {}
+            self.typing_texts = []
+            last_action_timestamp = 0
+            stream = EventStream(events, 0, with_offsets)
+        self.checkpoint = None
         
-        while i < len(actions):
-            if i in consumed_indices:
-                i += 1
-                continue
+        while stream.peek() is not None:
+            index, action = stream.take()
             
-            # Try to find base actions in order of priority
-            base_action = None
+            # Try to find base actions in order of priority:
+            # mouse click, space, typing sequence (space is included in typing), enter
+            base_action = self._read_mouse_click(index, action, stream)
+            if base_action is None:
+                base_action = self._read_space_action(index, action)
+            if base_action is None:
+                base_action = self._read_typing_sequence(index, action, stream)
+            if base_action is None:
+                base_action = self._read_enter_action(index, action)
             
-            # Try mouse click
-            base_action = self.find_mouse_clicks(actions, i)
-            if base_action:
-                # Add wait action if there's a delay from previous action
-                if last_action_timestamp > 0:
-                    delay = base_action['start_timestamp'] - last_action_timestamp
-                    if delay > 0.1:  # Only add wait if delay is significant
-                        wait_action = self.create_wait_action(delay)
-                        self.base_actions.append(wait_action)
-                
-                base_action['id'] = self.action_id_counter
-                self.action_id_counter += 1
-                
-                for idx in base_action['consumed_indices']:
-                    consumed_indices.add(idx)
-                self.base_actions.append(base_action)
-                last_action_timestamp = base_action['end_timestamp']
-                i += 1
-                continue
-
-            # Try space
-            base_action = self.find_space_action(actions, i)
-            if base_action:
-                # Add wait action if there's a delay from previous action
-                if last_action_timestamp > 0:
-                    delay = base_action['timestamp'] - last_action_timestamp
-                    if delay > 0.1:  # Only add wait if delay is significant
-                        wait_action = self.create_wait_action(delay)
-                        self.base_actions.append(wait_action)
-                
-                base_action['id'] = self.action_id_counter
-                self.action_id_counter += 1
-                
-                consumed_indices.add(i)
-                self.base_actions.append(base_action)
-                last_action_timestamp = base_action['timestamp']
-                i += 1
+            if base_action is None:
+                # If no base action found, skip this action
+                print(f"Warning: Could not decompose action at index {index}: {action}")
                 continue
             
-            # Try typing sequence (space is now included in typing)
-            base_action = self.find_typing_sequence(actions, i)
-            if base_action:
-                # Add wait action if there's a delay from previous action
-                if last_action_timestamp > 0:
-                    delay = base_action['start_timestamp'] - last_action_timestamp
-                    if delay > 0.1:  # Only add wait if delay is significant
-                        wait_action = self.create_wait_action(delay)
-                        self.base_actions.append(wait_action)
-                
-                base_action['id'] = self.action_id_counter
-                self.action_id_counter += 1
-                
-                for idx in base_action['consumed_indices']:
-                    consumed_indices.add(idx)
-                self.base_actions.append(base_action)
-                last_action_timestamp = base_action['end_timestamp']
-                i = max(base_action['consumed_indices']) + 1
-                continue
+            # The last base action may still grow with new events (typing, click up)
+            self.checkpoint = {
+                'index': index,
+                'offset': stream.offset_of(index),
+                'action_id': self.action_id_counter,
+                'last_action_timestamp': last_action_timestamp,
+                'action_counts': dict(self.action_counts),
+                'typing_count': len(self.typing_texts),
+            }
             
-            # Try enter
-            base_action = self.find_enter_action(actions, i)
-            if base_action:
-                # Add wait action if there's a delay from previous action
-                if last_action_timestamp > 0:
-                    delay = base_action['timestamp'] - last_action_timestamp
-                    if delay > 0.1:  # Only add wait if delay is significant
-                        wait_action = self.create_wait_action(delay)
-                        self.base_actions.append(wait_action)
-                
-                base_action['id'] = self.action_id_counter
-                self.action_id_counter += 1
-                
-                consumed_indices.add(i)
-                self.base_actions.append(base_action)
-                last_action_timestamp = base_action['timestamp']
-                i += 1
-                continue
+            # Add wait action if there's a delay from previous action
+            start_timestamp = base_action.get('start_timestamp', base_action.get('timestamp'))
+            if last_action_timestamp > 0:
+                delay = start_timestamp - last_action_timestamp
+                if delay > self.wait_threshold:  # Only add wait if delay is significant
+                    yield self._count(self.create_wait_action(delay))
             
-            # If no base action found, skip this action
-            print(f"Warning: Could not decompose action at index {i}: {actions[i]}")
-            i += 1
+            base_action['id'] = self.action_id_counter
+            self.action_id_counter += 1
+            last_action_timestamp = base_action.get('end_timestamp', base_action.get('timestamp'))
+            if base_action['name'] == 'typing':
+                self.typing_texts.append(base_action['text'])
+            yield self._count(base_action)
+        
+        self.events_read = stream.count
+    
+    def _count(self, base_action: Dict) -> Dict:
+        self.action_counts[base_action['name']] = self.action_counts.get(base_action['name'], 0) + 1
+        return base_action
+
+    def decompose_actions(self, actions: Iterable[Dict]):
+        """Decompose actions into base actions (kept in self.base_actions)"""
+        self.base_actions = list(self.iter_base_actions(actions))
+    
+    def decompose_to_file(self, events: Iterable, filename: str, resume: Optional[Dict] = None,
+                          with_offsets: bool = False) -> int:
+        """Decompose events and write base actions to a JSON file as they are produced.
+
+        The file is identical to json.dump(base_actions, f, ensure_ascii=False, indent=4),
+        but base actions are not kept in memory. With resume the file is cut at
+        resume['output_offset'] and only the tail is written. Returns the number
+        of events read.
+        """
+        output_offset = resume['output_offset'] if resume else 0
+        with open(filename, 'r+b' if resume else 'wb') as f:
+            f.seek(output_offset)
+            f.truncate()
+            written = output_offset
+            first = output_offset == 0
+            checkpoint = None
+            for item in self.iter_base_actions(events, resume, with_offsets):
+                if self.checkpoint is not checkpoint:
+                    checkpoint = self.checkpoint
+                    checkpoint['output_offset'] = written
+                data = encode_array_item(item, first)
+                f.write(data)
+                written += len(data)
+                first = False
+            f.write(b'[]' if first else b'\n]')
+        print(f"Base actions saved to {filename}")
+        return self.events_read
+    
+    def _open_events(self, input_file: str, offset: int = 0) -> Tuple[Optional[EventStream], bool]:
+        """Open log events as (peekable source, with_offsets); source is None if the log is empty"""
+        with_offsets = is_stream_log(input_file)
+        if with_offsets:
+            events = EventStream(iter_event_offsets(input_file, offset))
+        else:
+            events = EventStream(iter_events(input_file))
+        if events.peek() is None:
+            return None, with_offsets
+        return events, with_offsets
+    
+    def decompose_file(self, input_file: str, output_file: str) -> int:
+        """Stream log file (log.jsonl or legacy log.json) into base actions file.
+
+        Returns the number of events read; 0 if the log is empty or unreadable
+        (the output file is not written then).
+        """
+        try:
+            self.log_header = read_header(input_file)
+            events, with_offsets = self._open_events(input_file)
+            if events is None:
+                return 0
+        except FileNotFoundError:
+            print(f"Error: File {input_file} not found")
+            return 0
+        except json.JSONDecodeError as e:
+            print(f"Error: Invalid JSON in {input_file}: {e}")
+            return 0
+        return self.decompose_to_file(events, output_file, with_offsets=with_offsets)
+    
+    def resume_file(self, input_file: str, output_file: str, checkpoint: Dict,
+                    typing_texts: List[str]) -> int:
+        """Decompose only the tail of a grown log.jsonl, starting from checkpoint"""
+        resume = dict(checkpoint, typing_texts=typing_texts[:checkpoint['typing_count']])
+        self.log_header = read_header(input_file)
+        events, _ = self._open_events(input_file, checkpoint['offset'])
+        if events is None:
+            return 0
+        return self.decompose_to_file(events, output_file, resume, with_offsets=True)
     
     def print_summary(self):
         """Print summary of decomposed actions"""
         print(f"\nDecomposition Summary:")
-        print(f"Total base actions: {len(self.base_actions)}")
-        
-        action_counts = {}
-        for action in self.base_actions:
-            action_type = action['name']
-            action_counts[action_type] = action_counts.get(action_type, 0) + 1
+        print(f"Total base actions: {sum(self.action_counts.values())}")
         
-        for action_type, count in action_counts.items():
+        for action_type, count in self.action_counts.items():
             print(f"  {action_type}: {count}")
 
     def create_typing_parameters_base_csv(self, csv_file_path: str):
         """Создает файл typing_parameters_base.csv на основе базовых действий"""
         import csv
-        # Собираем все typing действия
-        typing_actions = []
-        for action in self.base_actions:
-            if action.get('name') == 'typing' and action.get('type') == 'keyboard_typing':
-                typing_actions.append(action)
+        # Тексты всех typing действий собраны при декомпозиции
+        typing_texts = self.typing_texts
         
-        if not typing_actions:
+        if not typing_texts:
             print("Нет typing действий для создания CSV файла")
             return
             
         # Создаем заголовки CSV: id + названия для каждого typing действия
         headers = ['id']
         column_names = []
-        for i, action in enumerate(typing_actions, 1):
-            # Используем исходный текст как название колонки, заменяя пробелы на _
-            original_text = action.get('text', f'typing_{i}')
+        for original_text in typing_texts:
+            # Используем исходный текст как название колонки
             column_name = original_text# original_text.replace(' ', '_').replace('+', 'plus').replace('-', 'minus')
             column_names.append(column_name)
             headers.append(column_name)
@@ -340,8 +471,7 @@ class BaseActionDecomposer:
         
         # Первая строка - исходные значения
         row1 = ['1']
-        for action in typing_actions:
-            row1.append(action.get('text', ''))
+        row1.extend(typing_texts)
         rows_data.append(row1)
         
         try:
@@ -358,9 +488,9 @@ class BaseActionDecomposer:
                     writer.writerow(row)
             
             print(f"Файл typing_parameters_base.csv создан: {csv_file_path}")
-            print(f"Найдено typing действий: {len(typing_actions)}")
-            for i, action in enumerate(typing_actions, 1):
-                print(f"  {i}. text: '{action.get('text', '')}'")
+            print(f"Найдено typing действий: {len(typing_texts)}")
+            for i, text in enumerate(typing_texts, 1):
+                print(f"  {i}. text: '{text}'")
                 
         except Exception as e:
             print(f"Ошибка при создании CSV файла: {e}")
@@ -375,7 +505,9 @@ def main():
     
     # Construct file paths according to concept.md
     action_dir = os.path.join(".", action_name)
-    input_file = os.path.join(action_dir, "log.json")
+    input_file = os.path.join(action_dir, "log.jsonl")
+    if not os.path.exists(input_file):
+        input_file = os.path.join(action_dir, "log.json")
     output_file = os.path.join(action_dir, "actions_base.json")
     
     # Check if action directory and log file exist
@@ -389,30 +521,61 @@ def main():
     
     decomposer = BaseActionDecomposer()
     
-    # Load actions
-    actions = decomposer.load_actions(input_file)
-    if not actions:
+    # Decompose actions while reading the log, saving base actions as they are produced
+    events_count = decomposer.decompose_file(input_file, output_file)
+    if not events_count:
         return
     
-    print(f"Loaded {len(actions)} actions from {input_file}")
-    
-    # Decompose actions
-    decomposer.decompose_actions(actions)
+    print(f"Loaded {events_count} actions from {input_file}")
     
     # Print summary
     decomposer.print_summary()
     
-    # Save base actions
-    decomposer.save_base_actions(output_file)
-    
     # Create typing_parameters_base.csv file
     typing_csv_file = os.path.join(action_dir, "typing_parameters_base.csv")
     decomposer.create_typing_parameters_base_csv(typing_csv_file)
 
-def decompose_action(action_name: str) -> bool:
+def load_decompose_cache(cache_file: Path) -> Optional[Dict]:
+    """Read decomposition cache; None if it is missing, damaged or of another version"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != DECOMPOSE_CACHE_VERSION:
+        return None
+    return cache
+
+
+def save_decompose_cache(cache_file: Path, cache: Dict):
+    tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+
+def _file_state(path: Path) -> Optional[List[int]]:
+    """[size, mtime_ns] of an output file, None if it does not exist"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def decompose_action(action_name: str, force: bool = False, quiet: bool = False) -> bool:
     """
     Decompose action for use from looper.py
     Returns True if decomposition was successful, False otherwise
+    
+    The result is cached in actions_base.cache: the key is the log size and
+    sha256 plus decomposer settings. If neither changed, nothing is redone and
+    manual edits of actions_base.json and the CSV are kept; a missing file is
+    regenerated. If log.jsonl only grew (and actions_base.json was not edited),
+    just the tail starting from the last base action is decomposed.
+    force - ignore the cache and decompose the whole log.
+    quiet - no header, and no output at all when the cached result is used
+    (the check before playback).
     """
     # Получаем конфигурацию
     cfg = get_config()
@@ -421,11 +584,14 @@ def decompose_action(action_name: str) -> bool:
     action_dir = cfg.get_action_path(action_name)
     input_file = cfg.get_log_file_path(action_name)
     output_file = cfg.get_actions_base_file_path(action_name)
+    typing_csv_file = cfg.get_typing_parameters_base_file_path(action_name)
+    cache_file = cfg.get_decompose_cache_file_path(action_name)
     
-    print(f"Декомпозиция действия '{action_name}'")
-    print(f"Директория действий: {action_dir}")
-    print(f"Входной файл: {input_file}")
-    print(f"Выходной файл: {output_file}")
+    if not quiet:
+        print(f"Декомпозиция действия '{action_name}'")
+        print(f"Директория действий: {action_dir}")
+        print(f"Входной файл: {input_file}")
+        print(f"Выходной файл: {output_file}")
     
     # Check if action directory and log file exist
     if not action_dir.exists():
@@ -436,27 +602,69 @@ def decompose_action(action_name: str) -> bool:
         print(f"Error: Log file '{input_file}' not found")
         return False
     
-    decomposer = BaseActionDecomposer()
+    decomposer = BaseActionDecomposer(cfg.get_max_click_delay(), cfg.get_wait_threshold())
     
-    # Load actions
-    actions = decomposer.load_actions(str(input_file))
-    if not actions:
-        return False
+    cache = None if force else load_decompose_cache(cache_file)
+    if cache is not None and (cache.get('log_file') != input_file.name
+                              or cache.get('settings') != decomposer.settings()):
+        cache = None
+    
+    log_size = input_file.stat().st_size
+    old_size = cache['log_size'] if cache is not None else None
+    log_hash, prefix_hash = hash_file(input_file, old_size if old_size is not None and old_size < log_size else None)
     
-    print(f"Loaded {len(actions)} actions from {input_file}")
+    log_unchanged = cache is not None and cache['log_size'] == log_size and cache['log_hash'] == log_hash
+    if log_unchanged and output_file.exists():
+        # Ручные правки actions_base.json и CSV сохраняются; пересоздается только удаленный CSV
+        decomposer.typing_texts = cache.get('typing_texts', [])
+        if decomposer.typing_texts and not typing_csv_file.exists():
+            decomposer.create_typing_parameters_base_csv(str(typing_csv_file))
+        if not quiet:
+            print("Лог не изменился с прошлой декомпозиции, используем готовый результат")
+        return True
     
-    # Decompose actions
-    decomposer.decompose_actions(actions)
+    # Дописывать хвост можно, только если actions_base.json не правили вручную
+    resume = (cache is not None and not log_unchanged and cache.get('checkpoint') is not None
+              and cache['checkpoint'].get('offset') is not None
+              and cache.get('output') == _file_state(output_file)
+              and prefix_hash == cache['log_hash'] and is_stream_log(input_file))
+    
+    # Decompose actions while reading the log, saving base actions as they are produced
+    if resume:
+        print(f"Лог дописан: декомпозиция с байта {cache['checkpoint']['offset']}")
+        events_count = decomposer.resume_file(str(input_file), str(output_file),
+                                              cache['checkpoint'], cache['typing_texts'])
+    else:
+        events_count = decomposer.decompose_file(str(input_file), str(output_file))
+    if not events_count:
+        return False
+    
+    print(f"Loaded {events_count} actions from {input_file}")
     
     # Print summary
     decomposer.print_summary()
     
-    # Save base actions
-    decomposer.save_base_actions(str(output_file))
+    # Create typing_parameters_base.csv file (kept if only actions_base.json was missing)
+    if not log_unchanged or not typing_csv_file.exists():
+        decomposer.create_typing_parameters_base_csv(str(typing_csv_file))
     
-    # Create typing_parameters_base.csv file
-    typing_csv_file = cfg.get_typing_parameters_base_file_path(action_name)
-    decomposer.create_typing_parameters_base_csv(str(typing_csv_file))
+    record_file(action_name, input_file)
+    record_file(action_name, output_file)
+    
+    checkpoint = decomposer.checkpoint
+    if checkpoint is None and resume:
+        # Хвост не дал базовых действий: следующее продолжение начнется с той же точки
+        checkpoint = cache['checkpoint']
+    save_decompose_cache(cache_file, {
+        'version': DECOMPOSE_CACHE_VERSION,
+        'log_file': input_file.name,
+        'log_size': log_size,
+        'log_hash': log_hash,
+        'settings': decomposer.settings(),
+        'checkpoint': checkpoint,
+        'typing_texts': decomposer.typing_texts,
+        'output': _file_state(output_file),
+    })
     
     return True
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Журнал записанных событий в формате JSON Lines (log.jsonl).
+
+Первая строка - заголовок записи:
+    {"type": "header", "version": 1, "start_time": ..., "screen_bounds": {...}, "layout": "0409"}
+Каждая следующая строка - одно событие в том же виде, что и элементы старого
+log.json. Рекордер дописывает события по мере их появления и периодически
+вызывает fsync, поэтому при аварийном завершении теряются только последние
+события. Чтение идет потоком; старый формат (JSON-массив) тоже поддерживается.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+LOG_VERSION = 1
+
+
+class EventLogWriter:
+    """Дописывает события в log.jsonl по одному на строку"""
+
+    def __init__(self, path, header=None, fsync_interval=1.0):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._last_sync = time.monotonic()
+        if header is not None:
+            self._write_line(dict({'type': 'header', 'version': LOG_VERSION}, **header))
+            self.sync()
+
+    def _write_line(self, data):
+        self._file.write(json.dumps(data, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def append(self, event):
+        """Дописывает событие; fsync - не чаще раза в fsync_interval секунд"""
+        # События мыши и клавиатуры приходят из разных потоков слушателей
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write_line(event)
+            self.count += 1
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def sync(self):
+        """Сбрасывает записанное на диск"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+
+def is_header(entry):
+    return isinstance(entry, dict) and entry.get('type') == 'header'
+
+
+def _iter_jsonl(f, path):
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Последняя строка могла быть записана не полностью при аварийном завершении
+            print(f"Warning: skipping damaged line {line_number} in {path}")
+
+
+def iter_log_entries(path):
+    """Потоково читает журнал: заголовок (если есть) и события по порядку.
+
+    Поддерживает log.jsonl и старый log.json (JSON-массив событий).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        # Старый формат начинается с '[' - весь файл это один JSON-массив
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            f.seek(0)
+            for entry in json.load(f):
+                yield entry
+            return
+        f.seek(0)
+        for entry in _iter_jsonl(f, path):
+            yield entry
+
+
+def is_stream_log(path):
+    """True для журнала JSON Lines, False для старого JSON-массива"""
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64), b''):
+            stripped = chunk.lstrip()
+            if stripped:
+                return not stripped.startswith(b'[')
+    return True
+
+
+def iter_event_offsets(path, offset=0):
+    """Потоково читает события log.jsonl начиная с байта offset.
+
+    Возвращает пары (смещение строки в байтах, событие); заголовок пропускается.
+    Позволяет продолжить чтение журнала с места, где оно остановилось.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                print(f"Warning: skipping damaged line at byte {line_offset} in {path}")
+                continue
+            if not is_header(entry):
+                yield line_offset, entry
+
+
+def iter_events(path):
+    """Потоково читает события журнала (без заголовка)"""
+    for entry in iter_log_entries(path):
+        if not is_header(entry):
+            yield entry
+
+
+def read_header(path):
+    """Возвращает заголовок журнала или None (старый формат или нет заголовка)"""
+    for entry in iter_log_entries(path):
+        return entry if is_header(entry) else None
+    return None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Обнаружение изменившихся участков экрана между кадрами опроса.
+
+Кадр делится на плитки; плитка считается изменившейся, если в ней отличается
+хотя бы один пиксель. Если за опрос ничего не изменилось, поиск шаблона можно
+пропустить, а если изменилась часть плиток - искать только в той части карты
+совпадений, на которую они влияют.
+"""
+
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    """Сравнивает очередной кадр с предыдущим по плиткам tile_size x tile_size"""
+
+    def __init__(self, tile_size=64):
+        self.tile_size = tile_size
+        self._previous = None
+
+    def reset(self):
+        """Забывает предыдущий кадр: следующий кадр будет считаться изменившимся целиком"""
+        self._previous = None
+
+    def update(self, frame):
+        """Сравнивает кадр с предыдущим и запоминает его.
+
+        Возвращает None, если сравнивать не с чем (первый кадр или другой размер),
+        иначе список изменившихся прямоугольников [(left, top, right, bottom), ...];
+        пустой список - кадр не изменился.
+        """
+        previous = self._previous
+        if previous is None or previous.shape != frame.shape:
+            self._previous = frame.copy()
+            return None
+
+        diff = cv2.absdiff(frame, previous)
+        np.copyto(previous, frame)
+
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        rows = np.arange(0, height, self.tile_size)
+        cols = np.arange(0, width, self.tile_size)
+
+        # Максимальное отличие в каждой плитке (с учетом неполных плиток на краях)
+        diff = diff.reshape(height, width * channels)
+        tiles = np.maximum.reduceat(diff, rows, axis=0)
+        tiles = np.maximum.reduceat(tiles, cols * channels, axis=1)
+        changed = (tiles > 0).astype(np.uint8)
+        if not changed.any():
+            return []
+
+        # Соседние изменившиеся плитки объединяем в прямоугольники
+        count, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+        rects = []
+        for label in range(1, count):
+            x, y, w, h = stats[label][:4]
+            rects.append((
+                int(x) * self.tile_size,
+                int(y) * self.tile_size,
+                min(width, int(x + w) * self.tile_size),
+                min(height, int(y + h) * self.tile_size),
+            ))
+        return rects
+
+
+def _merge_rects(rects):
+    """Объединяет пересекающиеся прямоугольники"""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        while rects:
+            left, top, right, bottom = rects.pop()
+            for i, (l, t, r, b) in enumerate(result):
+                if left < r and l < right and top < b and t < bottom:
+                    result[i] = (min(left, l), min(top, t), max(right, r), max(bottom, b))
+                    merged = True
+                    break
+            else:
+                result.append((left, top, right, bottom))
+        rects = result
+    return rects
+
+
+def affected_regions(changed_rects, window, template_shape):
+    """Возвращает участки экрана внутри window, где могло появиться новое совпадение.
+
+    Изменившийся пиксель влияет на все позиции шаблона, которые его накрывают,
+    поэтому каждый прямоугольник расширяется на размер шаблона. Возвращает
+    регионы (left, top, right, bottom), в которых помещается шаблон.
+    """
+    template_h, template_w = template_shape[:2]
+    w_left, w_top, w_right, w_bottom = window
+    regions = []
+    for left, top, right, bottom in changed_rects:
+        region = (
+            max(w_left, left - template_w + 1),
+            max(w_top, top - template_h + 1),
+            min(w_right, right + template_w - 1),
+            min(w_bottom, bottom + template_h - 1),
+        )
+        if region[2] - region[0] >= template_w and region[3] - region[1] >= template_h:
+            regions.append(region)
+    return _merge_rects(regions)
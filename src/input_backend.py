@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Отправка ввода (клавиатура и мышь) при воспроизведении.
+
+Текст, нажатия клавиш и клики превращаются в массивы событий и отправляются
+пачками: на Windows - одним вызовом SendInput на пачку. Задержка между
+нажатиями клавиш настраивается (INPUT_KEY_DELAY) и может быть нулевой - тогда
+вся строка уходит одной пачкой.
+
+События:
+    ('key', vk, down)      - виртуальная клавиша
+    ('char', char, down)   - символ Unicode (не зависит от раскладки)
+    ('move', x, y)         - курсор в точку (x, y) виртуального экрана
+    ('button', name, down) - кнопка мыши 'left' / 'right' / 'middle'
+
+RecordingBackend сохраняет события в памяти вместе со временем отправки:
+порядок и тайминг ввода можно проверить и замерить без Windows.
+
+Использование: python input_backend.py "текст" [--delay 0] [--repeat 100]
+"""
+
+import argparse
+import ctypes
+import sys
+import threading
+import time
+
+from config import get_config
+
+# Виртуальные клавиши по имени (имена как в действиях и в mouse_clicker.VK_CODE)
+NAMED_KEYS = {
+    'backspace': 0x08,
+    'tab': 0x09,
+    'enter': 0x0D,
+    'shift': 0x10,
+    'ctrl': 0x11,
+    'alt': 0x12,
+    'esc': 0x1B,
+    'space': 0x20,
+    'spacebar': 0x20,
+    'page_up': 0x21,
+    'page_down': 0x22,
+    'end': 0x23,
+    'home': 0x24,
+    'left_arrow': 0x25,
+    'up_arrow': 0x26,
+    'right_arrow': 0x27,
+    'down_arrow': 0x28,
+    'del': 0x2E,
+    'left_shift': 0xA0,
+}
+
+VK_SHIFT = NAMED_KEYS['left_shift']
+
+# Клавиши знаков препинания в раскладке US: символ -> (без Shift, с Shift)
+_OEM_KEYS = {
+    0xBA: (';', ':'),
+    0xBB: ('=', '+'),
+    0xBC: (',', '<'),
+    0xBD: ('-', '_'),
+    0xBE: ('.', '>'),
+    0xBF: ('/', '?'),
+    0xC0: ('`', '~'),
+    0xDB: ('[', '{'),
+    0xDC: ('\\', '|'),
+    0xDD: (']', '}'),
+    0xDE: ("'", '"'),
+}
+
+_SHIFTED_DIGITS = ')!@#$%^&*('
+
+
+def build_keymap():
+    """Строит таблицу символ -> (vk, нужен ли Shift) для раскладки US"""
+    keymap = {' ': (0x20, False), '\n': (0x0D, False), '\t': (0x09, False)}
+    for i, shifted in enumerate(_SHIFTED_DIGITS):
+        keymap[str(i)] = (0x30 + i, False)
+        keymap[shifted] = (0x30 + i, True)
+    for i in range(26):
+        keymap[chr(ord('a') + i)] = (0x41 + i, False)
+        keymap[chr(ord('A') + i)] = (0x41 + i, True)
+    for vk, (plain, shifted) in _OEM_KEYS.items():
+        keymap[plain] = (vk, False)
+        keymap[shifted] = (vk, True)
+    return keymap
+
+
+# Таблица строится один раз при импорте модуля
+KEYMAP = build_keymap()
+
+# Управляющие символы, которые в тексте всегда отправляются виртуальными клавишами
+_CONTROL_CHARS = {'\n': 0x0D, '\r': 0x0D, '\t': 0x09}
+
+
+def keystroke_events(vk, shift=False):
+    """События одного нажатия клавиши (с Shift при необходимости)"""
+    if shift:
+        return [('key', VK_SHIFT, True), ('key', vk, True), ('key', vk, False), ('key', VK_SHIFT, False)]
+    return [('key', vk, True), ('key', vk, False)]
+
+
+def text_keystrokes(text, use_keymap=True):
+    """Разбивает текст на нажатия: список списков событий, по одному на символ.
+
+    По умолчанию печатные символы отправляются виртуальными клавишами
+    US-раскладки из KEYMAP, символы вне таблицы - как Unicode;
+    use_keymap=False - все печатные символы как Unicode (результат не зависит
+    от раскладки, но часть приложений такой ввод не принимает).
+    """
+    strokes = []
+    for char in text:
+        vk = _CONTROL_CHARS.get(char)
+        if vk is not None:
+            strokes.append(keystroke_events(vk))
+        elif use_keymap and char in KEYMAP:
+            strokes.append(keystroke_events(*KEYMAP[char]))
+        else:
+            strokes.append([('char', char, True), ('char', char, False)])
+    return strokes
+
+
+class InputBackend:
+    """Базовый класс отправки ввода: строит пачки событий и отправляет их через _send"""
+
+    def __init__(self, key_delay=0.0, click_hold=0.05, unicode=False):
+        self.key_delay = key_delay  # пауза между нажатиями клавиш
+        self.click_hold = click_hold  # пауза между нажатием и отпусканием кнопки мыши
+        self.unicode = unicode  # вводить текст Unicode-символами вместо виртуальных клавиш
+
+    def _send(self, events):
+        """Отправляет пачку событий целиком"""
+        raise NotImplementedError
+
+    def send_strokes(self, strokes, delay=None):
+        """Отправляет нажатия: одной пачкой при нулевой задержке, иначе по одному"""
+        delay = self.key_delay if delay is None else delay
+        if delay <= 0:
+            self._send([event for stroke in strokes for event in stroke])
+            return
+        for i, stroke in enumerate(strokes):
+            if i:
+                time.sleep(delay)
+            self._send(stroke)
+
+    def type_text(self, text, use_keymap=None, delay=None):
+        """Вводит строку (use_keymap=None - по настройке источника, см. INPUT_UNICODE)"""
+        if use_keymap is None:
+            use_keymap = not self.unicode
+        if text:
+            self.send_strokes(text_keystrokes(text, use_keymap), delay)
+
+    def press_key(self, name):
+        """Нажимает и отпускает клавишу по имени из NAMED_KEYS"""
+        self._send(keystroke_events(NAMED_KEYS[name]))
+
+    def click(self, x, y, button='left'):
+        """Перемещает курсор в (x, y) и кликает кнопкой button"""
+        if self.click_hold <= 0:
+            self._send([('move', x, y), ('button', button, True), ('button', button, False)])
+            return
+        self._send([('move', x, y), ('button', button, True)])
+        time.sleep(self.click_hold)
+        self._send([('button', button, False)])
+
+
+class RecordingBackend(InputBackend):
+    """Сохраняет события в памяти вместо отправки: [(time.perf_counter(), событие), ...]"""
+
+    def __init__(self, key_delay=0.0, click_hold=0.05, unicode=False):
+        super().__init__(key_delay, click_hold, unicode)
+        self.events = []
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def _send(self, events):
+        now = time.perf_counter()
+        with self._lock:
+            self.batches += 1
+            self.events.extend((now, event) for event in events)
+
+    def text(self):
+        """Восстанавливает введенный текст по событиям (для проверок)"""
+        keys = {vk: plain for plain, (vk, shift) in KEYMAP.items() if not shift}
+        shifted = {vk: char for char, (vk, shift) in KEYMAP.items() if shift}
+        result = []
+        shift_down = False
+        for _, event in self.events:
+            kind, code, down = event[0], event[1], event[2]
+            if kind == 'key' and code == VK_SHIFT:
+                shift_down = down
+            elif kind == 'key' and down:
+                char = (shifted if shift_down else keys).get(code)
+                if char is not None:
+                    result.append(char)
+            elif kind == 'char' and down:
+                result.append(code)
+        return ''.join(result)
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+            self.batches = 0
+
+
+class SendInputBackend(InputBackend):
+    """Отправка через WinAPI SendInput: одна пачка - один системный вызов"""
+
+    INPUT_MOUSE = 0
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_UNICODE = 0x0004
+    MOUSEEVENTF_MOVE = 0x0001
+    MOUSEEVENTF_ABSOLUTE = 0x8000
+    MOUSEEVENTF_VIRTUALDESK = 0x4000
+    BUTTON_FLAGS = {
+        'left': (0x0002, 0x0004),
+        'right': (0x0008, 0x0010),
+        'middle': (0x0020, 0x0040),
+    }
+
+    def __init__(self, key_delay=0.0, click_hold=0.05, unicode=False):
+        super().__init__(key_delay, click_hold, unicode)
+        from ctypes import wintypes
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                        ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD),
+                        ('dwExtraInfo', ctypes.c_size_t)]
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                        ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class HARDWAREINPUT(ctypes.Structure):
+            _fields_ = [('uMsg', wintypes.DWORD), ('wParamL', wintypes.WORD), ('wParamH', wintypes.WORD)]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [('mi', MOUSEINPUT), ('ki', KEYBDINPUT), ('hi', HARDWAREINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('union', _INPUTUNION)]
+
+        self._INPUT = INPUT
+        self._user32 = ctypes.windll.user32
+
+    def _normalize(self, x, y):
+        """Переводит координаты виртуального экрана в 0..65535 для MOUSEEVENTF_ABSOLUTE"""
+        metrics = self._user32.GetSystemMetrics
+        left, top = metrics(76), metrics(77)  # SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN
+        width, height = metrics(78), metrics(79)  # SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN
+        return (
+            int(round((x - left) * 65535 / max(1, width - 1))),
+            int(round((y - top) * 65535 / max(1, height - 1))),
+        )
+
+    def _fill(self, item, event):
+        kind = event[0]
+        if kind == 'key':
+            item.type = self.INPUT_KEYBOARD
+            item.union.ki.wVk = event[1]
+            item.union.ki.dwFlags = 0 if event[2] else self.KEYEVENTF_KEYUP
+        elif kind == 'char':
+            item.type = self.INPUT_KEYBOARD
+            item.union.ki.wScan = event[1]
+            item.union.ki.dwFlags = self.KEYEVENTF_UNICODE | (0 if event[2] else self.KEYEVENTF_KEYUP)
+        elif kind == 'move':
+            item.type = self.INPUT_MOUSE
+            item.union.mi.dx, item.union.mi.dy = self._normalize(event[1], event[2])
+            item.union.mi.dwFlags = self.MOUSEEVENTF_MOVE | self.MOUSEEVENTF_ABSOLUTE | self.MOUSEEVENTF_VIRTUALDESK
+        elif kind == 'button':
+            down_flag, up_flag = self.BUTTON_FLAGS[event[1]]
+            item.type = self.INPUT_MOUSE
+            item.union.mi.dwFlags = down_flag if event[2] else up_flag
+
+    def _send(self, events):
+        # Символы вне BMP передаются двумя UTF-16 суррогатами
+        expanded = []
+        for event in events:
+            if event[0] == 'char':
+                units = event[1].encode('utf-16-le')
+                for i in range(0, len(units), 2):
+                    expanded.append(('char', int.from_bytes(units[i:i + 2], 'little'), event[2]))
+            else:
+                expanded.append(event)
+        if not expanded:
+            return
+        inputs = (self._INPUT * len(expanded))()
+        for item, event in zip(inputs, expanded):
+            self._fill(item, event)
+        sent = self._user32.SendInput(len(expanded), inputs, ctypes.sizeof(self._INPUT))
+        if sent != len(expanded):
+            raise OSError(f"SendInput отправил {sent} из {len(expanded)} событий")
+
+
+def create_input_backend(name=None):
+    """Создает источник ввода по имени: auto, sendinput или recording"""
+    cfg = get_config()
+    name = cfg.get_input_backend() if name is None else name
+    key_delay = cfg.get_input_key_delay()
+    click_hold = cfg.get_input_click_hold()
+    unicode = cfg.get_input_unicode()
+    if name == 'recording' or (name == 'auto' and sys.platform != 'win32'):
+        return RecordingBackend(key_delay, click_hold, unicode)
+    return SendInputBackend(key_delay, click_hold, unicode)
+
+
+# Глобальный источник ввода
+_input_backend = None
+
+
+def get_input_backend():
+    """Возвращает глобальный источник ввода (создается при первом обращении)"""
+    global _input_backend
+    if _input_backend is None:
+        _input_backend = create_input_backend()
+    return _input_backend
+
+
+def set_input_backend(backend):
+    """Подменяет глобальный источник ввода (например, на RecordingBackend в тестах)"""
+    global _input_backend
+    _input_backend = backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер отправки текста через RecordingBackend")
+    parser.add_argument('text', help='Текст для ввода')
+    parser.add_argument('--delay', type=float, default=0.0, help='Пауза между нажатиями (секунды)')
+    parser.add_argument('--repeat', type=int, default=100, help='Количество повторов')
+    parser.add_argument('--unicode', action='store_true', help='Отправлять символы как Unicode')
+    args = parser.parse_args()
+
+    backend = RecordingBackend(key_delay=args.delay)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        backend.type_text(args.text, use_keymap=not args.unicode)
+    elapsed = (time.perf_counter() - start) / args.repeat
+
+    events = len(backend.events) // args.repeat
+    batches = backend.batches // args.repeat
+    backend.clear()
+    backend.type_text(args.text, use_keymap=not args.unicode)
+    ok = backend.text() == args.text
+    print(f"Символов: {len(args.text)}, событий: {events}, пачек: {batches}")
+    print(f"Время на строку: {elapsed * 1000:.3f} мс (пауза между нажатиями {args.delay * 1000:.0f} мс)")
+    print(f"Текст по событиям {'совпадает' if ok else 'НЕ совпадает'} с исходным")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,8 +35,8 @@ def record_action(action_name):
         print(f"Ошибка при записи: {e}")
         sys.exit(1)
 
-def decompose_action(action_name):
-    """Декомпозиция действий на базовые"""
+def decompose_action(action_name, force=False):
+    """Декомпозиция действий на базовые (повторно - только если лог изменился)"""
     print(f"Декомпозиция действия '{action_name}'...")
     
     cfg = get_config()
@@ -50,7 +50,7 @@ def decompose_action(action_name):
     # Импорт и запуск модуля декомпозиции
     try:
         from decomposer import decompose_action as decompose_func
-        success = decompose_func(action_name)
+        success = decompose_func(action_name, force)
         if success:
             print(f"Результат декомпозиции сохранен в '{actions_file}'")
         else:
@@ -63,7 +63,14 @@ def decompose_action(action_name):
         print(f"Ошибка при декомпозиции: {e}")
         sys.exit(1)
 
-def play_action(action_name, actions_file=None, dynamic=False, delay=None, typing_params=None):
+def build_assets(action_names, force=False):
+    """Сборка референсных прямоугольников для действий (все действия, если список пуст)"""
+    from assets import build_all_assets
+    if build_all_assets(action_names, force):
+        sys.exit(1)
+
+def play_action(action_name, actions_file=None, dynamic=False, delay=None, typing_params=None,
+                wait_for_target=None):
     """Воспроизведение действий"""
     print(f"Воспроизведение действия '{action_name}'...")
     if dynamic:
@@ -73,15 +80,13 @@ def play_action(action_name, actions_file=None, dynamic=False, delay=None, typin
     cfg = get_config()
     actions_base_file = cfg.get_actions_base_file_path(action_name)
     
-    if not actions_base_file.exists():
-        # Проверяем, есть ли файл лога для декомпозиции
-        log_file = cfg.get_log_file_path(action_name)
-        if log_file.exists():
-            print(f"Файл базовых действий не найден. Выполняем декомпозицию...")
-            decompose_action(action_name)
-        else:
-            print(f"Ошибка: файл лога '{log_file}' не найден. Необходимо сначала записать действия.")
-            sys.exit(1)
+    log_file = cfg.get_log_file_path(action_name)
+    if log_file.exists():
+        # Декомпозиция по кэшу: повторяется, только если лог изменился
+        decompose_action(action_name)
+    elif not actions_base_file.exists():
+        print(f"Ошибка: файл лога '{log_file}' не найден. Необходимо сначала записать действия.")
+        sys.exit(1)
     
     # Проверяем, нужно ли создать сценарий перед воспроизведением
     if delay is not None or typing_params is not None:
@@ -110,7 +115,7 @@ def play_action(action_name, actions_file=None, dynamic=False, delay=None, typin
     # Импорт и запуск модуля воспроизведения
     try:
         from play import play_actions
-        success = play_actions(action_name, actions_file, dynamic)
+        success = play_actions(action_name, actions_file, dynamic, wait_for_target=wait_for_target)
         if success:
             print("Воспроизведение завершено")
         else:
@@ -123,9 +128,26 @@ def play_action(action_name, actions_file=None, dynamic=False, delay=None, typin
         print(f"Ошибка при воспроизведении: {e}")
         sys.exit(1)
 
+def play_playlist(playlist_file):
+    """Воспроизведение плейлиста: несколько действий и сценариев в одном процессе"""
+    try:
+        from playlist import PlaylistError, play_playlist as play_playlist_file
+        if not play_playlist_file(playlist_file):
+            sys.exit(1)
+    except FileNotFoundError:
+        print(f"Ошибка: файл плейлиста '{playlist_file}' не найден")
+        sys.exit(1)
+    except PlaylistError as e:
+        print(f"Ошибка в плейлисте: {e}")
+        sys.exit(1)
+
 def create_scenario(action_name, output_name, delay=None, typing_params=None, 
-                   click_params=None, sleep_time=3, cut=False):
-    """Создание сценария"""
+                   click_params=None, sleep_time=3, cut=False, expand=False, source_name=None):
+    """Создание сценария.
+
+    cut - True для интерактивной обрезки (F1) или строка-спецификация отрезков
+    для обрезки без воспроизведения; source_name - сценарий-источник для нее.
+    """
     print(f"Создание сценария '{output_name}' для действия '{action_name}'...")
     
     try:
@@ -136,14 +158,19 @@ def create_scenario(action_name, output_name, delay=None, typing_params=None,
         if cut:
             if any([delay, typing_params, click_params]):
                 print("Предупреждение: параметры delay/typing-params/click-params игнорируются при --cut")
-            creator.create_cut_scenario(output_name)
+            if isinstance(cut, str):
+                # Обрезка по номерам, ID, времени или скриншотам - без воспроизведения
+                creator.create_offline_cut_scenario(output_name, cut, source_name)
+            else:
+                creator.create_cut_scenario(output_name)
         else:
             # Создаем комплексный сценарий со всеми возможными модификациями
             creator.create_complex_scenario(
                 output_name=output_name,
                 delay=delay,
                 typing_params_file=typing_params_file,
-                sleep_time=sleep_time
+                sleep_time=sleep_time,
+                expand=expand
             )
         
         # Показываем информацию о созданном сценарии
@@ -168,6 +195,14 @@ def create_scenario(action_name, output_name, delay=None, typing_params=None,
 
 def main():
     """Главная функция CLI"""
+    # Демон воспроизведения и клиент к нему - отдельные команды со своими параметрами
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from serve import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'remote':
+        from serve import client_main
+        sys.exit(client_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
         description="Looper - программа для записи и воспроизведения действий пользователя",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -175,6 +210,7 @@ def main():
 Примеры использования:
   looper -r open_notepad
   looper -p open_notepad --dynamic
+  looper -p open_notepad --dynamic --wait-for-target
   looper -p open_notepad --dynamic --delay 2.5 
   looper -p open_notepad --dynamic --delay 2.5 --typing-params xxx.csv
   Для разработчиков:
@@ -182,6 +218,13 @@ def main():
   looper -p open_notepad -f custom_actions.json
   looper -p open_notepad -f custom_actions.json --dynamic
   looper -sc open_notepad -o my_scenario --delay 1.5
+  looper --build-assets
+  looper --playlist daily.json
+  Демон воспроизведения (без загрузки модулей и паузы перед каждым запуском):
+  looper serve --preload open_notepad
+  looper remote play open_notepad --dynamic --wait
+  looper remote status
+  looper remote stop
         """
     )
     
@@ -202,11 +245,22 @@ def main():
         metavar='ACTION_NAME',
         help='Воспроизведение действий'
     )
+    mode_group.add_argument(
+        '--playlist',
+        metavar='FILE',
+        help='Воспроизвести плейлист (JSON или YAML): несколько действий и сценариев подряд'
+    )
     mode_group.add_argument(
         '--scenario', '-sc',
         metavar='ACTION_NAME',
         help='Создание сценариев'
     )
+    mode_group.add_argument(
+        '--build-assets',
+        nargs='*',
+        metavar='ACTION_NAME',
+        help='Собрать референсные прямоугольники *_rr.png (по умолчанию - для всех действий)'
+    )
     mode_group.add_argument(
         '--version', '-v',
         action='version',
@@ -224,6 +278,12 @@ def main():
         action='store_true',
         help='Динамический режим воспроизведения (поиск по референсным прямоугольникам)'
     )
+    parser.add_argument(
+        '--wait-for-target',
+        action='store_true',
+        default=None,
+        help='Заканчивать ожидание перед кликом, как только найдена его цель (с --dynamic)'
+    )
     
     # Параметры для создания сценариев
     parser.add_argument(
@@ -255,9 +315,25 @@ def main():
         help='Время ожидания между сценариями в секундах (по умолчанию: 3)'
     )
     parser.add_argument(
-        '--cut',
+        '--expand',
+        action='store_true',
+        help='Развернуть все строки --typing-params в один список действий (по умолчанию строки подставляются при воспроизведении)'
+    )
+    parser.add_argument(
+        '--force',
         action='store_true',
-    help='Обрезать сценарий на момент нажатия F1 во время воспроизведения'
+        help='Выполнить декомпозицию заново, не используя кэш (с --decompose); '
+             'пересоздать все *_rr.png (с --build-assets)'
+    )
+    parser.add_argument(
+        '--cut',
+        nargs='?',
+        const=True,
+        metavar='SEGMENTS',
+        help='Обрезать сценарий на момент нажатия F1 во время воспроизведения; '
+             'с SEGMENTS - без воспроизведения: номера "3-10,15", "id:12-40", "t:2.5-30", '
+             '"screen:5-9" (источник - базовые действия или -f); отрезки, начинающиеся с "-", '
+             'передавайте через "=": --cut=-5,8'
     )
     
     args = parser.parse_args()
@@ -266,9 +342,14 @@ def main():
         if args.record:
             record_action(args.record)
         elif args.decompose:
-            decompose_action(args.decompose)
+            decompose_action(args.decompose, args.force)
+        elif args.build_assets is not None:
+            build_assets(args.build_assets, args.force)
         elif args.play:
-            play_action(args.play, args.actions_file, args.dynamic, args.delay, args.typing_params)
+            play_action(args.play, args.actions_file, args.dynamic, args.delay, args.typing_params,
+                        args.wait_for_target)
+        elif args.playlist:
+            play_playlist(args.playlist)
         elif args.scenario:
             if not args.output:
                 print("Ошибка: для режима --scenario необходимо указать --output")
@@ -280,7 +361,9 @@ def main():
                 args.typing_params, 
                 args.click_params, 
                 args.sleep,
-                args.cut
+                args.cut or False,
+                args.expand,
+                args.actions_file
             )
     except KeyboardInterrupt:
         print("\nПрерывание по запросу пользователя")
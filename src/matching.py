@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Движки поиска шаблона на скриншоте: полный перебор и пирамидальный (coarse-to-fine)
+"""
+
+from pathlib import Path
+
+import cv2
+
+from config import get_config
+
+ENGINE_EXHAUSTIVE = 'exhaustive'
+ENGINE_PYRAMID = 'pyramid'
+ENGINES = [ENGINE_EXHAUSTIVE, ENGINE_PYRAMID]
+
+# Минимальный размер шаблона на самом грубом уровне пирамиды
+MIN_TEMPLATE_SIZE = 8
+
+# Максимальное количество возвращаемых кандидатов
+MAX_CANDIDATES = 10
+
+# Насколько грубое совпадение кандидата может быть хуже первого подтвержденного
+COARSE_MARGIN = 0.05
+
+# Кандидаты, отличающиеся от лучшего меньше чем на эту величину, считаются равноценными
+AMBIGUITY_TOLERANCE = 0.0001
+
+# Политики выбора среди нескольких совпадений
+POLICY_BEST = 'best'
+POLICY_NEAREST = 'nearest'
+POLICY_STRICT = 'strict'
+POLICIES = [POLICY_BEST, POLICY_NEAREST, POLICY_STRICT]
+
+
+def to_gray(image):
+    """Переводит BGR-изображение в оттенки серого (одноканальные не меняет)"""
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def build_pyramid(image, levels):
+    """Строит пирамиду изображения: [исходное, 1/2, 1/4, ...] (всего до levels + 1 уровней).
+
+    Уменьшенные уровни хранятся в оттенках серого: на них только отбираются
+    кандидаты, а это в несколько раз дешевле, чем по трем каналам.
+    """
+    pyramid = [image]
+    level_image = to_gray(image)
+    for _ in range(levels):
+        h, w = level_image.shape[:2]
+        if h < 2 or w < 2:
+            break
+        level_image = cv2.pyrDown(level_image)
+        pyramid.append(level_image)
+    return pyramid
+
+
+def get_pyramid_level_path(rr_path, level):
+    """Путь к файлу уровня пирамиды шаблона: 1_rr.png -> 1_rr_l2.png"""
+    rr_path = Path(rr_path)
+    return rr_path.with_name(f"{rr_path.stem}_l{level}{rr_path.suffix}")
+
+
+def ensure_template_pyramid(rr_path, levels=None):
+    """Создает рядом с *_rr.png уменьшенные уровни пирамиды, если их нет или они устарели.
+
+    Возвращает список путей к уровням (без исходного файла).
+    """
+    levels = get_config().get_pyramid_levels() if levels is None else levels
+    rr_path = Path(rr_path)
+    level_paths = [get_pyramid_level_path(rr_path, level) for level in range(1, levels + 1)]
+
+    rr_mtime = rr_path.stat().st_mtime
+    if all(p.exists() and p.stat().st_mtime >= rr_mtime for p in level_paths):
+        return level_paths
+
+    template = cv2.imread(str(rr_path), cv2.IMREAD_COLOR)
+    if template is None:
+        return []
+
+    pyramid = build_pyramid(template, levels)
+    for level_path, level_image in zip(level_paths, pyramid[1:]):
+        cv2.imwrite(str(level_path), level_image)
+    return level_paths[:len(pyramid) - 1]
+
+
+def load_template_pyramid(rr_path, cache, levels=None):
+    """Загружает пирамиду шаблона через кэш шаблонов; недостающие уровни строит на лету"""
+    levels = get_config().get_pyramid_levels() if levels is None else levels
+    template = cache.get(rr_path)
+    if template is None:
+        return None
+
+    pyramid = [template]
+    for level in range(1, levels + 1):
+        level_image = cache.get(get_pyramid_level_path(rr_path, level), cv2.IMREAD_GRAYSCALE)
+        if level_image is None:
+            return build_pyramid(template, levels)
+        pyramid.append(level_image)
+    return pyramid
+
+
+def _usable_levels(screen_shape, template_pyramid):
+    """Самый грубый уровень, на котором шаблон еще достаточно велик и помещается в экран"""
+    screen_h, screen_w = screen_shape[:2]
+    usable = 0
+    for level, level_template in enumerate(template_pyramid):
+        t_h, t_w = level_template.shape[:2]
+        scale = 2 ** level
+        if level > 0 and min(t_h, t_w) < MIN_TEMPLATE_SIZE:
+            break
+        if t_h > screen_h // scale or t_w > screen_w // scale:
+            break
+        usable = level
+    return usable
+
+
+def _suppress(result, loc, half_h, half_w):
+    """Зануляет (значением -1) окрестность пика на карте совпадений"""
+    x, y = loc
+    res_h, res_w = result.shape[:2]
+    result[max(0, y - half_h):min(res_h, y + half_h + 1),
+           max(0, x - half_w):min(res_w, x + half_w + 1)] = -1.0
+
+
+def _overlaps(loc, other, template_shape):
+    """Пересекаются ли шаблоны, размещенные в позициях loc и other"""
+    t_h, t_w = template_shape[:2]
+    return abs(loc[0] - other[0]) < t_w and abs(loc[1] - other[1]) < t_h
+
+
+def find_peaks(result, threshold, template_shape, max_peaks=MAX_CANDIDATES):
+    """Находит на карте совпадений все пики не ниже threshold.
+
+    После каждого пика подавляется окрестность, в которой шаблон пересекался бы
+    с уже найденным, и читается следующий максимум. Карта result изменяется.
+    Возвращает [(score, (x, y)), ...] по убыванию score.
+    """
+    t_h, t_w = template_shape[:2]
+    peaks = []
+    while len(peaks) < max_peaks:
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < threshold or max_val <= -1.0:
+            break
+        peaks.append((max_val, max_loc))
+        _suppress(result, max_loc, t_h - 1, t_w - 1)
+    return peaks
+
+
+def match_exhaustive(screen, template, method=cv2.TM_CCORR_NORMED):
+    """Полный перебор всех позиций шаблона. Возвращает (max_val, max_loc)"""
+    result = cv2.matchTemplate(screen, template, method)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def exhaustive_candidates(screen, template, threshold, method=cv2.TM_CCORR_NORMED,
+                          max_peaks=MAX_CANDIDATES):
+    """Полный перебор; возвращает все пики не ниже threshold из одной карты совпадений"""
+    result = cv2.matchTemplate(screen, template, method)
+    return find_peaks(result, threshold, template.shape, max_peaks)
+
+
+def _pyramid_search(screen, template_pyramid, threshold, method, candidates, max_peaks):
+    """Пирамидальный поиск. Возвращает (пики не ниже threshold, лучшее (score, loc) среди проверенных)"""
+    template = template_pyramid[0]
+    level = _usable_levels(screen.shape, template_pyramid)
+    if level == 0:
+        result = cv2.matchTemplate(screen, template, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return find_peaks(result, threshold, template.shape, max_peaks), (max_val, max_loc)
+
+    screen_level = to_gray(screen)
+    for _ in range(level):
+        screen_level = cv2.pyrDown(screen_level)
+
+    coarse = cv2.matchTemplate(screen_level, template_pyramid[level], cv2.TM_CCOEFF_NORMED)
+    cv2.patchNaNs(coarse, -1.0)  # однотонный шаблон дает NaN
+    t_h, t_w = template.shape[:2]
+    c_t_h, c_t_w = template_pyramid[level].shape[:2]
+    screen_h, screen_w = screen.shape[:2]
+    scale = 2 ** level
+
+    peaks = []
+    best = (-1.0, (0, 0))
+    first_coarse_val = None
+    for _ in range(candidates):
+        _, coarse_val, _, (cx, cy) = cv2.minMaxLoc(coarse)
+        if coarse_val <= -1.0:
+            break
+        if first_coarse_val is not None and coarse_val < first_coarse_val - COARSE_MARGIN:
+            # Оставшиеся кандидаты заметно хуже уже подтвержденного совпадения
+            break
+
+        # Подавляем окрестность найденного пика, чтобы следующий кандидат был в другом месте
+        _suppress(coarse, (cx, cy), c_t_h // 2, c_t_w // 2)
+
+        # Уточняем позицию в полном разрешении в небольшом окне вокруг кандидата
+        pad = scale + 1
+        left = max(0, cx * scale - pad)
+        top = max(0, cy * scale - pad)
+        right = min(screen_w, cx * scale + pad + t_w)
+        bottom = min(screen_h, cy * scale + pad + t_h)
+        if right - left < t_w or bottom - top < t_h:
+            continue
+
+        val, loc = match_exhaustive(screen[top:bottom, left:right], template, method)
+        loc = (loc[0] + left, loc[1] + top)
+        if val > best[0]:
+            best = (val, loc)
+        if val < threshold:
+            continue
+
+        if first_coarse_val is None:
+            first_coarse_val = coarse_val
+        # Соседние кандидаты грубого уровня могут уточниться в тот же пик
+        duplicate = [p for p in peaks if _overlaps(p[1], loc, template.shape)]
+        if duplicate:
+            if val > duplicate[0][0]:
+                peaks.remove(duplicate[0])
+                peaks.append((val, loc))
+            continue
+        peaks.append((val, loc))
+        if len(peaks) >= max_peaks:
+            break
+
+    peaks.sort(key=lambda p: p[0], reverse=True)
+    return peaks, best
+
+
+def match_pyramid(screen, template_pyramid, threshold, method=cv2.TM_CCORR_NORMED, candidates=50):
+    """Пирамидальный поиск: кандидаты на уменьшенных изображениях, проверка в полном разрешении.
+
+    Кандидаты отбираются по TM_CCOEFF_NORMED: на светлых интерфейсах TM_CCORR_NORMED
+    дает почти 1.0 на любом однотонном фоне и не различает кандидатов. Итоговое
+    значение совпадения вычисляется в полном разрешении исходным методом, как и
+    при полном переборе, поэтому пороги остаются прежними.
+    Возвращает (max_val, max_loc).
+    """
+    _, best = _pyramid_search(screen, template_pyramid, threshold, method, candidates, MAX_CANDIDATES)
+    return best
+
+
+def pyramid_candidates(screen, template_pyramid, threshold, method=cv2.TM_CCORR_NORMED,
+                       candidates=50, max_peaks=MAX_CANDIDATES):
+    """Пирамидальный поиск; возвращает все подтвержденные пики не ниже threshold"""
+    peaks, _ = _pyramid_search(screen, template_pyramid, threshold, method, candidates, max_peaks)
+    return peaks
+
+
+def _get_pyramid(template, engine, template_pyramid):
+    engine = get_config().get_match_engine() if engine is None else engine
+    if engine == ENGINE_PYRAMID and template_pyramid is None:
+        template_pyramid = build_pyramid(template, get_config().get_pyramid_levels())
+    return engine, template_pyramid
+
+
+def match_template(screen, template, threshold, method=cv2.TM_CCORR_NORMED,
+                   engine=None, template_pyramid=None):
+    """Ищет шаблон на экране выбранным движком (MATCH_ENGINE). Возвращает (max_val, max_loc)"""
+    engine, template_pyramid = _get_pyramid(template, engine, template_pyramid)
+    if engine == ENGINE_PYRAMID:
+        return match_pyramid(screen, template_pyramid, threshold, method)
+    return match_exhaustive(screen, template, method)
+
+
+def find_candidates(screen, template, threshold, method=cv2.TM_CCORR_NORMED,
+                    engine=None, template_pyramid=None, max_peaks=MAX_CANDIDATES):
+    """Ищет все позиции шаблона не ниже threshold без повторного поиска.
+
+    Возвращает [(score, (x, y)), ...] по убыванию score; пустой список - совпадений нет.
+    """
+    engine, template_pyramid = _get_pyramid(template, engine, template_pyramid)
+    if engine == ENGINE_PYRAMID:
+        return pyramid_candidates(screen, template_pyramid, threshold, method, max_peaks=max_peaks)
+    return exhaustive_candidates(screen, template, threshold, method, max_peaks)
+
+
+def find_candidates_in_regions(screen, regions, template, threshold, method=cv2.TM_CCORR_NORMED,
+                               engine=None, template_pyramid=None, max_peaks=MAX_CANDIDATES):
+    """Ищет кандидатов только в указанных непересекающихся регионах экрана.
+
+    Возвращает [(score, (x, y)), ...] в координатах screen по убыванию score.
+    """
+    candidates = []
+    for left, top, right, bottom in regions:
+        found = find_candidates(screen[top:bottom, left:right], template, threshold, method,
+                                engine, template_pyramid, max_peaks)
+        candidates.extend((score, (x + left, y + top)) for score, (x, y) in found)
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    return candidates[:max_peaks]
+
+
+def is_ambiguous(candidates, tolerance=AMBIGUITY_TOLERANCE):
+    """Есть ли среди кандидатов второй, практически равный лучшему"""
+    return len(candidates) > 1 and candidates[0][0] - candidates[1][0] < tolerance
+
+
+def select_candidate(candidates, policy=POLICY_BEST, point=None, tolerance=AMBIGUITY_TOLERANCE):
+    """Выбирает кандидата по политике.
+
+    best - лучший по совпадению; nearest - ближайший к point среди равных лучшему;
+    strict - None, если лучших совпадений несколько.
+    """
+    if not candidates:
+        return None
+    best_score = candidates[0][0]
+    ties = [c for c in candidates if best_score - c[0] < tolerance]
+
+    if policy == POLICY_STRICT and len(ties) > 1:
+        return None
+    if policy == POLICY_NEAREST and point is not None and len(ties) > 1:
+        px, py = point
+        return min(ties, key=lambda c: (c[1][0] - px) ** 2 + (c[1][1] - py) ** 2)
+    return candidates[0]
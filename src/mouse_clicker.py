@@ -12,14 +12,12 @@ import ctypes
 from ctypes import wintypes
 
 def click_left(x,y):
-    win32api.SetCursorPos((x,y))
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN,x,y,0,0)
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP,x,y,0,0)
+    from input_backend import get_input_backend
+    get_input_backend().click(x, y, 'left')
 
 def click_right(x,y):
-    win32api.SetCursorPos((x,y))
-    win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTDOWN,x,y,0,0)
-    win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTUP,x,y,0,0)
+    from input_backend import get_input_backend
+    get_input_backend().click(x, y, 'right')
 
 def get_cursor_coordinates():
     return win32api.GetCursorPos()
@@ -240,340 +238,10 @@ def release(*args):
     for i in args:
            win32api.keybd_event(VK_CODE[i],0 ,win32con.KEYEVENTF_KEYUP ,0)
 
-
 def typer(string=None,*args):
-##    time.sleep(4)
-    for i in string:
-        if i == ' ':
-            win32api.keybd_event(VK_CODE['spacebar'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['spacebar'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '!':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['1'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['1'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '@':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['2'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['2'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '{':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['['], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['['],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '?':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['/'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['/'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == ':':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE[';'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE[';'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '"':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['\''], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['\''],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '}':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE[']'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE[']'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '#':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['3'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['3'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '$':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['4'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['4'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '%':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['5'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['5'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '^':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['6'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['6'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '&':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['7'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['7'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '*':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['8'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['8'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '(':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['9'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['9'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == ')':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['0'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['0'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '_':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['-'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['-'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-
-        elif i == '=':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['+'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['+'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '~':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['`'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['`'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '<':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE[','], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE[','],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == '>':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['.'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['.'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'A':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['a'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['a'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'B':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['b'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['b'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'C':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['c'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['c'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'D':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['d'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['d'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'E':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['e'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['e'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'F':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['f'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['f'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'G':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['g'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['g'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'H':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['h'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['h'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'I':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['i'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['i'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'J':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['j'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['j'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'K':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['k'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['k'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'L':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['l'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['l'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'M':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['m'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['m'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'N':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['n'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['n'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'O':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['o'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['o'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'P':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['p'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['p'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'Q':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['q'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['q'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'R':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['r'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['r'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'S':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['s'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['s'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'T':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['t'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['t'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'U':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['u'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['u'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'V':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['v'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['v'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'W':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['w'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['w'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'X':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['x'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['x'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'Y':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['y'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['y'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-        elif i == 'Z':
-            win32api.keybd_event(VK_CODE['left_shift'], 0,0,0)
-            win32api.keybd_event(VK_CODE['z'], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE['left_shift'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-            win32api.keybd_event(VK_CODE['z'],0 ,win32con.KEYEVENTF_KEYUP ,0)
-
-    
-        else:    
-            win32api.keybd_event(VK_CODE[i], 0,0,0)
-            time.sleep(.05)
-            win32api.keybd_event(VK_CODE[i],0 ,win32con.KEYEVENTF_KEYUP ,0)
\ No newline at end of file
+    '''
+    types string with US-layout virtual keys (Shift is added where needed).
+    pause between keystrokes is INPUT_KEY_DELAY from looper.config.
+    '''
+    from input_backend import get_input_backend
+    get_input_backend().type_text(string or '', use_keymap=True)
@@ -3,75 +3,167 @@
 Модуль воспроизведения базовых действий
 """
 
+import errno
 import json
 import time
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import cv2
-import numpy as np
 from pathlib import Path
-import win32api
-import win32con
 import win32gui
 from pynput import keyboard
 from config import get_config
 import mouse_clicker as mc
+from template_cache import get_template_cache
+from capture import get_capture_backend
+import matching
+from frame_diff import FrameChangeDetector, affected_regions
+from scheduler import PlaybackScheduler
+from input_backend import get_input_backend
+from scenario_format import unique_actions
+from scenario_flow import ActionStream, FlowError, flow_leaf_actions
+from scenario_plan import ExecutionPlan, PlanError, close_scenario, prepare_scenario
+from scenario_binary import BINARY_SUFFIX
+from assets import build_reference_rectangles, get_rr_path
+from results import (ActionResult, PlaybackResult, ACTION_ERROR, ACTION_FAILED, ACTION_SKIPPED,
+                     PLAYBACK_CUT, PLAYBACK_ERROR, PLAYBACK_FAILED, PLAYBACK_NOT_READY,
+                     PLAYBACK_STOPPED)
+
+
+class PlaybackControl:
+    """Состояние воспроизведения: прерывание (ESC, stop()), обрезка (F1) и слушатель клавиатуры.
+
+    Свой объект у каждого сеанса (api.Session), демона и плейлиста; функции
+    модуля без явного control используют общий объект модуля.
+    """
 
-# Попытка импорта PIL для скриншотов
-try:
-    from PIL import ImageGrab,Image,ImageDraw
-    PIL_AVAILABLE = True
-except ImportError:
-    print("Внимание: PIL (Pillow) не установлен. Скриншоты будут отключены.")
-    print("Для установки выполните: pip install pillow")
-    PIL_AVAILABLE = False
-    
-
-# Глобальная переменная для отслеживания прерывания
-stop_playback = False
-_cut_mode_control = None  # используется при cut_mode для передачи состояния
-
-def on_key_press(key):
-    """Обработчик нажатий клавиш: ESC (прерывание) и F1 (обрезка в cut_mode)."""
-    global stop_playback, _cut_mode_control
-    if key == keyboard.Key.esc:
-        print("\nПолучен сигнал прерывания (ESC). Останавливаем воспроизведение...")
-        stop_playback = True
-        if _cut_mode_control is not None:
-            _cut_mode_control['cut'] = False
-        return False
-    if _cut_mode_control is not None and key == keyboard.Key.f1:
-        print("\nПолучен сигнал обрезки (F1). Останавливаем воспроизведение...")
-        stop_playback = True
-        _cut_mode_control['cut'] = True
+    def __init__(self):
+        self.stop_event = threading.Event()  # прерывает ожидания сразу после ESC/F1/stop()
+        self.cut_mode = False
+        self.cut = False  # остановлено по F1 в cut_mode
+        self._listener = None
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def reset(self, cut_mode=False):
+        """Подготовка к новому запуску"""
+        self.stop_event.clear()
+        self.cut_mode = cut_mode
+        self.cut = False
+
+    def stop(self):
+        """Прерывает текущее воспроизведение (как ESC); можно вызывать из другого потока"""
+        self.stop_event.set()
+
+    def on_key_press(self, key):
+        """Обработчик нажатий клавиш: ESC (прерывание) и F1 (обрезка в cut_mode)."""
+        if key == keyboard.Key.esc:
+            print("\nПолучен сигнал прерывания (ESC). Останавливаем воспроизведение...")
+            self.cut = False
+            self.stop()
+            return False
+        if self.cut_mode and key == keyboard.Key.f1:
+            print("\nПолучен сигнал обрезки (F1). Останавливаем воспроизведение...")
+            self.cut = True
+            self.stop()
+            return False
+
+    @property
+    def listening(self):
+        return self._listener is not None and self._listener.running
+
+    def start_listener(self):
+        """Запускает слушатель клавиатуры; он может обслуживать несколько запусков подряд"""
+        if not self.listening:
+            self._listener = keyboard.Listener(on_press=self.on_key_press)
+            self._listener.start()
+
+    def stop_listener(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+# Состояние для вызовов без явного control (CLI)
+_default_control = PlaybackControl()
+
+
+def get_default_control():
+    return _default_control
+
+
+def wait_until_ready(timeout=5.0, control=None):
+    """Проверка готовности к воспроизведению вместо фиксированной паузы.
+
+    Готово, когда источник кадров отдает кадр экрана (для динамического
+    режима и условий) и создан способ отправки ввода. Возвращает True/False.
+    """
+    control = control or _default_control
+    deadline = time.time() + timeout
+    try:
+        get_input_backend()
+    except Exception as e:
+        print(f"Отправка ввода недоступна: {e}")
         return False
+    while not control.stopped:
+        if take_screenshot() is not None:
+            return True
+        if time.time() >= deadline:
+            break
+        control.stop_event.wait(0.1)
+    print(f"Экран не готов в течение {timeout} секунд")
+    return False
+
 
 def on_key_release(key):
     """Пока не используется (оставлено для совместимости)."""
     return
 
 
-def execute_mouse_click(action, dynamic=False, action_dir=None):
-    """Выполняет клик мышью"""
+def get_click_reference(action, action_dir):
+    """Возвращает (путь к *_rr.png, записанная точка клика в координатах скриншота, границы экрана)"""
+    # У шагов плана (scenario_plan) путь уже вычислен
+    rr_path = action.get('rr_path') or get_rr_path(action_dir, action.get('screen', ''))
+    bounds = mc.get_virtual_screen_bounds()
+    center = (action.get('x', 0) - bounds['min_x'], action.get('y', 0) - bounds['min_y'])
+    return rr_path, center, bounds
+
+
+def execute_mouse_click(action, dynamic=False, action_dir=None, prefetched=None, control=None, details=None):
+    """Выполняет клик мышью.
+
+    prefetched - кандидаты, найденные заранее фоновым поиском (ClickPrefetcher);
+    перед кликом выбранная позиция перепроверяется на свежем кадре. Пустой
+    список означает, что фоновый поиск не дал результата за время ожидания:
+    тогда цель, как и без фонового поиска, ищется на экране заново.
+    details - словарь для подробностей: score (совпадение цели), location
+    (точка клика), prefetched (позиция из фонового поиска).
+    """
+    if details is None:
+        details = {}
     x = action.get('x', 0)
     y = action.get('y', 0)
     button = action.get('button', 'left')
     
     if dynamic and 'screen' in action and action_dir:
         # Динамический режим - ищем координаты по референсному прямоугольнику
-        screen_file = action.get('screen', '')
-        rr_file = screen_file.replace('.png', '_rr.png')
-        rr_path = action_dir / rr_file
-        bounds = mc.get_virtual_screen_bounds()
+        rr_path, (_x, _y), bounds = get_click_reference(action, action_dir)
         
         if not rr_path.exists():
             # Создаем референсный прямоугольник если его нет
-            
-            _x = x - bounds['min_x']
-            _y = y - bounds['min_y'] 
-            create_reference_rectangle(action_dir / screen_file, rr_path, _x, _y)
+            build_reference_rectangles([action], action_dir, workers=1)
         
-        # Ищем референсный прямоугольник на экране
-        found_coords = find_reference_rectangle_on_screen(rr_path)
+        found_coords = None
+        if prefetched:
+            found_coords = use_prefetched_location(rr_path, prefetched, center=(_x, _y), details=details)
+            details['prefetched'] = found_coords is not None
+        if found_coords is None:
+            # Ищем референсный прямоугольник на экране, начиная с окрестности записанной точки
+            found_coords = find_reference_rectangle_on_screen(rr_path, center=(_x, _y), control=control,
+                                                              details=details)
         if found_coords:
             _x, _y = found_coords
             x = _x + bounds['min_x']
@@ -84,19 +176,11 @@ def execute_mouse_click(action, dynamic=False, action_dir=None):
 
 
     print(f"Клик {button} кнопкой мыши в точке ({x}, {y})")
+    details['location'] = (x, y)
     
-    # Устанавливаем курсор в нужную позицию
-    win32api.SetCursorPos((x, y))
-    
-    # Выполняем клик
-    if button == 'left':
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-        time.sleep(0.05)  # Небольшая задержка между нажатием и отпусканием
-        win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
-    elif button == 'right':
-        win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTDOWN, x, y, 0, 0)
-        time.sleep(0.05)
-        win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTUP, x, y, 0, 0)
+    # Перемещение курсора и клик отправляются пачкой событий
+    if button in ['left', 'right']:
+        get_input_backend().click(x, y, button)
 
     return True
 
@@ -105,145 +189,322 @@ def execute_typing(action):
     """Выполняет ввод текста"""
     text = action.get('text', '')
     print(f"Ввод текста: '{text}'")
-    
-    # Используем pynput для ввода текста
-    kb = keyboard.Controller()
-    kb.type(text)
+    get_input_backend().type_text(text)
 
 
 def execute_enter():
     """Выполняет нажатие Enter"""
     print("Нажатие Enter")
-    kb = keyboard.Controller()
-    kb.press(keyboard.Key.enter)
-    kb.release(keyboard.Key.enter)
+    get_input_backend().press_key('enter')
 
 
 def execute_space():
     """Выполняет нажатие Space"""
     print("Нажатие Space")
-    kb = keyboard.Controller()
-    kb.press(keyboard.Key.space)
-    kb.release(keyboard.Key.space)
+    get_input_backend().press_key('space')
 
 
-def create_reference_rectangle(source_image_path, output_path, center_x, center_y, size=50):
-    """Создает референсный прямоугольник размером 50x50 с центром в указанных координатах"""
-    if not PIL_AVAILABLE:
-        print("Внимание: PIL не доступен, референсный прямоугольник не может быть создан")
-        return False
-    
-    try:
-        if not source_image_path.exists():
-            print(f"Исходное изображение не найдено: {source_image_path}")
-            return False
-        
-        # Загружаем исходное изображение
-        image = Image.open(source_image_path)
-        
-        # Вычисляем координаты прямоугольника
-        half_size = size // 2
-        left = max(0, center_x - half_size)
-        top = max(0, center_y - half_size)
-        right = min(image.width, center_x + half_size)
-        bottom = min(image.height, center_y + half_size)
-        
-        # Вырезаем прямоугольник
-        reference_rect = image.crop((left, top, right, bottom))
-        
-        # Сохраняем
-        reference_rect.save(output_path)
-        print(f"Создан референсный прямоугольник: {output_path}")
-        return True
-        
-    except Exception as e:
-        print(f"Ошибка при создании referencer rectangle: {e}")
-        return False
-
+def get_search_windows(center, template_shape, screen_shape, radius=None, growth=None, steps=None):
+    """Возвращает список окон поиска [(радиус, (left, top, right, bottom)), ...].
 
-def find_reference_rectangle_on_screen(rr_path, timeout=15, threshold=0.9):
-    """Ищет референсный прямоугольник на экране"""
+    Окна расширяются от записанной точки клика center; последним всегда идет
+    весь экран (радиус None). Координаты - в системе координат скриншота.
+    """
+    cfg = get_config()
+    radius = cfg.get_search_radius() if radius is None else radius
+    growth = cfg.get_search_growth() if growth is None else growth
+    steps = cfg.get_search_steps() if steps is None else steps
+
+    screen_h, screen_w = screen_shape[:2]
+    template_h, template_w = template_shape[:2]
+    windows = []
+
+    if center is not None and radius > 0:
+        cx, cy = center
+        r = float(radius)
+        for _ in range(max(steps, 0)):
+            # Окно охватывает все позиции шаблона, центр которых не дальше r от точки клика
+            left = max(0, int(cx - r) - template_w // 2)
+            top = max(0, int(cy - r) - template_h // 2)
+            right = min(screen_w, int(cx + r) + template_w - template_w // 2)
+            bottom = min(screen_h, int(cy + r) + template_h - template_h // 2)
+            if left == 0 and top == 0 and right == screen_w and bottom == screen_h:
+                # Окно уже покрывает весь экран
+                break
+            if right - left >= template_w and bottom - top >= template_h:
+                windows.append((int(r), (left, top, right, bottom)))
+            r *= growth
+
+    windows.append((None, (0, 0, screen_w, screen_h)))
+    return windows
+
+
+def locate_reference_rectangle(rr_path, timeout=15, threshold=0.9, center=None, cancel_event=None, control=None):
+    """Ищет референсный прямоугольник на экране и возвращает все найденные позиции.
+
+    Если указан center (записанная точка клика в координатах скриншота), поиск
+    начинается в окне вокруг нее и расширяется по шагам; весь экран
+    просматривается только если ни одно окно не дало совпадения.
+    Возвращает [(score, (center_x, center_y)), ...] по убыванию score
+    или None, если за timeout совпадений не найдено. Поиск прекращается
+    досрочно при установке cancel_event или прерывании воспроизведения.
+    """
+    control = control or _default_control
     if not rr_path.exists():
         print(f"Файл референсного прямоугольника не найден: {rr_path}")
         return None
     
-    template = cv2.imread(str(rr_path), cv2.IMREAD_COLOR)
+    template = get_template_cache().get(rr_path)
     if template is None:
         print(f"Не удалось загрузить референсный прямоугольник: {rr_path}")
         return None
     
+    engine = get_config().get_match_engine()
+    pyramid = None
+    if engine == matching.ENGINE_PYRAMID:
+        pyramid = matching.load_template_pyramid(rr_path, get_template_cache())
+    
+    template_h, template_w = template.shape[:2]
+    detector = create_change_detector()
     start_time = time.time()
     
     while time.time() - start_time < timeout:
+        if control.stopped or (cancel_event is not None and cancel_event.is_set()):
+            return None
+        
         # Получаем скриншот экрана
-        screenshot = take_screenshot()
-        if screenshot is None:
-            time.sleep(0.1)
+        screen = take_screenshot()
+        if screen is None:
+            control.stop_event.wait(0.1)
             continue
         
-        # Ищем шаблон на скриншоте
-        screen = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCORR_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        # На прошлом опросе совпадений не было: новые могут появиться только там,
+        # где экран изменился
+        changed = detector.update(screen) if detector else None
+        if changed == []:
+            control.stop_event.wait(0.1)
+            continue
         
-        if max_val >= threshold:
-            # Возвращаем центр найденного прямоугольника
-            template_h, template_w = template.shape[:2]
-            center_x = max_loc[0] + template_w // 2
-            center_y = max_loc[1] + template_h // 2
-            print(f"Референсный прямоугольник {rr_path} найден в центре ({center_x}, {center_y}) с совпадением {max_val:.3f}")
-
-            # check other location
-
-            # Create a draw object for the screenshot
-            draw = ImageDraw.Draw(screenshot)
-
-            # Get the coordinates from max_loc
-            top_left_x, top_left_y = max_loc
-            bottom_right_x = top_left_x + template_w
-            bottom_right_y = top_left_y + template_h
-
-            # Draw rectangle at the max_loc position
-            draw.rectangle(
-                [
-                    (top_left_x, top_left_y),
-                    (bottom_right_x, bottom_right_y)
-                ],
-                outline="red", width=3,fill="yellow"
+        # Ищем шаблон на скриншоте, начиная с окна вокруг записанной точки
+        windows = get_search_windows(center, template.shape, screen.shape)
+        for step, (radius, window) in enumerate(windows, 1):
+            regions = [window] if changed is None else affected_regions(changed, window, template.shape)
+            candidates = matching.find_candidates_in_regions(
+                screen, regions, template, threshold,
+                engine=engine, template_pyramid=pyramid
             )
-            screen = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            result2 = cv2.matchTemplate(screen, template, cv2.TM_CCORR_NORMED)
-            _, max_val2, _, max_loc2 = cv2.minMaxLoc(result2)
-            if max_val2>= threshold and max_val - max_val2<0.0001:
-                print(f'Внимание! Найдено несколько референсных прямоугольников для {rr_path}.')
-                print(f'max_val = {max_val}, max_val2 = {max_val2}')
-
-            return (center_x, center_y)
+            if candidates:
+                break
         
-        # Ждем 100ms как указано в концепции
-        time.sleep(0.1)
+        if candidates:
+            # Переводим позиции в центры прямоугольников
+            candidates = [
+                (score, (x + template_w // 2, y + template_h // 2))
+                for score, (x, y) in candidates
+            ]
+            score, (center_x, center_y) = candidates[0]
+            area = f"окно ±{radius}px" if radius is not None else "весь экран"
+            print(f"Референсный прямоугольник {rr_path} найден в центре ({center_x}, {center_y}) с совпадением {score:.3f} "
+                  f"(шаг {step}/{len(windows)}: {area}, кандидатов: {len(candidates)})")
+            return candidates
+        
+        # Ждем 100ms как указано в концепции (ESC/stop() прерывают ожидание сразу)
+        control.stop_event.wait(0.1)
     
     print(f"Референсный прямоугольник не найден в течение {timeout} секунд")
     return None
 
 
-def execute_wait(action):
-    """Выполняет ожидание"""
-    global stop_playback
+def find_reference_rectangle_on_screen(rr_path, timeout=15, threshold=0.9, center=None, policy=None,
+                                       control=None, details=None):
+    """Ищет референсный прямоугольник на экране и возвращает центр выбранного совпадения.
+
+    Если равноценных совпадений несколько, выбор определяется политикой MATCH_POLICY:
+    best - лучшее, nearest - ближайшее к center, strict - поиск считается неудачным.
+    В details (если передан) записывается score выбранного совпадения.
+    """
+    candidates = locate_reference_rectangle(rr_path, timeout, threshold, center, control=control)
+    if not candidates:
+        return None
+    
+    if matching.is_ambiguous(candidates):
+        print(f'Внимание! Найдено несколько референсных прямоугольников для {rr_path}.')
+        print(f'max_val = {candidates[0][0]}, max_val2 = {candidates[1][0]}')
+    
+    policy = get_config().get_match_policy() if policy is None else policy
+    chosen = matching.select_candidate(candidates, policy, center)
+    if chosen is None:
+        print(f"Политика '{policy}': совпадение неоднозначно, клик не выполняется")
+        return None
+    if details is not None:
+        details['score'] = float(chosen[0])
+    return chosen[1]
+
+
+def verify_reference_rectangle(rr_path, center, threshold=0.9):
+    """Перепроверяет на свежем кадре, что референсный прямоугольник все еще находится в center"""
+    template = get_template_cache().get(rr_path)
+    if template is None:
+        return False
+    
+    # Захватываем только область под шаблоном: карта совпадений из одного значения
+    template_h, template_w = template.shape[:2]
+    left = center[0] - template_w // 2
+    top = center[1] - template_h // 2
+    patch = take_screenshot(region=(left, top, left + template_w, top + template_h))
+    if patch is None or patch.shape != template.shape:
+        return False
+    
+    score = cv2.matchTemplate(patch, template, cv2.TM_CCORR_NORMED)[0, 0]
+    return score >= threshold
+
+
+def use_prefetched_location(rr_path, candidates, center=None, policy=None, details=None):
+    """Выбирает позицию из заранее найденных кандидатов и перепроверяет ее на свежем кадре.
+
+    Возвращает центр прямоугольника или None, если результат устарел.
+    """
+    policy = get_config().get_match_policy() if policy is None else policy
+    chosen = matching.select_candidate(candidates, policy, center)
+    if chosen is None:
+        return None
+    
+    if verify_reference_rectangle(rr_path, chosen[1]):
+        if details is not None:
+            details['score'] = float(chosen[0])
+        print(f"Использован заранее найденный референсный прямоугольник {rr_path} в ({chosen[1][0]}, {chosen[1][1]})")
+        return chosen[1]
+    
+    print(f"Заранее найденная позиция {rr_path} устарела, выполняем поиск заново")
+    return None
+
+
+class ClickPrefetcher:
+    """Заранее ищет референсный прямоугольник следующего клика в фоновом потоке.
+
+    Поиск идет, пока выполняются предыдущие ожидания и ввод текста (OpenCV
+    отпускает GIL на время поиска). К моменту клика позиция обычно уже известна.
+    """
+    
+    # Сколько действий вперед просматривается в поисках следующего клика
+    LOOKAHEAD = 5
+    
+    def __init__(self, action_dir, timeout=60, control=None):
+        self.action_dir = action_dir
+        self.timeout = timeout
+        self.control = control
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}  # индекс действия -> (future, cancel_event)
+    
+    def schedule_next(self, actions, current_index):
+        """Запускает поиск для ближайшего клика после current_index"""
+        for index in range(current_index + 1, current_index + 1 + self.LOOKAHEAD):
+            # Конец сценария или условие, которое еще не вычислено (scenario_flow)
+            action = get_action(actions, index)
+            if action is None:
+                return
+            if action.get('name') not in ['click left', 'click right']:
+                continue
+            if index in self._pending or not action.get('screen'):
+                return
+            rr_path, center, _ = get_click_reference(action, self.action_dir)
+            if not rr_path.exists():
+                return
+            cancel_event = threading.Event()
+            future = self._executor.submit(
+                locate_reference_rectangle, rr_path, self.timeout, 0.9, center, cancel_event, self.control
+            )
+            self._pending[index] = (future, cancel_event)
+            return
+    
+    def take(self, index, timeout=15):
+        """Возвращает кандидатов, найденных для действия index.
+
+        Если поиск еще идет, ждет его не дольше timeout (как обычный поиск при клике).
+        Возвращает список кандидатов; [] - цель не появилась за timeout;
+        None - фонового поиска не было или он завершился без результата.
+        """
+        entry = self._pending.pop(index, None)
+        if entry is None:
+            return None
+        future, cancel_event = entry
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            print(f"Референсный прямоугольник не найден в течение {timeout} секунд")
+            return []
+        except Exception:
+            return None
+        finally:
+            cancel_event.set()
+    
+    def pending(self, index):
+        """Возвращает Future поиска для действия index (None, если поиск не запущен)"""
+        entry = self._pending.get(index)
+        return entry[0] if entry else None
+    
+    def shutdown(self):
+        """Останавливает все незавершенные поиски"""
+        for _, cancel_event in self._pending.values():
+            cancel_event.set()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+
+def get_action(actions, index):
+    """Действие index или None, если его нет (или оно еще неизвестно)"""
+    try:
+        return actions[index]
+    except IndexError:
+        return None
+
+
+def preload_reference_rectangles(actions, action_dir):
+    """Создает недостающие и устаревшие *_rr.png и заранее декодирует их в кэш шаблонов.
+
+    Если прямоугольник для клика создать не из чего, бросает PlanError.
+    """
+    cache = get_template_cache()
+    created, _, _ = build_reference_rectangles(actions, action_dir)
+    if created:
+        print(f"Создано референсных прямоугольников: {created}")
+    rr_paths = [get_rr_path(action_dir, action['screen']) for action in actions
+                if action.get('name') in ['click left', 'click right'] and action.get('screen')]
+    missing = sorted({str(rr_path) for rr_path in rr_paths if not rr_path.exists()})
+    if missing:
+        # Без прямоугольника клик упал бы только после поиска - сообщаем до начала
+        raise PlanError([f"нет референсного прямоугольника и скриншота для {path}" for path in missing])
+
+    loaded = cache.preload(rr_paths)
+    if get_config().get_match_engine() == matching.ENGINE_PYRAMID:
+        # Уровни пирамиды строятся заранее и хранятся рядом с *_rr.png
+        for rr_path in rr_paths:
+            if rr_path.exists():
+                cache.preload(matching.ensure_template_pyramid(rr_path), cv2.IMREAD_GRAYSCALE)
+
+    print(f"Загружено референсных прямоугольников в кэш: {loaded} (в кэше: {len(cache)}, "
+          f"{cache.current_bytes / (1024 * 1024):.1f} МБ)")
+    return loaded
+
+
+def execute_wait(action, scheduler=None, ready=None, step=None, control=None):
+    """Выполняет ожидание.
+
+    scheduler - планировщик воспроизведения (PlaybackScheduler); ожидание
+    заканчивается точно в срок и прерывается сразу по ESC/F1.
+    ready - Future поиска цели следующего клика: ожидание по времени
+    заканчивается, как только цель найдена (записанное время - верхняя граница).
+    """
+    control = control or _default_control
+    if scheduler is None:
+        scheduler = PlaybackScheduler(control.stop_event)
     
     # Упрощенная структура wait согласно новой концепции
     if 'time' in action:
         # Новый формат: прямо указано время
         wait_time = action.get('time', 1.0)
-        print(f"Ожидание {wait_time} секунд")
-        
-        # Разбиваем длительное ожидание на короткие интервалы для возможности прерывания
-        elapsed = 0
-        interval = 0.1  # Проверяем каждые 100ms
-        while elapsed < wait_time and not stop_playback:
-            sleep_time = min(interval, wait_time - elapsed)
-            time.sleep(sleep_time)
-            elapsed += sleep_time
+        print(f"Ожидание {wait_time} секунд" + (" (до появления цели)" if ready else ""))
+        scheduler.wait(wait_time, ready, step)
             
     elif 'event' in action:
         # Старый формат для совместимости
@@ -252,29 +513,22 @@ def execute_wait(action):
         
         if event_name == 'timer':
             wait_time = event.get('time', 1.0)
-            print(f"Ожидание {wait_time} секунд")
-            
-            # Разбиваем длительное ожидание на короткие интервалы для возможности прерывания
-            elapsed = 0
-            interval = 0.1  # Проверяем каждые 100ms
-            while elapsed < wait_time and not stop_playback:
-                sleep_time = min(interval, wait_time - elapsed)
-                time.sleep(sleep_time)
-                elapsed += sleep_time
+            print(f"Ожидание {wait_time} секунд" + (" (до появления цели)" if ready else ""))
+            scheduler.wait(wait_time, ready, step)
                 
         elif event_name == 'picOnScreen':
             pic_file = event.get('file', '')
             print(f"Ожидание появления изображения: {pic_file}")
-            wait_for_image_on_screen(pic_file)
+            wait_for_image_on_screen(pic_file, control=control)
         else:
             print(f"Неизвестный тип события: {event_name}")
     else:
         print("Действие wait без указания времени или события")
 
 
-def wait_for_image_on_screen(image_file, timeout=30, threshold=0.8):
+def wait_for_image_on_screen(image_file, timeout=30, threshold=0.8, control=None):
     """Ждет появления изображения на экране"""
-    global stop_playback
+    control = control or _default_control
     
     if not Path(image_file).exists():
         print(f"Файл изображения не найден: {image_file}")
@@ -285,26 +539,38 @@ def wait_for_image_on_screen(image_file, timeout=30, threshold=0.8):
         print(f"Не удалось загрузить изображение: {image_file}")
         return False
     
+    detector = create_change_detector()
     start_time = time.time()
     
-    while time.time() - start_time < timeout and not stop_playback:
+    while time.time() - start_time < timeout and not control.stopped:
         # Получаем скриншот экрана
         screenshot = take_screenshot()
         if screenshot is None:
             time.sleep(0.5)
             continue
         
-        # Ищем шаблон на скриншоте
-        result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        # Ищем шаблон только там, где экран изменился с прошлого опроса
+        changed = detector.update(screenshot) if detector else None
+        height, width = screenshot.shape[:2]
+        if changed is None:
+            regions = [(0, 0, width, height)]
+        else:
+            regions = affected_regions(changed, (0, 0, width, height), template.shape)
         
-        if max_val >= threshold:
+        candidates = []
+        if regions:
+            candidates = matching.find_candidates_in_regions(
+                screenshot, regions, template, threshold, cv2.TM_CCOEFF_NORMED
+            )
+        
+        if candidates:
+            max_val, max_loc = candidates[0]
             print(f"Изображение найдено в позиции {max_loc} с совпадением {max_val:.3f}")
             return True
         
-        time.sleep(0.5)
+        control.stop_event.wait(0.5)
     
-    if stop_playback:
+    if control.stopped:
         print("Ожидание изображения прервано")
         return False
     
@@ -312,14 +578,46 @@ def wait_for_image_on_screen(image_file, timeout=30, threshold=0.8):
     return False
 
 
-def take_screenshot():
-    """Делает скриншот экрана"""
+def is_image_on_screen(image_file, threshold=0.8):
+    """Однократно проверяет, есть ли изображение на экране"""
+    template = get_template_cache().get(image_file)
+    if template is None:
+        print(f"Не удалось загрузить изображение: {image_file}")
+        return False
+    screenshot = take_screenshot()
+    if screenshot is None:
+        return False
+    candidates = matching.find_candidates(screenshot, template, threshold, cv2.TM_CCOEFF_NORMED)
+    if candidates:
+        print(f"Изображение найдено в позиции {candidates[0][1]} с совпадением {candidates[0][0]:.3f}")
+        return True
+    return False
+
+
+def check_flow_condition(condition, control=None):
+    """Вычисляет условие if сценария (scenario_flow.Condition)"""
+    image_file = str(condition.image_path)
+    print(f"Условие: изображение {condition.image_path.name} на экране?")
+    if condition.timeout > 0:
+        visible = wait_for_image_on_screen(image_file, condition.timeout, condition.threshold, control)
+    else:
+        visible = is_image_on_screen(image_file, condition.threshold)
+    print("Условие выполнено" if visible else "Условие не выполнено - ветка else")
+    return visible
+
+
+def create_change_detector():
+    """Создает детектор изменений кадра для циклов опроса (None, если FRAME_TILE = 0)"""
+    tile_size = get_config().get_frame_tile_size()
+    return FrameChangeDetector(tile_size) if tile_size > 0 else None
+
+
+def take_screenshot(region=None):
+    """Делает скриншот экрана (или региона) через источник кадров. Возвращает BGR ndarray"""
     try:
-        import pyautogui
-        screenshot = ImageGrab.grab(all_screens=True)
-        return screenshot
-    except ImportError:
-        print("Для работы с изображениями требуется установить pyautogui: pip install pyautogui")
+        return get_capture_backend().grab(region)
+    except ImportError as e:
+        print(e)
         return None
     except Exception as e:
         print(f"Ошибка при создании скриншота: {e}")
@@ -327,7 +625,11 @@ def take_screenshot():
 
 
 def create_actions_base_if_needed(action_name, actions_file=None):
-    """Создает actions_base.json из log.json если его нет"""
+    """Создает actions_base.json из лога, если его нет или лог изменился.
+
+    Кэш декомпозиции проверяется только если actions_base.json нет или он
+    старше лога; иначе файл используется как есть, без чтения лога.
+    """
     cfg = get_config()
     
     # Если actions_file не указан, используем стандартный путь
@@ -340,33 +642,34 @@ def create_actions_base_if_needed(action_name, actions_file=None):
             action_dir = cfg.get_action_path(action_name)
             actions_file = action_dir / actions_file
     
-    # Если файл уже существует, ничего не делаем
-    if actions_file.exists():
-        return True
-    
-    # Проверяем, что это файл actions_base.json - только для стандартного файла создаем автоматически
+    # Только стандартный файл actions_base.json создается автоматически
     if actions_file.name != 'actions_base.json':
-        return False
+        return actions_file.exists()
     
-    # Получаем путь к log.json через конфигурацию
+    # Получаем путь к логу через конфигурацию
     log_file = cfg.get_log_file_path(action_name)
     
     if not log_file.exists():
+        if actions_file.exists():
+            return True
         print(f"Не найден файл лога: {log_file}")
-        print("Для создания actions_base.json требуется файл log.json")
+        print("Для создания actions_base.json требуется файл log.jsonl")
         return False
     
-    print(f"Файл {actions_file} не найден.")
-    print(f"Найден файл лога: {log_file}")
-    print("Выполняем декомпозицию для создания базовых действий...")
+    if not actions_file.exists():
+        print(f"Файл {actions_file} не найден.")
+        print(f"Найден файл лога: {log_file}")
+        print("Выполняем декомпозицию для создания базовых действий...")
+    elif actions_file.stat().st_mtime_ns >= log_file.stat().st_mtime_ns:
+        return True
     
     try:
-        # Импортируем и вызываем функцию декомпозиции
+        # Импортируем и вызываем функцию декомпозиции; если лог на самом деле
+        # не изменился (по кэшу), она ничего не печатает
         from decomposer import decompose_action
         
-        success = decompose_action(action_name)
+        success = decompose_action(action_name, quiet=True)
         if success:
-            print(f"Декомпозиция завершена. Файл {actions_file} создан.")
             return True
         else:
             print("Ошибка при декомпозиции")
@@ -380,121 +683,274 @@ def create_actions_base_if_needed(action_name, actions_file=None):
         return False
 
 
-def play_actions(action_name, actions_file=None, dynamic=False, cut_mode=False):
-    """Основная функция воспроизведения действий.
-
-    При cut_mode=True возврат: dict {success: bool, cut: bool, last_index: int}
-    В обычном режиме возвращает bool (успех).
-    """
-    global stop_playback, _cut_mode_control
-    
-    # Сбрасываем флаг прерывания
-    stop_playback = False
-    
-    # Получаем конфигурацию
+def resolve_actions_file(action_name, actions_file=None):
+    """Путь к файлу сценария: actions_base.json, NAME.json или NAME.lsc в папке действия"""
     cfg = get_config()
     action_dir = cfg.get_action_path(action_name)
     
     # Если actions_file не указан, используем стандартный путь
     if actions_file is None:
-        actions_file = cfg.get_actions_base_file_path(action_name)
+        return cfg.get_actions_base_file_path(action_name)
+    if not actions_file.endswith(BINARY_SUFFIX):
+        actions_file = actions_file + '.json'
+    actions_file = Path(actions_file)
+    # Если путь не абсолютный, делаем его относительно папки действия
+    if not actions_file.is_absolute():
+        actions_file = action_dir / actions_file
+    binary_file = actions_file.with_suffix(BINARY_SUFFIX)
+    if not actions_file.exists() and binary_file.exists():
+        # Сценарий в двоичном формате (scenario_binary)
+        actions_file = binary_file
+    return actions_file
+
+
+def run_playback(action_name, actions_file=None, dynamic=False, cut_mode=False, wait_for_target=None,
+                 start_delay=None, scenarios=None, control=None, record_actions=False, reset=True):
+    """Воспроизводит сценарий и возвращает results.PlaybackResult.
+
+    Ошибки до первого действия - исключения: FileNotFoundError (нет сценария
+    или базовых действий), json.JSONDecodeError, scenario_plan.PlanError,
+    scenario_flow.FlowError. Итог самого воспроизведения (прервано, цель
+    клика не найдена, ошибка после начала - статус error) - в статусе результата.
+    wait_for_target - в динамическом режиме завершать ожидание перед кликом,
+    как только найдена его цель (None - значение WAIT_FOR_TARGET из конфигурации).
+    start_delay - пауза перед первым действием в секундах (None - START_DELAY
+    из конфигурации); 0 - сразу после проверки готовности (wait_until_ready).
+    scenarios - кэш подготовленных сценариев (scenario_plan.ScenarioCache),
+    общий для нескольких запусков в одном процессе.
+    control - состояние воспроизведения (PlaybackControl; по умолчанию общее для модуля).
+    record_actions - собирать ActionResult для каждого действия.
+    reset=False - не сбрасывать прерывание: вызывающий код сбрасывает его сам
+    до начала подготовки, чтобы ESC/stop() во время нее не терялся.
+    """
+    control = control or _default_control
+    if reset:
+        control.reset(cut_mode)
     else:
-        actions_file = Path(actions_file+'.json')
-        # Если путь не абсолютный, делаем его относительно папки действия
-        if not actions_file.is_absolute():
-            actions_file = action_dir / actions_file
+        control.cut_mode = cut_mode
+    
+    # Получаем конфигурацию
+    cfg = get_config()
+    action_dir = cfg.get_action_path(action_name)
+    actions_file = resolve_actions_file(action_name, actions_file)
     
     print(f"Воспроизведение действия '{action_name}'")
     print(f"Файл действий: {actions_file}")
+    if wait_for_target is None:
+        wait_for_target = cfg.get_wait_for_target()
+    wait_for_target = wait_for_target and dynamic
     if dynamic:
         print("Динамический режим: будет использоваться поиск по референсным прямоугольникам")
+    if wait_for_target:
+        print("Ожидания перед кликами заканчиваются при появлении цели (записанное время - верхняя граница)")
     
-    # Пробуем создать actions_base.json если его нет
-    if not actions_file.exists():
+    # Создаем actions_base.json, если его нет или лог изменился
+    if actions_file.name == 'actions_base.json' or not actions_file.exists():
         if not create_actions_base_if_needed(action_name, actions_file):
-            print(f"Файл не найден: {actions_file}")
-            return False
+            raise FileNotFoundError(errno.ENOENT, "Файл не найден", str(actions_file))
+    
+    # Сценарий проверяется целиком до первого действия; обычный JSON - из кэша плана.
+    # Параметризованный сценарий собирается из базовых действий и строк CSV на лету,
+    # repeat/include/if не разворачиваются: дерево обходится во время воспроизведения
+    if scenarios is not None:
+        actions, flow = scenarios.get(actions_file, action_dir)
+    else:
+        actions, flow = prepare_scenario(actions_file, action_dir)
     
     try:
-        with open(actions_file, 'r', encoding='utf-8') as f:
-            actions = json.load(f)
-    except FileNotFoundError:
-        print(f"Файл не найден: {actions_file}")
-        return False
-    except json.JSONDecodeError as e:
-        print(f"Ошибка декодирования JSON: {e}")
-        return False
-    except Exception as e:
-        print(f"Ошибка при чтении файла: {e}")
-        return False
+        return _play_scenario(action_name, actions_file, action_dir, actions, flow, dynamic, cut_mode,
+                              wait_for_target, start_delay, control, record_actions)
+    finally:
+        # Двоичные сценарии (и включенные .lsc) не держат файл открытым после воспроизведения
+        close_scenario(actions, flow)
+
+
+def _play_scenario(action_name, actions_file, action_dir, actions, flow, dynamic, cut_mode, wait_for_target,
+                   start_delay, control, record_actions):
+    """Воспроизведение подготовленного сценария (см. run_playback)"""
+    cfg = get_config()
+    total = len(actions)
+    if flow is not None:
+        total = flow.count()
+        print(f"Загружен сценарий с управляющими конструкциями из {actions_file} "
+              f"(действий: {total if total is not None else 'зависит от условий'})")
+        preload_actions = flow_leaf_actions(flow)
+        actions = ActionStream(flow, lambda condition: check_flow_condition(condition, control))
+    else:
+        print(f"Загружено {total} действий из {actions_file}")
+        if isinstance(actions, ExecutionPlan):
+            preload_actions = actions.asset_steps
+        else:
+            preload_actions = unique_actions(actions)
+    if dynamic:
+        preload_reference_rectangles(preload_actions, action_dir)
     
-    print(f"Загружено {len(actions)} действий из {actions_file}")
-    print(f"Начинаем воспроизведение через 3 секунды...")
+    result = PlaybackResult(action_name, actions_file, total)
+    if control.stopped:
+        # Прервано, пока сценарий готовился
+        print("Воспроизведение прервано до начала")
+        result.status = PLAYBACK_STOPPED
+        return result
+    if start_delay is None:
+        start_delay = cfg.get_start_delay()
+    if start_delay > 0:
+        print(f"Начинаем воспроизведение через {start_delay:g} секунд...")
+    elif not wait_until_ready(control=control):
+        result.status = PLAYBACK_NOT_READY
+        result.error = "Экран или ввод не готовы к воспроизведению"
+        return result
     if cut_mode:
         print("Нажмите F1 для обрезки на текущем действии или ESC для отмены")
-        _cut_mode_control = {'cut': False, 'last_index': -1}
     else:
         print("Нажмите ESC для прерывания воспроизведения")
-        _cut_mode_control = None
 
-    # Запускаем слушатель клавиатуры (в cut_mode отслеживаем on_release Alt)
-    listener = keyboard.Listener(on_press=on_key_press)
-    listener.start()
-    
-    time.sleep(3)
-    
-    for i, action in enumerate(actions):
-        # Проверяем флаг прерывания перед каждым действием
-        if stop_playback:
-            print("Воспроизведение прервано пользователем")
-            break
+    # Запускаем слушатель клавиатуры (ESC, в cut_mode - F1), если его не держит
+    # вызывающий код (плейлист, сеанс API)
+    own_listener = not control.listening
+    prefetcher = None
+    scheduler = PlaybackScheduler(control.stop_event, compensate=cfg.get_wait_compensation())
+    click_failed = False
+    try:
+        if own_listener:
+            control.start_listener()
+        
+        if dynamic and (cfg.get_prefetch_enabled() or wait_for_target):
+            prefetcher = ClickPrefetcher(action_dir, control=control)
+        
+        if start_delay > 0:
+            scheduler.sleep(start_delay)
+        scheduler.start()
+        
+        for i, action in enumerate(actions):
+            # Проверяем флаг прерывания перед каждым действием
+            if control.stopped:
+                print("Воспроизведение прервано пользователем")
+                break
             
-        action_name = action.get('name', 'unknown')
-        print(f"[{i+1}/{len(actions)}] Выполняем действие: {action_name}")
+            action_name = action.get('name', 'unknown')
+            progress = f"{i+1}/{total}" if total is not None else f"{i+1}"
+            print(f"[{progress}] Выполняем действие: {action_name}")
+            step = ActionResult(i, action.get('id'), action_name, scheduler.elapsed()) if record_actions else None
+            details = {}
         
-        try:
-            if action_name in ['click left', 'click right']:
-                if not execute_mouse_click(action, dynamic, action_dir):
-                    break
-            elif action_name == 'typing':
-                execute_typing(action)
-            elif action_name == 'enter':
-                execute_enter()
-            elif action_name == 'space':
-                execute_space()
-            elif action_name == 'wait':
-                execute_wait(action)
-            else:
-                print(f"Неизвестное действие: {action_name}")
-            # Обновляем индекс последнего успешно выполненного действия в cut_mode
-            if cut_mode and _cut_mode_control is not None and not stop_playback:
-                _cut_mode_control['last_index'] = i
+            try:
+                if prefetcher and action_name not in ['click left', 'click right']:
+                    # Пока выполняется ожидание или ввод, ищем цель следующего клика
+                    prefetcher.schedule_next(actions, i)
+            
+                if action_name in ['click left', 'click right']:
+                    prefetched = prefetcher.take(i) if prefetcher else None
+                    if not execute_mouse_click(action, dynamic, action_dir, prefetched, control, details):
+                        click_failed = True
+                elif action_name == 'typing':
+                    execute_typing(action)
+                elif action_name == 'enter':
+                    execute_enter()
+                elif action_name == 'space':
+                    execute_space()
+                elif action_name == 'wait':
+                    ready = None
+                    next_action = get_action(actions, i + 1) or {}
+                    if wait_for_target and next_action.get('name') in ['click left', 'click right']:
+                        ready = prefetcher.pending(i + 1)
+                    execute_wait(action, scheduler, ready, i + 1, control)
+                else:
+                    print(f"Неизвестное действие: {action_name}")
+                    if step:
+                        step.status = ACTION_SKIPPED
+                if not click_failed:
+                    result.executed = i + 1
+                    # Последнее успешно выполненное действие (для обрезки по F1)
+                    if not control.stopped:
+                        result.last_index = i
         
-        except Exception as e:
-            print(f"Ошибка при выполнении действия {action_name}: {e}")
-            continue
-    
-    # Останавливаем слушатель клавиатуры
-    listener.stop()
-    
-    if stop_playback:
-        if cut_mode and _cut_mode_control and _cut_mode_control.get('cut'):
-            print("Воспроизведение остановлено по сигналу обрезки (F1)")
-        else:
-            print("Воспроизведение было прервано")
+            except Exception as e:
+                print(f"Ошибка при выполнении действия {action_name}: {e}")
+                if step:
+                    step.status = ACTION_ERROR
+                    step.error = str(e)
+        
+            if step:
+                step.duration = scheduler.elapsed() - step.started
+                step.score = details.get('score')
+                step.location = details.get('location')
+                step.prefetched = details.get('prefetched', False)
+                if click_failed:
+                    step.status = ACTION_FAILED
+                    step.error = "референсный прямоугольник не найден"
+                result.actions.append(step)
+            if click_failed:
+                result.error = f"Действие {i + 1}: референсный прямоугольник не найден"
+                break
+    except Exception as e:
+        # Ошибка вне отдельного действия (чтение сценария, условие scenario_flow,
+        # слушатель клавиатуры): итог - частичный результат со статусом error
+        print(f"Ошибка при воспроизведении: {e}")
+        result.status = PLAYBACK_ERROR
+        result.error = str(e)
+        result.exception = e
+    finally:
+        # Останавливаем фоновый поиск и слушатель клавиатуры
+        if prefetcher:
+            prefetcher.shutdown()
+        if own_listener:
+            control.stop_listener()
+    scheduler.print_summary()
+    result.elapsed = scheduler.elapsed()
+    result.recorded = scheduler.recorded_time
+    result.drift = scheduler.drift()
+    
+    if click_failed:
+        result.status = PLAYBACK_FAILED
+    elif control.stopped and result.status != PLAYBACK_ERROR:
+        result.status = PLAYBACK_CUT if control.cut else PLAYBACK_STOPPED
+    
+    if result.status == PLAYBACK_ERROR:
+        print("Воспроизведение прервано из-за ошибки")
+    elif result.status == PLAYBACK_CUT:
+        print("Воспроизведение остановлено по сигналу обрезки (F1)")
+    elif control.stopped:
+        print("Воспроизведение было прервано")
     else:
         print("Воспроизведение завершено")
+    return result
+
 
+def play_actions(action_name, actions_file=None, dynamic=False, cut_mode=False, wait_for_target=None,
+                 start_delay=None, scenarios=None, control=None):
+    """Основная функция воспроизведения действий (для CLI; подробный итог - run_playback).
+
+    При cut_mode=True возврат: dict {success: bool, cut: bool, last_index: int}
+    В обычном режиме возвращает bool (успех). Параметры - как у run_playback.
+    """
+    try:
+        result = run_playback(action_name, actions_file, dynamic, cut_mode, wait_for_target,
+                              start_delay, scenarios, control)
+    except FileNotFoundError as e:
+        print(f"Файл не найден: {e.filename or e}")
+        return False
+    except json.JSONDecodeError as e:
+        print(f"Ошибка декодирования JSON: {e}")
+        return False
+    except (PlanError, FlowError) as e:
+        print(e)
+        return False
+    except Exception as e:
+        print(f"Ошибка при чтении файла: {e}")
+        return False
+    
+    if result.status == PLAYBACK_NOT_READY:
+        print(result.error)
+        return False
+    if result.status == PLAYBACK_ERROR:
+        return False
     if cut_mode:
-        result = {
+        return {
             'success': True,
-            'cut': _cut_mode_control.get('cut', False) if _cut_mode_control else False,
-            'last_index': _cut_mode_control.get('last_index', -1) if _cut_mode_control else -1
+            'cut': result.status == PLAYBACK_CUT,
+            'last_index': result.last_index,
         }
-        _cut_mode_control = None
-        return result
-    else:
-        return True
+    return True
 
 
 if __name__ == "__main__":
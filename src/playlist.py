@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Плейлист: несколько действий и сценариев за один запуск looper.
+
+Файл плейлиста - JSON (или YAML, если установлен PyYAML):
+
+    {
+      "on_error": "stop",
+      "retries": 1,
+      "pause": 0,
+      "entries": [
+        {"action": "open_notepad"},
+        {"action": "open_notepad", "scenario": "my_scenario", "dynamic": true, "on_error": "skip"},
+        {"action": "fill_form", "typing_params": "users.csv", "delay": 1.5, "sleep": 3,
+         "on_error": "retry", "retries": 2}
+      ]
+    }
+
+Вместо объекта можно указать просто список записей. Параметры записи
+повторяют ключи looper -p: scenario (-f), dynamic, wait_for_target, delay,
+typing_params, sleep. Политика ошибок: stop - остановить плейлист, skip -
+перейти к следующей записи, retry - повторить запись до retries раз, затем
+остановить. on_error, retries верхнего уровня - значения по умолчанию для
+записей; pause - пауза между записями в секундах. ESC останавливает весь
+плейлист.
+
+Все записи выполняются в одном процессе: слушатель клавиатуры, источник
+кадров, кэш шаблонов и подготовленные сценарии общие; пауза START_DELAY
+выдерживается только перед первой записью, дальше - проверка готовности.
+"""
+
+import json
+from pathlib import Path
+
+from config import get_config
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+ON_ERROR_STOP = 'stop'
+ON_ERROR_SKIP = 'skip'
+ON_ERROR_RETRY = 'retry'
+ON_ERROR_POLICIES = (ON_ERROR_STOP, ON_ERROR_SKIP, ON_ERROR_RETRY)
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+STATUS_STOPPED = 'stopped'
+STATUS_NOT_RUN = 'not run'
+
+ENTRY_KEYS = ('action', 'scenario', 'dynamic', 'wait_for_target', 'delay', 'typing_params', 'sleep',
+              'on_error', 'retries')
+
+
+class PlaylistError(ValueError):
+    """Неверный файл плейлиста"""
+
+
+class PlaylistEntry:
+    """Запись плейлиста: действие, сценарий и параметры воспроизведения"""
+
+    def __init__(self, action, scenario=None, dynamic=False, wait_for_target=None, delay=None,
+                 typing_params=None, sleep=3, on_error=ON_ERROR_STOP, retries=1):
+        self.action = action
+        self.scenario = scenario
+        self.dynamic = dynamic
+        self.wait_for_target = wait_for_target
+        self.delay = delay
+        self.typing_params = typing_params
+        self.sleep = sleep
+        self.on_error = on_error
+        self.retries = retries
+
+    @property
+    def title(self):
+        parts = [self.action]
+        if self.scenario:
+            parts.append(self.scenario)
+        if self.delay is not None:
+            parts.append(f"delay {self.delay:g}")
+        if self.typing_params:
+            parts.append(self.typing_params)
+        return ' / '.join(parts)
+
+
+def _parse_entry(data, defaults, number):
+    where = f"запись {number}"
+    if isinstance(data, str):
+        data = {'action': data}
+    if not isinstance(data, dict):
+        raise PlaylistError(f"{where}: ожидается объект или имя действия")
+    unknown = [key for key in data if key not in ENTRY_KEYS]
+    if unknown:
+        raise PlaylistError(f"{where}: неизвестные параметры {unknown}")
+    if not data.get('action') or not isinstance(data['action'], str):
+        raise PlaylistError(f"{where}: не указано действие 'action'")
+    options = dict(defaults)
+    options.update(data)
+    if options['on_error'] not in ON_ERROR_POLICIES:
+        raise PlaylistError(f"{where}: on_error должен быть одним из {ON_ERROR_POLICIES}")
+    try:
+        options['retries'] = int(options['retries'])
+        options['sleep'] = float(options.get('sleep', 3))
+        if options.get('delay') is not None:
+            options['delay'] = float(options['delay'])
+    except (TypeError, ValueError):
+        raise PlaylistError(f"{where}: retries, sleep и delay должны быть числами")
+    if options['retries'] < 0:
+        raise PlaylistError(f"{where}: retries должен быть >= 0")
+    return PlaylistEntry(**options)
+
+
+def parse_playlist(data):
+    """Разбирает содержимое плейлиста. Возвращает (записи, пауза между записями)"""
+    if isinstance(data, list):
+        data = {'entries': data}
+    if not isinstance(data, dict) or not isinstance(data.get('entries'), list):
+        raise PlaylistError("Плейлист должен быть списком записей или объектом с ключом 'entries'")
+    defaults = {'on_error': data.get('on_error', ON_ERROR_STOP), 'retries': data.get('retries', 1)}
+    entries = [_parse_entry(item, defaults, number) for number, item in enumerate(data['entries'], 1)]
+    if not entries:
+        raise PlaylistError("Плейлист пуст")
+    try:
+        pause = float(data.get('pause', 0))
+    except (TypeError, ValueError):
+        raise PlaylistError("pause должен быть числом")
+    return entries, pause
+
+
+def load_playlist(path):
+    """Загружает плейлист из JSON или YAML (.yaml/.yml)"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix.lower() in ('.yaml', '.yml'):
+            if not YAML_AVAILABLE:
+                raise PlaylistError("Для плейлиста YAML нужен PyYAML: pip install pyyaml")
+            data = yaml.safe_load(f)
+        else:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise PlaylistError(f"Ошибка декодирования JSON: {e}")
+    return parse_playlist(data)
+
+
+def prepare_play_scenario(action_name, scenario=None, delay=None, typing_params=None, sleep_time=3):
+    """Готовит базовые действия и, если заданы delay/typing_params, сценарий для воспроизведения.
+
+    Возвращает имя файла сценария для play_actions (None - actions_base.json).
+    Ошибки - исключения (как у ScenarioCreator).
+    """
+    from play import create_actions_base_if_needed
+
+    cfg = get_config()
+    if not create_actions_base_if_needed(action_name, cfg.get_actions_base_file_path(action_name)):
+        raise FileNotFoundError(f"Нет базовых действий для '{action_name}'")
+    if delay is None and typing_params is None:
+        return scenario
+
+    # Имя сценария - как у looper -p с --delay/--typing-params
+    scenario_parts = []
+    if delay is not None:
+        scenario_parts.append("fix_delay")
+    if typing_params is not None:
+        scenario_parts.append(Path(typing_params).stem)
+    scenario_name = "_".join(scenario_parts)
+    from scenario_creator import ScenarioCreator
+    creator = ScenarioCreator(action_name)
+    creator.create_complex_scenario(
+        output_name=scenario_name,
+        delay=delay,
+        typing_params_file=cfg.get_get_typing_parameters_file_path(action_name, typing_params),
+        sleep_time=sleep_time,
+    )
+    return scenario_name
+
+
+def prepare_entry_scenario(entry):
+    """Сценарий записи плейлиста (см. prepare_play_scenario)"""
+    return prepare_play_scenario(entry.action, entry.scenario, entry.delay, entry.typing_params, entry.sleep)
+
+
+class EntryResult:
+    """Итог записи плейлиста"""
+
+    def __init__(self, number, entry):
+        self.number = number
+        self.entry = entry
+        self.status = STATUS_NOT_RUN
+        self.attempts = 0
+        self.actions = 0
+        self.elapsed = 0.0
+        self.recorded = 0.0
+        self.drift = 0.0
+        self.error = None
+
+
+def run_entry(entry, result, scenarios, control, start_delay):
+    """Один запуск записи. Возвращает True, если она выполнена до конца"""
+    import play
+
+    result.attempts += 1
+    try:
+        actions_file = prepare_entry_scenario(entry)
+        playback = play.run_playback(entry.action, actions_file, entry.dynamic,
+                                     wait_for_target=entry.wait_for_target, start_delay=start_delay,
+                                     scenarios=scenarios, control=control, reset=False)
+    except Exception as e:
+        result.error = str(e)
+        print(f"Ошибка подготовки записи {result.number}: {e}")
+        return False
+
+    result.actions += playback.executed
+    result.elapsed += playback.elapsed
+    result.recorded += playback.recorded
+    result.drift += playback.drift
+    result.error = playback.error
+    return playback.success
+
+
+def run_playlist(entries, pause=0):
+    """Выполняет записи плейлиста по порядку с их политиками ошибок.
+
+    Возвращает список EntryResult (по одному на каждую запись).
+    """
+    from play import PlaybackControl
+    from scenario_plan import ScenarioCache
+
+    results = [EntryResult(number, entry) for number, entry in enumerate(entries, 1)]
+    scenarios = ScenarioCache()
+    control = PlaybackControl()
+    start_delay = None  # START_DELAY из конфигурации перед первой записью
+    # Прерывание сбрасывается один раз: ESC между записями (в паузе, при
+    # подготовке сценария) останавливает весь плейлист
+    control.reset()
+    control.start_listener()
+    try:
+        for result in results:
+            entry = result.entry
+            if result.number > 1 and pause > 0:
+                control.stop_event.wait(pause)
+            if control.stopped:
+                result.status = STATUS_STOPPED
+                break
+            print(f"\n=== Плейлист: запись {result.number}/{len(results)}: {entry.title} ===")
+            attempts = 1 + (entry.retries if entry.on_error == ON_ERROR_RETRY else 0)
+            while result.attempts < attempts and not control.stopped:
+                if run_entry(entry, result, scenarios, control, start_delay):
+                    result.status = STATUS_OK
+                    break
+                start_delay = 0
+                if control.stopped:
+                    break
+                if result.attempts < attempts:
+                    print(f"Повтор записи {result.number} ({result.attempts + 1}/{attempts})")
+            start_delay = 0
+
+            if control.stopped and result.status != STATUS_OK:
+                # ESC останавливает весь плейлист
+                result.status = STATUS_STOPPED
+                break
+            if result.status == STATUS_OK:
+                continue
+            if entry.on_error == ON_ERROR_SKIP:
+                result.status = STATUS_SKIPPED
+                continue
+            result.status = STATUS_FAILED
+            print(f"Запись {result.number} не выполнена - плейлист остановлен")
+            break
+    finally:
+        control.stop_listener()
+    return results
+
+
+def print_summary(results):
+    """Общая сводка по времени и результатам всех записей"""
+    print("\n=== Итоги плейлиста ===")
+    print(f"{'№':>3}  {'запись':<40} {'итог':<8} {'попыток':>7} {'действий':>8} "
+          f"{'время, с':>9} {'по записи, с':>12} {'отставание, с':>13}")
+    for result in results:
+        print(f"{result.number:>3}  {result.entry.title[:40]:<40} {result.status:<8} {result.attempts:>7} "
+              f"{result.actions:>8} {result.elapsed:>9.2f} {result.recorded:>12.2f} {result.drift:>13.2f}")
+        if result.error and result.status != STATUS_OK:
+            print(f"     {result.error}")
+    ran = [r for r in results if r.attempts]
+    print(f"Всего: выполнено {sum(r.status == STATUS_OK for r in results)} из {len(results)}, "
+          f"действий {sum(r.actions for r in ran)}, время {sum(r.elapsed for r in ran):.2f} с "
+          f"(по записанным ожиданиям {sum(r.recorded for r in ran):.2f} с, "
+          f"отставание {sum(r.drift for r in ran):.2f} с)")
+
+
+def play_playlist(path):
+    """Загружает и выполняет плейлист. Возвращает True, если все записи выполнены или пропущены"""
+    entries, pause = load_playlist(path)
+    print(f"Плейлист {path}: записей {len(entries)}")
+    results = run_playlist(entries, pause)
+    print_summary(results)
+    return all(result.status in (STATUS_OK, STATUS_SKIPPED) for result in results)
@@ -2,22 +2,24 @@ from pynput import mouse, keyboard
 import mouse_clicker as mc
 import time as time
 import ctypes
-import json
 import sys
 import string
 import os
 import shutil
 from pathlib import Path
 from config import get_config
+from capture import get_capture_backend
+from screenshot_writer import ScreenshotWriter
+from event_log import EventLogWriter
+from catalog import record_file
 
-# Попытка импорта PIL для скриншотов
+# Проверяем, что источник кадров для скриншотов доступен
 try:
-    from PIL import ImageGrab,Image,ImageDraw
-    PIL_AVAILABLE = True
-except ImportError:
-    print("Внимание: PIL (Pillow) не установлен. Скриншоты будут отключены.")
-    print("Для установки выполните: pip install pillow")
-    PIL_AVAILABLE = False
+    get_capture_backend()
+    CAPTURE_AVAILABLE = True
+except ImportError as e:
+    print(f"Внимание: {e}. Скриншоты будут отключены.")
+    CAPTURE_AVAILABLE = False
 
 
 
@@ -31,40 +33,35 @@ def get_layout():
     return format(lid, '04x')
 
 def take_screenshot(action_dir, screen_counter):
-    """Создает скриншот и возвращает имя файла"""
-    if not PIL_AVAILABLE:
-        return None
+    """Захватывает экран и ставит кадр в очередь на запись.
+
+    Кодирование и сохранение PNG выполняет фоновый ScreenshotWriter, чтобы
+    обработчик событий pynput не задерживался. Возвращает (имя файла,
+    [x, y] курсора относительно виртуального экрана) или (None, None).
+    Скриншот с отметкой курсора строится по запросу (cursor_overlay.py).
+    """
+    if not CAPTURE_AVAILABLE or screenshot_writer is None:
+        return None, None
     
     screenshot_name = f"{screen_counter}.png"
     screenshot_path = action_dir / screenshot_name
     
     try:
-        # Делаем скриншот всего экрана (всех мониторов)
-        screenshot = ImageGrab.grab(all_screens=True)
-        screenshot.save(screenshot_path)
+        # Делаем скриншот всего экрана (всех мониторов) в отдельный буфер:
+        # кадр хранится в очереди до записи на диск
+        screenshot = get_capture_backend().grab(reuse_buffer=False)
         
         _x, _y = mc.get_cursor_coordinates()
         bounds = mc.get_virtual_screen_bounds()
-        x = _x - bounds['min_x']
-        y = _y - bounds['min_y']
-        # draw cursor 
-        draw = ImageDraw.Draw(screenshot)
-        cursor_radius = 5  # радиус кружка-курсора
-        draw.ellipse(
-            [
-                (x - cursor_radius, y - cursor_radius),
-                (x + cursor_radius, y + cursor_radius)
-            ],
-            outline="red", width=2, fill="red"
-        )
-        screenshot_name_c = f"{screen_counter}_c.png"
-        screenshot_path_c = action_dir / screenshot_name_c
-        screenshot.save(screenshot_path_c)
-
-        return screenshot_name
+        cursor = [_x - bounds['min_x'], _y - bounds['min_y']]
+        
+        if not screenshot_writer.submit(screenshot, screenshot_path):
+            print(f"Скриншот {screenshot_name} отброшен: очередь записи переполнена")
+            return None, None
+        return screenshot_name, cursor
     except Exception as e:
         print(f"Ошибка при создании скриншота: {e}")
-        return None
+        return None, None
 
 def clear_action_directory(directory_path):
     """
@@ -92,11 +89,12 @@ def clear_action_directory(directory_path):
         print("Директория очищена.")
 
 # Глобальные переменные для записи
-actions = []
-filename = 'actions.json'
+event_log = None  # EventLogWriter: события дописываются в log.jsonl по мере появления
+filename = 'log.jsonl'
 start_time = None
 action_directory = None
 screen_counter = 0
+screenshot_writer = None
 
 # Обработчик события нажатия мыши
 def on_click(x, y, button, pressed):
@@ -117,11 +115,12 @@ def on_click(x, y, button, pressed):
         # Для активного действия (нажатие мыши) создаем скриншот
         if pressed:  # только при нажатии (down), не при отпускании
             screen_counter += 1
-            screenshot_name = take_screenshot(action_directory, screen_counter)
+            screenshot_name, cursor = take_screenshot(action_directory, screen_counter)
             if screenshot_name:
                 toAdd['screen'] = screenshot_name
+                toAdd['cursor'] = cursor
         
-        actions.append(toAdd)
+        event_log.append(toAdd)
         print(toAdd)
 
 
@@ -132,16 +131,13 @@ def on_press(key):
     
     # always allow ESC to stop
     if key == keyboard.Key.esc:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(actions, f, ensure_ascii=False, indent=4)
-        print(f'Запись сохранена в файл: {filename}')
+        event_log.close()
+        print(f'Запись сохранена в файл: {filename} (событий: {event_log.count})')
         return False
 
     # record Enter explicitly
     if key == keyboard.Key.enter:
-        screen_counter += 1
-        screenshot_name = take_screenshot(action_directory, screen_counter)
-        
+        # Время события фиксируем до захвата экрана
         toAdd = {
             'source': 'keyboard',
             'key': '\n',
@@ -149,18 +145,19 @@ def on_press(key):
             'layout': get_layout()
         }
         
+        screen_counter += 1
+        screenshot_name, cursor = take_screenshot(action_directory, screen_counter)
+        
         if screenshot_name:
             toAdd['screen'] = screenshot_name
+            toAdd['cursor'] = cursor
             
-        actions.append(toAdd)
+        event_log.append(toAdd)
         print(toAdd)
         return
 
     # record space explicitly
     if key == keyboard.Key.space:
-        screen_counter += 1
-        screenshot_name = take_screenshot(action_directory, screen_counter)
-        
         toAdd = {
             'source': 'keyboard',
             'key': ' ',
@@ -168,10 +165,14 @@ def on_press(key):
             'layout': get_layout()
         }
         
+        screen_counter += 1
+        screenshot_name, cursor = take_screenshot(action_directory, screen_counter)
+        
         if screenshot_name:
             toAdd['screen'] = screenshot_name
+            toAdd['cursor'] = cursor
             
-        actions.append(toAdd)
+        event_log.append(toAdd)
         print(toAdd)
         return
 
@@ -189,7 +190,7 @@ def on_press(key):
             'timestamp': time.time() - start_time,
             'layout': get_layout()
         }
-        actions.append(toAdd)
+        event_log.append(toAdd)
         print(toAdd)
 
 
@@ -201,17 +202,16 @@ def record_user_actions(action_name):
     Args:
         action_name (str): Имя действия (например, 'open_notepad')
     """
-    global actions, filename, start_time, action_directory, screen_counter
+    global event_log, filename, start_time, action_directory, screen_counter, screenshot_writer
     
     # Получаем конфигурацию
     cfg = get_config()
     
     # Определяем пути через конфигурацию
     action_directory = cfg.get_action_path(action_name)
-    log_file_path = cfg.get_log_file_path(action_name)
+    log_file_path = cfg.get_log_stream_path(action_name)
     
     # Инициализация
-    actions = []
     filename = str(log_file_path)
     start_time = time.time()
     screen_counter = 0
@@ -226,11 +226,25 @@ def record_user_actions(action_name):
     # Создаем директорию заново
     action_directory.mkdir(parents=True, exist_ok=True)
     
+    # Заголовок журнала: время начала, границы экрана и раскладка
+    header = {
+        'start_time': start_time,
+        'screen_bounds': mc.get_virtual_screen_bounds(),
+        'layout': get_layout()
+    }
+    event_log = EventLogWriter(log_file_path, header, cfg.get_log_fsync_interval())
+    
     print("Запись действий начата. Нажмите ESC для завершения записи.")
     print("Активные действия (клики мыши, enter, space) будут сопровождаться скриншотами.")
     
-    if not PIL_AVAILABLE:
-        print("Внимание: Скриншоты отключены - PIL (Pillow) не установлен.")
+    if not CAPTURE_AVAILABLE:
+        print("Внимание: Скриншоты отключены - источник кадров экрана недоступен.")
+    
+    screenshot_writer = ScreenshotWriter(
+        max_queue=cfg.get_screenshot_queue_size(),
+        workers=cfg.get_screenshot_workers(),
+        timeout=cfg.get_screenshot_queue_timeout()
+    )
     
     try:
         # Запуск слушателей
@@ -240,6 +254,14 @@ def record_user_actions(action_name):
     except Exception as e:
         print(f"Ошибка при записи действий: {e}")
         raise
+    finally:
+        event_log.close()
+        # Дожидаемся записи оставшихся скриншотов
+        screenshot_writer.close()
+        if CAPTURE_AVAILABLE:
+            screenshot_writer.print_summary()
+        screenshot_writer = None
+        record_file(action_name, log_file_path)
 
 if __name__ == "__main__":
     # Тестовый запуск для отладки
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Результаты воспроизведения: итог запуска и каждого действия.
+
+Возвращаются play.run_playback и api.Session.play вместо True/словаря.
+"""
+
+# Итог запуска
+PLAYBACK_COMPLETED = 'completed'  # все действия выполнены
+PLAYBACK_STOPPED = 'stopped'  # прервано (ESC, Session.stop)
+PLAYBACK_CUT = 'cut'  # остановлено F1 в режиме обрезки
+PLAYBACK_FAILED = 'failed'  # действие не выполнено (цель клика не найдена)
+PLAYBACK_NOT_READY = 'not ready'  # экран или ввод не готовы, действия не выполнялись
+PLAYBACK_ERROR = 'error'  # воспроизведение прервано исключением (результат частичный)
+
+# Итог действия
+ACTION_OK = 'ok'
+ACTION_FAILED = 'failed'  # цель клика не найдена или совпадение неоднозначно
+ACTION_ERROR = 'error'  # исключение при выполнении
+ACTION_SKIPPED = 'skipped'  # неизвестное действие
+
+
+class ActionResult:
+    """Итог одного действия.
+
+    started и duration - секунды от начала воспроизведения и длительность;
+    score и location - совпадение референсного прямоугольника и точка клика
+    (в динамическом режиме); prefetched - позиция найдена фоновым поиском.
+    """
+
+    __slots__ = ('index', 'id', 'name', 'status', 'started', 'duration', 'score', 'location',
+                 'prefetched', 'error')
+
+    def __init__(self, index, action_id, name, started):
+        self.index = index
+        self.id = action_id
+        self.name = name
+        self.status = ACTION_OK
+        self.started = started
+        self.duration = 0.0
+        self.score = None
+        self.location = None
+        self.prefetched = False
+        self.error = None
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"ActionResult({self.index}, {self.name!r}, {self.status!r}, {self.duration:.3f} с)"
+
+
+class PlaybackResult:
+    """Итог воспроизведения сценария"""
+
+    def __init__(self, action_name, scenario_file, total=None):
+        self.action_name = action_name
+        self.scenario_file = scenario_file
+        self.total = total  # число действий (None - зависит от условий сценария)
+        self.status = PLAYBACK_COMPLETED
+        self.executed = 0
+        self.actions = []  # ActionResult, если запрошены
+        self.last_index = -1  # последнее выполненное действие (для обрезки)
+        self.elapsed = 0.0
+        self.recorded = 0.0  # сумма записанных ожиданий
+        self.drift = 0.0  # отставание от записанного таймлайна
+        self.error = None
+        self.exception = None  # исключение при статусе error (в to_dict не попадает)
+
+    @property
+    def success(self):
+        return self.status == PLAYBACK_COMPLETED
+
+    @property
+    def failed_actions(self):
+        return [result for result in self.actions if result.status in (ACTION_FAILED, ACTION_ERROR)]
+
+    def to_dict(self):
+        return {
+            'action': self.action_name,
+            'scenario': str(self.scenario_file),
+            'status': self.status,
+            'total': self.total,
+            'executed': self.executed,
+            'last_index': self.last_index,
+            'elapsed': self.elapsed,
+            'recorded': self.recorded,
+            'drift': self.drift,
+            'error': self.error,
+            'actions': [result.to_dict() for result in self.actions],
+        }
+
+    def __repr__(self):
+        return (f"PlaybackResult({self.action_name!r}, {self.status!r}, "
+                f"{self.executed}/{self.total if self.total is not None else '?'}, {self.elapsed:.2f} с)")
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Компактный двоичный формат сценариев (*.lsc).
+
+Файл состоит из заголовка, массива записей фиксированной длины (по одной на
+действие) и таблицы строк:
+
+    заголовок   HEADER: сигнатура, версия, длина записи, число действий и смещения
+    записи      RECORD: тип действия, флаги полей, раскладка ключей, id, x, y,
+                три времени (timestamp/start, end, delay/time) и ссылки на строки
+                name, text, screen и extras
+    строки      массив смещений (count + 1 шт.) и UTF-8 данные строк
+
+Одинаковые строки (имена скриншотов, раскладки ключей, тексты) хранятся один
+раз. Поля, которые не помещаются в типизированные слоты (consumed_indices,
+cursor, layout, event и т.п., а также значения неожиданного типа), хранятся
+в extras - JSON-строке; раскладка - JSON-список ключей действия в исходном
+порядке. Поэтому преобразование JSON -> lsc -> JSON возвращает тот же JSON.
+
+Файл открывается через mmap: загрузка не зависит от числа действий, а
+действие по индексу собирается из своей записи при обращении.
+
+    python scenario_binary.py to-binary <scenario.json> [<scenario.lsc>]
+    python scenario_binary.py to-json <scenario.lsc> [<scenario.json>]
+    python scenario_binary.py bench [--actions 1000000]
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Попытка импорта psutil для замера памяти в бенчмарке
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+MAGIC = b'LPSC'
+VERSION = 1
+BINARY_SUFFIX = '.lsc'
+
+HEADER = struct.Struct('<4sHHQQQQ')  # magic, version, record size, count, records, strings, string data
+RECORD = struct.Struct('<BBHIqiidddIIII')
+OFFSET = struct.Struct('<Q')
+NO_STRING = 0xFFFFFFFF
+
+# Типы действий; OTHER - имя хранится строкой
+KINDS = ['other', 'click left', 'click right', 'typing', 'enter', 'space', 'wait']
+KIND_OTHER = 0
+KIND_CODES = {name: code for code, name in enumerate(KINDS) if code != KIND_OTHER}
+
+# Поля в типизированных слотах: (поле, слот, тип значения). Бит флага - индекс поля
+FIELDS = [
+    ('id', 'id', int),
+    ('x', 'x', int),
+    ('y', 'y', int),
+    ('timestamp', 't0', float),
+    ('start_timestamp', 't0', float),
+    ('end_timestamp', 't1', float),
+    ('delay', 't2', float),
+    ('time', 't2', float),
+    ('name', 'name', str),
+    ('text', 'text', str),
+    ('screen', 'screen', str),
+]
+FIELD_BITS = {field: 1 << bit for bit, (field, _, _) in enumerate(FIELDS)}
+FIELD_SLOTS = {field: (slot, value_type) for field, slot, value_type in FIELDS}
+INT_RANGES = {'id': (-2 ** 63, 2 ** 63 - 1), 'x': (-2 ** 31, 2 ** 31 - 1), 'y': (-2 ** 31, 2 ** 31 - 1)}
+
+
+def is_binary_scenario(path):
+    """True, если файл - двоичный сценарий (по сигнатуре)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _fits(field, value, value_type):
+    # bool - подкласс int, но в JSON это другой тип
+    if type(value) is not value_type:
+        return False
+    if field in INT_RANGES:
+        low, high = INT_RANGES[field]
+        return low <= value <= high
+    return True
+
+
+class _StringTable:
+    """Строки с повторным использованием одинаковых значений"""
+
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+        self.layouts = {}  # кортеж ключей -> ссылка на строку раскладки
+
+    def add(self, value):
+        ref = self.index.get(value)
+        if ref is None:
+            ref = len(self.strings)
+            self.index[value] = ref
+            self.strings.append(value)
+        return ref
+
+
+def encode_action(action, strings):
+    """Упаковывает действие в запись RECORD"""
+    slots = {'id': 0, 'x': 0, 'y': 0, 't0': 0.0, 't1': 0.0, 't2': 0.0,
+             'name': NO_STRING, 'text': NO_STRING, 'screen': NO_STRING}
+    used = set()
+    flags = 0
+    extras = {}
+    for field, value in action.items():
+        slot, value_type = FIELD_SLOTS.get(field, (None, None))
+        if slot is not None and slot not in used and _fits(field, value, value_type):
+            used.add(slot)
+            flags |= FIELD_BITS[field]
+            slots[slot] = strings.add(value) if value_type is str else value
+        else:
+            extras[field] = value
+
+    kind = KIND_OTHER
+    if flags & FIELD_BITS['name'] and action['name'] in KIND_CODES:
+        kind = KIND_CODES[action['name']]
+        slots['name'] = NO_STRING
+
+    keys = tuple(action)
+    layout = strings.layouts.get(keys)
+    if layout is None:
+        layout = strings.layouts[keys] = strings.add(json.dumps(list(keys), ensure_ascii=False))
+    extras_ref = strings.add(json.dumps(extras, ensure_ascii=False)) if extras else NO_STRING
+    return RECORD.pack(kind, 0, flags, layout, slots['id'], slots['x'], slots['y'],
+                       slots['t0'], slots['t1'], slots['t2'],
+                       slots['name'], slots['text'], slots['screen'], extras_ref)
+
+
+def write_binary_scenario(actions, path):
+    """Записывает действия в двоичный сценарий. Действия читаются по одному"""
+    strings = _StringTable()
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        for action in actions:
+            f.write(encode_action(action, strings))
+            count += 1
+
+        strings_offset = f.tell()
+        data_offset = strings_offset + OFFSET.size * (len(strings.strings) + 1)
+        encoded = [s.encode('utf-8') for s in strings.strings]
+        position = 0
+        for data in encoded:
+            f.write(OFFSET.pack(position))
+            position += len(data)
+        f.write(OFFSET.pack(position))
+        for data in encoded:
+            f.write(data)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count, HEADER.size, strings_offset, data_offset))
+    return count
+
+
+class BinaryScenario:
+    """Двоичный сценарий, открытый через mmap: список действий только для чтения"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Пустой файл сценария: {self.path}")
+        (magic, version, record_size, self.count, self._records,
+         self._strings, self._data) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Не двоичный сценарий: {self.path}")
+        if version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"Неподдерживаемая версия двоичного сценария: {version}")
+        self._layouts = {}  # раскладки ключей повторяются - разбираются один раз
+
+    def close(self):
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def string(self, ref):
+        start, = OFFSET.unpack_from(self._map, self._strings + ref * OFFSET.size)
+        end, = OFFSET.unpack_from(self._map, self._strings + (ref + 1) * OFFSET.size)
+        return self._map[self._data + start:self._data + end].decode('utf-8')
+
+    def _layout(self, ref):
+        layout = self._layouts.get(ref)
+        if layout is None:
+            layout = json.loads(self.string(ref))
+            self._layouts[ref] = layout
+        return layout
+
+    def _record(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('scenario index out of range')
+        return RECORD.unpack_from(self._map, self._records + index * RECORD.size)
+
+    def kind(self, index):
+        """Имя типа действия без сборки всего действия"""
+        kind, _, _, _, _, _, _, _, _, _, name_ref, _, _, _ = self._record(index)
+        if kind != KIND_OTHER:
+            return KINDS[kind]
+        return self.string(name_ref) if name_ref != NO_STRING else None
+
+    def kind_flags(self, index):
+        """(имя типа, флаги полей в типизированных слотах) без сборки действия"""
+        kind, _, flags, _, _, _, _, _, _, _, name_ref, _, _, _ = self._record(index)
+        if kind != KIND_OTHER:
+            return KINDS[kind], flags
+        return (self.string(name_ref) if name_ref != NO_STRING else None), flags
+
+    def number(self, index, field):
+        """Числовое поле из типизированного слота (None, если оно в extras или его нет)"""
+        record = self._record(index)
+        if not record[2] & FIELD_BITS[field]:
+            return None
+        slots = {'id': record[4], 'x': record[5], 'y': record[6], 't0': record[7], 't1': record[8],
+                 't2': record[9]}
+        return slots[FIELD_SLOTS[field][0]]
+
+    def __getitem__(self, index):
+        (kind, _, flags, layout_ref, id_, x, y, t0, t1, t2,
+         name_ref, text_ref, screen_ref, extras_ref) = self._record(index)
+        slots = {'id': id_, 'x': x, 'y': y, 't0': t0, 't1': t1, 't2': t2}
+        extras = json.loads(self.string(extras_ref)) if extras_ref != NO_STRING else {}
+        action = {}
+        for field in self._layout(layout_ref):
+            if not flags & FIELD_BITS.get(field, 0):
+                action[field] = extras[field]
+            elif field == 'name':
+                action[field] = KINDS[kind] if kind != KIND_OTHER else self.string(name_ref)
+            elif field == 'text':
+                action[field] = self.string(text_ref)
+            elif field == 'screen':
+                action[field] = self.string(screen_ref)
+            else:
+                action[field] = slots[FIELD_SLOTS[field][0]]
+        return action
+
+
+def load_binary_scenario(path):
+    return BinaryScenario(path)
+
+
+def json_to_binary(json_path, binary_path=None):
+    """Преобразует JSON-сценарий (массив действий) в двоичный. Возвращает путь"""
+    json_path = Path(json_path)
+    binary_path = Path(binary_path) if binary_path else json_path.with_suffix(BINARY_SUFFIX)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        actions = json.load(f)
+    if not isinstance(actions, list):
+        raise ValueError("В двоичный формат преобразуется только сценарий-массив действий "
+                         "(параметризованный сценарий сначала разверните через --expand)")
+    write_binary_scenario(actions, binary_path)
+    return binary_path
+
+
+def binary_to_json(binary_path, json_path=None, indent=2):
+    """Преобразует двоичный сценарий в JSON (как при сохранении сценария). Возвращает путь"""
+    binary_path = Path(binary_path)
+    json_path = Path(json_path) if json_path else binary_path.with_suffix('.json')
+    prefix = ' ' * indent
+    with BinaryScenario(binary_path) as scenario, open(json_path, 'w', encoding='utf-8') as f:
+        # Действия пишутся по одному; результат совпадает с json.dump(actions, f, indent=indent)
+        first = True
+        for action in scenario:
+            text = json.dumps(action, ensure_ascii=False, indent=indent).replace('\n', '\n' + prefix)
+            f.write(('[\n' if first else ',\n') + prefix + text)
+            first = False
+        f.write('[]' if first else '\n]')
+    return json_path
+
+
+def _generate_actions(count):
+    """Действия, похожие на результат декомпозиции, для бенчмарка"""
+    timestamp = 0.0
+    for i in range(count):
+        timestamp += 0.37
+        kind = i % 4
+        if kind == 0:
+            yield {'id': i + 1, 'name': 'click left', 'type': 'mouse_click', 'button': 'left',
+                   'x': 100 + i % 1800, 'y': 200 + i % 900, 'start_timestamp': timestamp,
+                   'end_timestamp': timestamp + 0.08, 'delay': 0.08, 'consumed_indices': [i, i + 1],
+                   'screen': f'{i // 4 + 1}.png'}
+        elif kind == 1 or kind == 3:
+            yield {'id': i + 1, 'name': 'wait', 'time': 0.5 + (i % 7) / 10}
+        else:
+            yield {'name': 'typing', 'type': 'keyboard_typing', 'text': f'value {i % 1000}',
+                   'start_timestamp': timestamp, 'end_timestamp': timestamp + 0.6,
+                   'consumed_indices': [i, i + 1, i + 2], 'id': i + 1}
+
+
+def _memory_usage():
+    """Текущий RSS процесса в байтах или None, если замерить нельзя"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _measure_load(path):
+    """Загружает сценарий и выводит JSON с временем загрузки, доступа и приростом RSS"""
+    before = _memory_usage()
+    start = time.perf_counter()
+    if is_binary_scenario(path):
+        actions = BinaryScenario(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            actions = json.load(f)
+    load_time = time.perf_counter() - start
+    after = _memory_usage()
+
+    start = time.perf_counter()
+    step = max(1, len(actions) // 1000)
+    sample = [actions[i] for i in range(0, len(actions), step)]
+    access_time = (time.perf_counter() - start) / max(1, len(sample))
+    rss = after - before if before is not None and after is not None else None
+    print(json.dumps({'load': load_time, 'access': access_time, 'rss': rss, 'count': len(actions)}))
+
+
+def run_benchmark(count):
+    """Сравнивает JSON и двоичный формат на count действиях (каждый замер - в отдельном процессе)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / 'bench.json'
+        binary_path = Path(tmp) / f'bench{BINARY_SUFFIX}'
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(list(_generate_actions(count)), f, ensure_ascii=False, indent=2)
+        start = time.perf_counter()
+        json_to_binary(json_path, binary_path)
+        convert_time = time.perf_counter() - start
+
+        print(f"Действий: {count}")
+        print(f"Размер: JSON {json_path.stat().st_size / 2 ** 20:.1f} МБ, "
+              f"двоичный {binary_path.stat().st_size / 2 ** 20:.1f} МБ "
+              f"(преобразование {convert_time:.2f} с)")
+        for label, path in [('JSON', json_path), ('двоичный', binary_path)]:
+            output = subprocess.run([sys.executable, __file__, '_measure', str(path)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            rss = f"{result['rss'] / 2 ** 20:.1f} МБ" if result['rss'] is not None else "н/д"
+            print(f"{label:>9}: загрузка {result['load'] * 1000:.1f} мс, RSS +{rss}, "
+                  f"доступ к действию {result['access'] * 1e6:.1f} мкс")
+
+        roundtrip_path = Path(tmp) / 'roundtrip.json'
+        binary_to_json(binary_path, roundtrip_path)
+        same = roundtrip_path.read_bytes() == json_path.read_bytes()
+        print(f"JSON -> двоичный -> JSON: {'совпадает' if same else 'НЕ совпадает'}")
+        return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Двоичный формат сценариев looper")
+    subparsers = parser.add_subparsers(dest='command')
+    parser_binary = subparsers.add_parser('to-binary', help='JSON -> двоичный сценарий')
+    parser_binary.add_argument('source')
+    parser_binary.add_argument('target', nargs='?')
+    parser_json = subparsers.add_parser('to-json', help='Двоичный сценарий -> JSON')
+    parser_json.add_argument('source')
+    parser_json.add_argument('target', nargs='?')
+    parser_bench = subparsers.add_parser('bench', help='Сравнить загрузку JSON и двоичного формата')
+    parser_bench.add_argument('--actions', type=int, default=1000000, help='Число действий')
+    parser_measure = subparsers.add_parser('_measure')
+    parser_measure.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'to-binary':
+        print(f"Создан файл: {json_to_binary(args.source, args.target)}")
+    elif args.command == 'to-json':
+        print(f"Создан файл: {binary_to_json(args.source, args.target)}")
+    elif args.command == 'bench':
+        sys.exit(0 if run_benchmark(args.actions) else 1)
+    elif args.command == '_measure':
+        _measure_load(args.path)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,16 @@
 """
 
 import json
-import csv
 import copy
 import sys
-from pathlib import Path
 from config import get_config
-import mouse_clicker as mc
-from pynput import keyboard
-import threading
-import time
+from assets import build_reference_rectangles
+from catalog import get_catalog, record_file, scenario_info
+from scenario_format import ParameterizedScenario, iter_typing_rows, load_scenario
+from scenario_binary import BinaryScenario
+from scenario_cut import cut_actions
+from scenario_flow import resolve_scenario_file
+from scenario_plan import get_plan_path
 
 
 class ScenarioCreator:
@@ -43,10 +44,22 @@ class ScenarioCreator:
     
     
     def create_complex_scenario(self, output_name, delay=None, typing_params_file=None, 
-                               sleep_time=3):
-        """Создает комплексный сценарий с несколькими типами модификаций"""
+                               sleep_time=3, expand=False):
+        """Создает комплексный сценарий с несколькими типами модификаций.
+
+        С typing_params_file по умолчанию сохраняется параметризованный сценарий:
+        базовые действия один раз и ссылка на CSV, строки подставляются при
+        воспроизведении (см. scenario_format). expand=True - развернуть все
+        строки в один JSON-массив, как раньше.
+        """
         print(f"Создание комплексного сценария '{output_name}'...")
         
+        # Референсные прямоугольники для кликов (для динамического режима) - один раз на сценарий
+        self._build_reference_rectangles()
+        
+        if typing_params_file and not expand:
+            return self._create_parameterized_scenario(output_name, delay, typing_params_file, sleep_time)
+        
         # Загружаем параметры typing если указаны
         typing_data = None
         if typing_params_file:
@@ -61,7 +74,7 @@ class ScenarioCreator:
             scenario_actions = []
             
             for action in self.base_actions:
-                new_action = copy.deepcopy(action)
+                new_action = self._modify_action(action, delay)
                 
                 # Модифицируем typing действия
                 if action.get('name') == 'typing' and typing_data:
@@ -75,31 +88,6 @@ class ScenarioCreator:
                         # Если нет соответствующего ID, берем первое не-id значение
                         raise Exception(f"Ошибка обработке typing parameters")
                 
-                # Обрабатываем задержки для действий wait
-                if action.get('name') == 'wait':
-                    if delay is not None:
-                        # Фиксированная задержка - используем новую упрощенную структуру
-                        new_action['time'] = float(delay)
-                        # Удаляем старую структуру event если она есть
-                        if 'event' in new_action:
-                            del new_action['event']
-                    else:
-                        # Если задержка не указана, оставляем исходную структуру
-                        # Но приводим к новому формату если используется старая структура
-                        if 'event' in new_action and new_action['event'].get('name') == 'timer':
-                            new_action['time'] = new_action['event']['time']
-                            del new_action['event']
-                
-                # Создаем референсные прямоугольники для кликов мыши если есть скриншоты
-                # (для использования в динамическом режиме воспроизведения)
-                if action.get('name') in ['click left', 'click right'] and 'screen' in action:
-                    screen_file = action.get('screen')
-                    if screen_file:
-                        # Создаем имя файла для референсного прямоугольника
-                        rr_name = screen_file.replace('.png', '_rr.png')
-                        # Создаем референсный прямоугольник (если его еще нет)
-                        self._create_reference_rectangle(screen_file, rr_name, action)
-                
                 scenario_actions.append(new_action)
             
             modified_actions.extend(scenario_actions)
@@ -117,75 +105,56 @@ class ScenarioCreator:
         self._save_scenario(modified_actions, output_name)
         return modified_actions
     
+    def _modify_action(self, action, delay=None):
+        """Копия базового действия с задержкой delay для wait"""
+        new_action = copy.deepcopy(action)
+        
+        # Обрабатываем задержки для действий wait
+        if action.get('name') == 'wait':
+            if delay is not None:
+                # Фиксированная задержка - используем новую упрощенную структуру
+                new_action['time'] = float(delay)
+                # Удаляем старую структуру event если она есть
+                if 'event' in new_action:
+                    del new_action['event']
+            else:
+                # Если задержка не указана, оставляем исходную структуру
+                # Но приводим к новому формату если используется старая структура
+                if 'event' in new_action and new_action['event'].get('name') == 'timer':
+                    new_action['time'] = new_action['event']['time']
+                    del new_action['event']
+        
+        return new_action
+    
+    def _create_parameterized_scenario(self, output_name, delay, typing_params_file, sleep_time):
+        """Сохраняет базовые действия один раз со ссылкой на CSV с параметрами typing"""
+        actions = [self._modify_action(action, delay) for action in self.base_actions]
+        scenario = ParameterizedScenario(actions, typing_params_file, sleep_time, self.next_id)
+        if not scenario.rows_count:
+            print("Предупреждение: в CSV нет строк параметров - базовые действия выполнятся один раз без подстановки")
+        print(f"Строк параметров: {scenario.rows_count}, действий при воспроизведении: {len(scenario)}")
+        self._save_scenario(scenario.to_data(self.config.get_action_path(self.action_name)), output_name)
+        return scenario
+    
     def create_scenario_with_delay(self, delay, output_name):
         """Создает сценарий с фиксированной задержкой (для обратной совместимости)"""
         return self.create_complex_scenario(output_name, delay=delay)
     
     def _load_typing_params(self, typing_params_file):
         """Загружает параметры ввода из CSV файла"""
-        import io
-
         try:
-            with open(typing_params_file, 'r', encoding='utf-8') as f:
-                # Фильтруем строки, убирая комментарии и пустые строки
-                filtered_lines = []
-                for line in f:
-                    line = line.strip()
-                    # Пропускаем пустые строки и комментарии (начинающиеся с #)
-                    if line and not line.startswith('#'):
-                        filtered_lines.append(line)
-                
-                # Создаем строковый буфер для csv.DictReader
-                csv_content = '\n'.join(filtered_lines)
-                csv_buffer = io.StringIO(csv_content)
-                
-                reader = csv.DictReader(csv_buffer)
-                return list(reader)
+            # Пустые строки и комментарии (начинающиеся с #) пропускаются
+            return list(iter_typing_rows(typing_params_file))
         except Exception as e:
             raise Exception(f"Ошибка при чтении файла параметров ввода: {e}")
     
     
-    def _create_reference_rectangle(self, screen_file, pic_name, click_action):
-        """Создает референсный прямоугольник 50x50 из скриншота"""
-        try:
-            from PIL import Image
-            import os
-            
-            # Получаем путь к папке с действием
-            action_folder = self.config.get_action_path(self.action_name)
-            screen_path = action_folder / screen_file
-            pic_path = action_folder / pic_name
-            
-            if not screen_path.exists():
-                print(f"Предупреждение: файл скриншота '{screen_path}' не найден")
-                return
-            
-            # Открываем исходное изображение
-            with Image.open(screen_path) as img:
-                # Получаем координаты клика
-                _x = click_action.get('x', 0)
-                _y = click_action.get('y', 0)
-                bounds = mc.get_virtual_screen_bounds()
-                x = _x - bounds['min_x']
-                y = _y - bounds['min_y'] 
-                
-                # Вычисляем границы прямоугольника 50x50 с центром в точке клика
-                left = max(0, x - 25)
-                top = max(0, y - 25)
-                right = min(img.width, x + 25)
-                bottom = min(img.height, y + 25)
-                
-                # Вырезаем прямоугольник
-                reference_rect = img.crop((left, top, right, bottom))
-                
-                # Сохраняем референсный прямоугольник
-                reference_rect.save(pic_path)
-                print(f"Создан референсный прямоугольник: {pic_path}")
-                
-        except ImportError:
-            print("Предупреждение: PIL (Pillow) не установлен. Референсные прямоугольники не будут созданы.")
-        except Exception as e:
-            print(f"Ошибка при создании референсного прямоугольника: {e}")
+    def _build_reference_rectangles(self):
+        """Создает недостающие и устаревшие *_rr.png для кликов базовых действий"""
+        action_folder = self.config.get_action_path(self.action_name)
+        created, skipped, errors = build_reference_rectangles(self.base_actions, action_folder)
+        if created or errors:
+            print(f"Референсные прямоугольники: создано {created}, актуальных {skipped}, ошибок {errors}")
     
     def _save_scenario(self, actions, output_name):
         """Сохраняет сценарий в файл"""
@@ -197,6 +166,7 @@ class ScenarioCreator:
             print(f"Сценарий сохранен в '{scenario_file}'")
         except Exception as e:
             raise Exception(f"Ошибка при сохранении сценария: {e}")
+        record_file(self.action_name, scenario_file)
     
     def get_scenario_info(self, output_name):
         """Возвращает информацию о сценарии"""
@@ -206,24 +176,34 @@ class ScenarioCreator:
             return None
         
         try:
-            with open(scenario_file, 'r', encoding='utf-8') as f:
-                scenario_data = json.load(f)
-            
-            info = {
-                'file': str(scenario_file),
-                'total_actions': len(scenario_data),
-                'click_actions': len([a for a in scenario_data if a.get('name') in ['click left', 'click right']]),
-                'typing_actions': len([a for a in scenario_data if a.get('name') == 'typing']),
-                'wait_actions': len([a for a in scenario_data if a.get('name') == 'wait']),
-                'enter_actions': len([a for a in scenario_data if a.get('name') == 'enter']),
-                'space_actions': len([a for a in scenario_data if a.get('name') == 'space']),
-            }
-            
-            return info
+            # Счетчики берутся из каталога; файл разбирается, только если он изменился
+            return scenario_info(get_catalog().file_info(self.action_name, scenario_file), scenario_file)
         except Exception as e:
             return {'error': str(e)}
 
     # ---------------- CUT SCENARIO FEATURE -----------------
+    def create_offline_cut_scenario(self, output_name, spec, source_name=None):
+        """Обрезает сценарий по спецификации без воспроизведения (см. scenario_cut).
+
+        source_name - сценарий-источник (по умолчанию базовые действия).
+        """
+        actions = self.base_actions
+        if source_name:
+            # Как при воспроизведении: NAME.json, а если его нет - NAME.lsc
+            action_dir = self.config.get_action_path(self.action_name)
+            source_file = resolve_scenario_file(action_dir, source_name)
+            if not source_file.exists():
+                raise FileNotFoundError(f"Сценарий-источник '{source_file}' не найден")
+            actions = load_scenario(source_file, action_dir)
+        try:
+            cut = cut_actions(actions, spec)
+        finally:
+            if isinstance(actions, BinaryScenario):
+                actions.close()
+        self._save_scenario(cut, output_name)
+        print(f"Создан обрезанный сценарий '{output_name}' с {len(cut)} действиями ({spec}).")
+        return cut
+    
     def create_cut_scenario(self, output_name):
         """Интерактивно обрезает базовые действия на момент нажатия F1 во время их проигрывания.
 
@@ -247,11 +227,13 @@ class ScenarioCreator:
                 json.dump(self.base_actions, f, ensure_ascii=False, indent=2)
             result = play_actions(self.action_name, actions_file=temp_name, dynamic=False, cut_mode=True)
         finally:
-            if temp_path.exists():
-                try:
-                    temp_path.unlink()
-                except Exception:
-                    pass
+            # Вместе с временным файлом убираем и кэш его плана
+            for path in (temp_path, get_plan_path(temp_path)):
+                if path.exists():
+                    try:
+                        path.unlink()
+                    except Exception:
+                        pass
 
         if isinstance(result, dict) and result.get('cut') and result.get('last_index', -1) >= 0:
             cut_idx = result['last_index']
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Обрезка сценария без воспроизведения.
+
+Спецификация - один или несколько отрезков через запятую; отрезки
+склеиваются в указанном порядке. Отрезок - одно значение или диапазон
+"начало-конец" (границы включаются, любую можно опустить):
+
+    5, 3-10, -10, 20-     номера действий (с 1)
+    id:12, id:12-40       ID действий
+    t:2.5-30              записанное время в секундах (timestamp/start_timestamp)
+    screen:5-9            скриншоты: от действия с 5.png до действия с 9.png
+
+Ожидание (wait) не имеет своего времени - для отбора по времени считается,
+что оно идет сразу после предыдущего действия.
+"""
+
+# Префиксы отрезков; без префикса - номер действия
+SELECT_INDEX = 'index'
+SELECT_ID = 'id'
+SELECT_TIME = 't'
+SELECT_SCREEN = 'screen'
+
+
+class CutSpecError(ValueError):
+    """Неверная спецификация обрезки или отрезок не найден в сценарии"""
+
+
+def _parse_bound(value, kind):
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        if kind == SELECT_TIME:
+            return float(value)
+        if kind == SELECT_SCREEN:
+            return value if value.endswith('.png') else f"{value}.png"
+        return int(value)
+    except ValueError:
+        raise CutSpecError(f"Неверная граница отрезка: '{value}'")
+
+
+def parse_cut_spec(spec):
+    """Разбирает спецификацию в список отрезков [(тип, начало, конец), ...]"""
+    segments = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        kind = SELECT_INDEX
+        prefix, sep, rest = part.partition(':')
+        if sep:
+            kind = prefix.strip().lower()
+            if kind not in (SELECT_ID, SELECT_TIME, SELECT_SCREEN):
+                raise CutSpecError(f"Неизвестный тип отрезка: '{prefix}'")
+            part = rest
+        # '-' разделяет границы; для чисел минус в начале означает открытое начало
+        start, sep, end = part.partition('-')
+        start = _parse_bound(start, kind)
+        end = _parse_bound(end, kind) if sep else start
+        if start is None and end is None and not sep:
+            raise CutSpecError(f"Пустой отрезок в '{spec}'")
+        segments.append((kind, start, end))
+    if not segments:
+        raise CutSpecError("Не задано ни одного отрезка")
+    return segments
+
+
+def _action_times(actions):
+    """Записанное время каждого действия (у wait - время конца предыдущего действия)"""
+    times = []
+    last = None
+    for action in actions:
+        start = action.get('start_timestamp', action.get('timestamp'))
+        if start is not None:
+            times.append(start)
+            last = action.get('end_timestamp', start)
+        else:
+            times.append(last)
+    return times
+
+
+def _first_index(values, value, start=0):
+    for index in range(start, len(values)):
+        if values[index] == value:
+            return index
+    return None
+
+
+def segment_range(actions, segment, keys=None):
+    """Индексы [начало, конец) отрезка в списке действий.
+
+    actions - список или ленивый сценарий (len() и индекс). keys - уже
+    собранные значения по типам отрезков (для нескольких отрезков).
+    """
+    kind, start, end = segment
+    count = len(actions)
+    if keys is None:
+        keys = {}
+
+    if kind == SELECT_INDEX:
+        first = 0 if start is None else start - 1
+        last = count if end is None else end
+        if first >= last:
+            raise CutSpecError(f"Пустой отрезок {start}-{end}")
+        if first < 0 or last > count:
+            raise CutSpecError(f"Номера {start}-{end} вне сценария (действий: {count})")
+        return first, last
+
+    if kind == SELECT_TIME:
+        times = keys.get(SELECT_TIME)
+        if times is None:
+            times = keys[SELECT_TIME] = _action_times(actions)
+        selected = [i for i, t in enumerate(times)
+                    if t is not None and (start is None or t >= start) and (end is None or t <= end)]
+        if not selected:
+            raise CutSpecError(f"Нет действий во времени {start}-{end}")
+        return selected[0], selected[-1] + 1
+
+    field = 'id' if kind == SELECT_ID else 'screen'
+    values = keys.get(kind)
+    if values is None:
+        values = keys[kind] = [action.get(field) for action in actions]
+    first = 0 if start is None else _first_index(values, start)
+    if first is None:
+        raise CutSpecError(f"Не найдено действие с {field} = {start}")
+    last = count - 1 if end is None else _first_index(values, end, first)
+    if last is None:
+        raise CutSpecError(f"Не найдено действие с {field} = {end} после {start}")
+    return first, last + 1
+
+
+def cut_actions(actions, spec):
+    """Возвращает действия из отрезков спецификации spec (строка или список отрезков)"""
+    segments = parse_cut_spec(spec) if isinstance(spec, str) else spec
+    # Ленивый (параметризованный или двоичный) сценарий не разворачивается:
+    # для отрезков по id/времени/скриншоту собираются только эти значения,
+    # а действия берутся по индексу только из выбранных отрезков
+    keys = {}
+    result = []
+    for segment in segments:
+        first, last = segment_range(actions, segment, keys)
+        if isinstance(actions, list):
+            result.extend(actions[first:last])
+        else:
+            result.extend(actions[index] for index in range(first, last))
+    return result
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Управляющие конструкции сценария: повтор, включение и условие.
+
+Конструкции записываются в JSON-массиве сценария как особые действия:
+
+    {"name": "repeat", "times": 1000, "actions": [...]}
+    {"name": "include", "scenario": "login"}
+    {"name": "if", "image": "dialog.png", "timeout": 0, "threshold": 0.8,
+     "then": [...], "else": [...]}
+
+include подключает другой сценарий того же действия (имя файла без .json,
+как в looper -f; подходит и двоичный .lsc). Условие if проверяет, видно ли
+изображение (путь относительно папки действия) на экране; timeout - сколько
+секунд ждать его появления (0 - одна проверка), else можно опустить.
+
+Сценарий не разворачивается в копии действий: при загрузке он компилируется
+в дерево узлов (включаемые файлы читаются и проверяются один раз), а при
+воспроизведении дерево обходится интерпретатором, который выдает действия
+по одному. Условие вычисляется, только когда воспроизведение дошло до него.
+"""
+
+from collections import deque
+from pathlib import Path
+
+from scenario_binary import BINARY_SUFFIX, BinaryScenario
+from scenario_format import TypingParamsError, load_scenario, unique_actions
+
+CONTROL_NAMES = ('repeat', 'include', 'if')
+
+# Маркер перед условием: просмотр вперед (поиск цели клика) не заходит за него,
+# чтобы условие не вычислялось раньше, чем до него дойдет воспроизведение
+BARRIER = object()
+_END = object()
+
+
+class FlowError(ValueError):
+    """Ошибка в управляющих конструкциях сценария"""
+
+
+def has_control_flow(actions):
+    """True, если в сценарии (списке действий) есть управляющие конструкции"""
+    return isinstance(actions, list) and any(
+        isinstance(action, dict) and action.get('name') in CONTROL_NAMES for action in actions
+    )
+
+
+def resolve_scenario_file(action_dir, name):
+    """Файл сценария по имени из include: NAME.json или NAME.lsc в папке действия"""
+    scenario_file = Path(name)
+    if scenario_file.suffix not in ('.json', BINARY_SUFFIX):
+        scenario_file = scenario_file.with_name(scenario_file.name + '.json')
+    if not scenario_file.is_absolute():
+        scenario_file = Path(action_dir) / scenario_file
+    binary_file = scenario_file.with_suffix(BINARY_SUFFIX)
+    if not scenario_file.exists() and binary_file.exists():
+        scenario_file = binary_file
+    return scenario_file
+
+
+class Sequence:
+    """Действия без управляющих конструкций (список, параметризованный или двоичный сценарий)"""
+
+    def __init__(self, actions):
+        self.actions = actions
+
+    def run(self, evaluate):
+        for action in self.actions:
+            yield action
+
+    def count(self):
+        return len(self.actions)
+
+    def leaves(self, seen):
+        return unique_actions(self.actions)
+
+    def close(self):
+        if isinstance(self.actions, BinaryScenario):
+            self.actions.close()
+
+
+class Block:
+    """Узлы, выполняемые по порядку"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def run(self, evaluate):
+        for node in self.nodes:
+            yield from node.run(evaluate)
+
+    def count(self):
+        total = 0
+        for node in self.nodes:
+            count = node.count()
+            if count is None:
+                return None
+            total += count
+        return total
+
+    def leaves(self, seen):
+        result = []
+        for node in self.nodes:
+            if id(node) in seen:
+                # Сценарий, включенный несколько раз, обходится один раз
+                continue
+            seen.add(id(node))
+            result.extend(node.leaves(seen))
+        return result
+
+    def close(self):
+        for node in self.nodes:
+            node.close()
+
+
+class Repeat:
+    """repeat: тело выполняется times раз без копирования действий"""
+
+    def __init__(self, times, body):
+        self.times = times
+        self.body = body
+
+    def run(self, evaluate):
+        for _ in range(self.times):
+            yield from self.body.run(evaluate)
+
+    def count(self):
+        count = self.body.count()
+        return None if count is None else count * self.times
+
+    def leaves(self, seen):
+        return self.body.leaves(seen)
+
+    def close(self):
+        self.body.close()
+
+
+class Condition:
+    """if: ветка then, если изображение видно на экране, иначе ветка else"""
+
+    def __init__(self, image_path, timeout, threshold, then_block, else_block):
+        self.image_path = image_path
+        self.timeout = timeout
+        self.threshold = threshold
+        self.then_block = then_block
+        self.else_block = else_block
+
+    def run(self, evaluate):
+        yield BARRIER
+        branch = self.then_block if evaluate(self) else self.else_block
+        yield from branch.run(evaluate)
+
+    def count(self):
+        # Число действий зависит от экрана во время воспроизведения
+        return None
+
+    def leaves(self, seen):
+        return self.then_block.leaves(seen) + self.else_block.leaves(seen)
+
+    def close(self):
+        self.then_block.close()
+        self.else_block.close()
+
+
+class FlowCompiler:
+    """Компилирует сценарий с управляющими конструкциями в дерево узлов.
+
+    Каждый включаемый файл загружается и компилируется один раз; циклические
+    include и ошибки в конструкциях обнаруживаются до начала воспроизведения.
+    """
+
+    def __init__(self, action_dir):
+        self.action_dir = Path(action_dir)
+        self._compiled = {}  # путь файла -> узел
+        self._stack = []  # файлы, которые сейчас компилируются (для поиска циклов)
+
+    def compile_file(self, scenario_file):
+        scenario_file = Path(scenario_file).resolve()
+        if scenario_file in self._compiled:
+            return self._compiled[scenario_file]
+        if scenario_file in self._stack:
+            chain = ' -> '.join(p.name for p in self._stack + [scenario_file])
+            raise FlowError(f"Циклический include: {chain}")
+        if not scenario_file.exists():
+            raise FlowError(f"Включаемый сценарий не найден: {scenario_file}")
+        self._stack.append(scenario_file)
+        try:
+            node = self.compile(load_scenario(scenario_file, self.action_dir), scenario_file.name)
+        except TypingParamsError as e:
+            raise FlowError(f"{scenario_file.name}: {e}")
+        finally:
+            self._stack.pop()
+        self._compiled[scenario_file] = node
+        return node
+
+    def compile(self, actions, source):
+        """Узел для действий сценария; source - имя файла для сообщений об ошибках"""
+        if not has_control_flow(actions):
+            return Sequence(actions)
+        nodes = []
+        plain = []
+        for index, action in enumerate(actions):
+            if not isinstance(action, dict) or action.get('name') not in CONTROL_NAMES:
+                plain.append(action)
+                continue
+            if plain:
+                nodes.append(Sequence(plain))
+                plain = []
+            nodes.append(self._compile_control(action, f"{source}[{index + 1}]"))
+        if plain:
+            nodes.append(Sequence(plain))
+        return Block(nodes)
+
+    def _compile_block(self, action, key, where, required=True):
+        body = action.get(key)
+        if body is None and not required:
+            body = []
+        if not isinstance(body, list):
+            raise FlowError(f"{where}: '{key}' должен быть списком действий")
+        return self.compile(body, f"{where}.{key}")
+
+    def _compile_control(self, action, where):
+        name = action['name']
+        if name == 'repeat':
+            times = action.get('times')
+            if not isinstance(times, int) or isinstance(times, bool) or times < 0:
+                raise FlowError(f"{where}: repeat требует целое times >= 0, получено {times!r}")
+            return Repeat(times, self._compile_block(action, 'actions', where))
+
+        if name == 'include':
+            scenario = action.get('scenario')
+            if not scenario or not isinstance(scenario, str):
+                raise FlowError(f"{where}: include требует имя сценария в 'scenario'")
+            return self.compile_file(resolve_scenario_file(self.action_dir, scenario))
+
+        image = action.get('image')
+        if not image or not isinstance(image, str):
+            raise FlowError(f"{where}: if требует файл изображения в 'image'")
+        image_path = Path(image)
+        if not image_path.is_absolute():
+            image_path = self.action_dir / image_path
+        if not image_path.exists():
+            raise FlowError(f"{where}: изображение для if не найдено: {image_path}")
+        try:
+            timeout = float(action.get('timeout', 0))
+            threshold = float(action.get('threshold', 0.8))
+        except (TypeError, ValueError):
+            raise FlowError(f"{where}: timeout и threshold должны быть числами")
+        return Condition(image_path, timeout, threshold,
+                         self._compile_block(action, 'then', where),
+                         self._compile_block(action, 'else', where, required=False))
+
+
+def compile_flow(actions, action_dir, source='scenario'):
+    """Компилирует загруженный сценарий в дерево узлов (см. FlowCompiler)"""
+    return FlowCompiler(action_dir).compile(actions, source)
+
+
+def flow_leaf_actions(tree):
+    """Все действия дерева без повторов (обе ветки условий) - для предзагрузки шаблонов"""
+    seen = {id(tree)}
+    return tree.leaves(seen)
+
+
+class ActionStream:
+    """Поток действий, которые интерпретатор выдает при обходе дерева.
+
+    Для цикла воспроизведения выглядит как список: итерация и индекс. Индекс
+    действует только вперед от текущего действия: в памяти держится лишь
+    просмотренное вперед окно. Просмотр вперед останавливается на условии
+    (IndexError, как в конце списка) - условие вычисляется evaluate(узел),
+    только когда итерация действительно переходит за него.
+    """
+
+    def __init__(self, tree, evaluate):
+        self._items = tree.run(evaluate)
+        self._buffer = deque()
+        self._first = 0  # индекс действия в начале буфера
+        self._blocked = False  # следующий элемент - условие
+        self._done = False
+
+    def _fill(self, index):
+        while self._first + len(self._buffer) <= index:
+            if self._blocked or self._done:
+                return False
+            item = next(self._items, _END)
+            if item is _END:
+                self._done = True
+            elif item is BARRIER:
+                self._blocked = True
+            else:
+                self._buffer.append(item)
+        return True
+
+    def __getitem__(self, index):
+        if index < self._first or not self._fill(index):
+            raise IndexError('action is not available yet')
+        return self._buffer[index - self._first]
+
+    def __iter__(self):
+        while True:
+            while not self._buffer:
+                if self._done:
+                    return
+                # Все действия до условия выполнены - можно его вычислять
+                self._blocked = False
+                self._fill(self._first)
+            self._first += 1
+            yield self._buffer.popleft()
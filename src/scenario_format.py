@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Формат файлов сценариев.
+
+Обычный сценарий - JSON-массив действий. Сценарий с параметрами typing из CSV
+хранит базовые действия один раз и ссылку на CSV:
+    {"format": "parameterized", "version": 1, "actions": [...],
+     "typing_params": "params.csv", "sleep": 3, "sleep_id": 42,
+     "rows": 50000, "typing_params_state": [size, mtime_ns]}
+Действия для каждой строки CSV собираются на лету во время воспроизведения:
+typing получает текст из колонки, названной исходным текстом, а между
+строками вставляется ожидание sleep секунд. Память и время запуска не зависят
+от числа строк: CSV читается потоково, в памяти держится только окно строк
+вокруг текущего действия. Число строк запоминается в сценарии и
+пересчитывается, только если CSV изменился.
+"""
+
+import copy
+import csv
+import json
+from pathlib import Path
+
+from scenario_binary import BinaryScenario, is_binary_scenario
+
+PARAMETERIZED_FORMAT = 'parameterized'
+PARAMETERIZED_VERSION = 1
+
+
+class TypingParamsError(ValueError):
+    """CSV с параметрами typing не подходит к действиям сценария"""
+
+
+def iter_csv_lines(f):
+    """Строки CSV без пустых строк и комментариев (начинающихся с #)"""
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            # Перевод строки нужен csv для значений в кавычках на нескольких строках
+            yield line + '\n'
+
+
+def iter_typing_rows(typing_params_file):
+    """Потоково читает строки параметров typing из CSV (словарь колонка -> значение)"""
+    with open(typing_params_file, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(iter_csv_lines(f)):
+            yield row
+
+
+def read_typing_columns(typing_params_file):
+    """Возвращает названия колонок CSV с параметрами typing"""
+    with open(typing_params_file, 'r', encoding='utf-8') as f:
+        return next(csv.reader(iter_csv_lines(f)), [])
+
+
+def bind_typing_row(action, typing_row):
+    """Возвращает копию действия typing с текстом из строки параметров"""
+    original_text = str(action.get('text'))
+    if typing_row.get(original_text) is None:
+        raise TypingParamsError(f"Ошибка обработки typing parameters: нет значения для колонки {original_text!r}")
+    bound = copy.copy(action)
+    bound['text'] = typing_row[original_text]
+    return bound
+
+
+def count_typing_rows(typing_params_file):
+    """Считает строки параметров, не загружая их; строка короче заголовка - TypingParamsError"""
+    with open(typing_params_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(iter_csv_lines(f))
+        header = next(reader, None)
+        if header is None:
+            return 0
+        count = 0
+        for count, row in enumerate(reader, 1):
+            if len(row) < len(header):
+                raise TypingParamsError(f"Ошибка обработки typing parameters: строка {count} - "
+                                        f"значений {len(row)} из {len(header)}")
+        return count
+
+
+def file_state(path):
+    """[size, mtime_ns] файла - для проверки, что он не изменился"""
+    st = Path(path).stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def check_typing_columns(actions, columns):
+    """Проверяет, что для каждого действия typing в CSV есть колонка"""
+    missing = [str(a.get('text')) for a in actions
+               if a.get('name') == 'typing' and str(a.get('text')) not in columns]
+    if missing:
+        raise TypingParamsError(f"Ошибка обработки typing parameters: нет колонок {missing}")
+
+
+class ParameterizedScenario:
+    """Сценарий base_actions x строки CSV, собираемый на лету.
+
+    Ведет себя как список действий только для чтения: len() и индекс.
+    Строки CSV читаются последовательно; при обращении к более ранней строке,
+    чем есть в окне, файл перечитывается с начала (воспроизведение идет
+    вперед, так что это происходит только при повторном проходе). CSV без
+    строк данных дает, как и развернутый сценарий, один проход по базовым
+    действиям без подстановки.
+    """
+
+    # Сколько прочитанных строк хранится позади текущей
+    ROW_WINDOW = 2
+
+    def __init__(self, base_actions, typing_params_file, sleep_time=3, sleep_id=None, rows_count=None):
+        self.base_actions = base_actions
+        self.typing_params_file = Path(typing_params_file)
+        self.sleep_time = sleep_time
+        self.sleep_id = sleep_id
+        self.params_state = file_state(self.typing_params_file)
+        # CSV могли изменить после создания сценария - проверяем до первого действия
+        check_typing_columns(base_actions, read_typing_columns(self.typing_params_file))
+        if rows_count is None:
+            rows_count = count_typing_rows(self.typing_params_file)
+        self.rows_count = rows_count
+        self._rows = {}  # номер строки -> строка CSV
+        self._reader = None
+        self._next_row = 0
+
+    @property
+    def stride(self):
+        """Число действий на одну строку вместе с ожиданием между строками"""
+        return len(self.base_actions) + 1
+
+    def __len__(self):
+        if not self.rows_count:
+            return len(self.base_actions)
+        return self.rows_count * self.stride - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('scenario index out of range')
+        if not self.rows_count:
+            return self.base_actions[index]
+        row_index, position = divmod(index, self.stride)
+        if position == len(self.base_actions):
+            return self._sleep_action(row_index)
+        action = self.base_actions[position]
+        if action.get('name') != 'typing':
+            return action
+        return bind_typing_row(action, self._row(row_index))
+
+    def _sleep_action(self, row_index):
+        if self.sleep_id is None:
+            return {"name": "wait", "time": self.sleep_time}
+        return {"id": self.sleep_id + row_index, "name": "wait", "time": self.sleep_time}
+
+    def _row(self, row_index):
+        if row_index in self._rows:
+            return self._rows[row_index]
+        if row_index < self._next_row:
+            # Строка уже вышла из окна - читаем CSV заново
+            self._reader = None
+        if self._reader is None:
+            self._reader = iter_typing_rows(self.typing_params_file)
+            self._next_row = 0
+            self._rows = {}
+        while self._next_row <= row_index:
+            self._rows[self._next_row] = next(self._reader)
+            self._next_row += 1
+        for old_index in [i for i in self._rows if i < row_index - self.ROW_WINDOW]:
+            del self._rows[old_index]
+        return self._rows[row_index]
+
+    def action_counts(self):
+        """Число действий каждого типа без сборки сценария"""
+        counts = {}
+        passes = max(self.rows_count, 1)
+        for action in self.base_actions:
+            name = action.get('name')
+            counts[name] = counts.get(name, 0) + passes
+        if self.rows_count > 1:
+            counts['wait'] = counts.get('wait', 0) + self.rows_count - 1
+        return counts
+
+    def to_data(self, action_dir=None):
+        """Данные для сохранения в файл сценария"""
+        params_file = self.typing_params_file
+        if action_dir is not None and params_file.parent == Path(action_dir):
+            # CSV в папке действия - храним только имя, чтобы папку можно было переносить
+            params_file = Path(params_file.name)
+        return {
+            'format': PARAMETERIZED_FORMAT,
+            'version': PARAMETERIZED_VERSION,
+            'actions': self.base_actions,
+            'typing_params': str(params_file),
+            'sleep': self.sleep_time,
+            'sleep_id': self.sleep_id,
+            'rows': self.rows_count,
+            'typing_params_state': self.params_state,
+        }
+
+
+def is_parameterized(data):
+    return isinstance(data, dict) and data.get('format') == PARAMETERIZED_FORMAT
+
+
+def scenario_from_data(data, action_dir):
+    """Возвращает действия сценария: список или ParameterizedScenario"""
+    if not is_parameterized(data):
+        return data
+    if data.get('version') != PARAMETERIZED_VERSION:
+        raise ValueError(f"Неподдерживаемая версия сценария: {data.get('version')}")
+    params_file = Path(data['typing_params'])
+    if not params_file.is_absolute():
+        params_file = Path(action_dir) / params_file
+    rows_count = None
+    if data.get('typing_params_state') == file_state(params_file):
+        rows_count = data.get('rows')
+    return ParameterizedScenario(data['actions'], params_file, data.get('sleep', 3), data.get('sleep_id'),
+                                 rows_count)
+
+
+def load_scenario(scenario_file, action_dir=None):
+    """Загружает файл сценария любого формата (см. scenario_from_data и scenario_binary)"""
+    scenario_file = Path(scenario_file)
+    if is_binary_scenario(scenario_file):
+        return BinaryScenario(scenario_file)
+    with open(scenario_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return scenario_from_data(data, action_dir if action_dir is not None else scenario_file.parent)
+
+
+def unique_actions(actions):
+    """Действия без повторов по строкам параметров (для предзагрузки шаблонов)"""
+    if isinstance(actions, ParameterizedScenario):
+        return actions.base_actions
+    return actions
+
+
+def count_actions(actions):
+    """Число действий каждого типа в сценарии"""
+    if isinstance(actions, ParameterizedScenario):
+        return actions.action_counts()
+    if isinstance(actions, BinaryScenario):
+        # Тип читается из записи, действие целиком не собирается
+        names = (actions.kind(index) for index in range(len(actions)))
+    else:
+        names = (action.get('name') for action in actions)
+    counts = {}
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+План выполнения сценария.
+
+Перед воспроизведением сценарий проверяется целиком и компилируется в план:
+проверенные параметры шагов хранятся кортежами, пути к референсным
+прямоугольникам вычислены один раз, а при воспроизведении шаг читается как
+компактный PlanStep (__slots__ вместо словаря). Ошибка в
+сценарии (неизвестное действие, клик без координат, wait без времени...)
+обнаруживается до первого действия, а не когда воспроизведение до него дойдет.
+
+План обычного JSON-сценария кэшируется рядом с ним (NAME.plan). Кэш
+действителен, пока не изменились размер и mtime сценария; если они
+изменились, а SHA-256 содержимого тот же (файл только "тронули"), план
+используется повторно. При действительном кэше JSON сценария не разбирается.
+Кэш хранится через marshal (только кортежи, строки, числа, списки и
+словари): загрузка чужого NAME.plan из общей папки не выполняет код.
+
+Параметризованные, двоичные сценарии и сценарии с управляющими
+конструкциями не компилируются в план (это бы развернуло их в полный список
+действий) - проверяются только их различающиеся действия.
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+import threading
+from pathlib import Path
+
+from assets import get_rr_path
+from config import get_config
+from scenario_binary import FIELD_BITS, BinaryScenario
+from scenario_flow import compile_flow, flow_leaf_actions, has_control_flow
+from scenario_format import ParameterizedScenario, TypingParamsError, file_state, load_scenario, unique_actions
+
+PLAN_VERSION = 2
+PLAN_SUFFIX = '.plan'
+
+CLICK_NAMES = ('click left', 'click right')
+ACTION_NAMES = CLICK_NAMES + ('typing', 'enter', 'space', 'wait')
+# Сколько ошибок сценария показывать
+MAX_REPORTED_ERRORS = 10
+# Обязательные поля, которые у корректного действия .lsc лежат в типизированных слотах
+BINARY_REQUIRED_FIELDS = {'click left': ('x', 'y'), 'click right': ('x', 'y'), 'typing': ('text',),
+                          'wait': ('time',)}
+
+
+class PlanError(ValueError):
+    """Сценарий не прошел проверку перед воспроизведением"""
+
+    def __init__(self, errors, source=None):
+        self.errors = errors
+        shown = errors[:MAX_REPORTED_ERRORS]
+        more = len(errors) - len(shown)
+        header = f"Ошибки в сценарии {source}:" if source else "Ошибки в сценарии:"
+        lines = [header] + [f"  {error}" for error in shown]
+        if more:
+            lines.append(f"  ... и еще {more}")
+        super().__init__('\n'.join(lines))
+
+
+class PlanStep:
+    """Проверенное действие плана. Читается как словарь действия: get(), [] и in"""
+
+    FIELDS = ('id', 'name', 'x', 'y', 'button', 'screen', 'text', 'time', 'event', 'rr_path')
+    __slots__ = FIELDS
+
+    def __init__(self, row, rr_paths):
+        (self.id, self.name, self.x, self.y, self.button, self.screen,
+         self.text, self.time, self.event, rr_index) = row
+        self.rr_path = rr_paths[rr_index] if rr_index is not None else None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def action_errors(action):
+    """Список ошибок в одном действии (пустой - действие корректно)"""
+    if not isinstance(action, dict):
+        return ["действие должно быть объектом JSON"]
+    name = action.get('name')
+    if name not in ACTION_NAMES:
+        return [f"неизвестное действие {name!r}"]
+    errors = []
+    if name in CLICK_NAMES:
+        if not _is_number(action.get('x')) or not _is_number(action.get('y')):
+            errors.append("у клика нет числовых координат x, y")
+        if action.get('button', 'left') not in ('left', 'right'):
+            errors.append(f"неизвестная кнопка {action.get('button')!r}")
+        if 'screen' in action and not isinstance(action['screen'], str):
+            errors.append("screen должен быть именем файла")
+    elif name == 'typing':
+        if not isinstance(action.get('text'), str):
+            errors.append("у typing нет текста")
+    elif name == 'wait':
+        if 'time' in action:
+            if not _is_number(action['time']) or action['time'] < 0:
+                errors.append(f"время ожидания должно быть числом >= 0, получено {action['time']!r}")
+        elif not isinstance(action.get('event'), dict):
+            errors.append("wait без времени или события")
+    return errors
+
+
+def _add_action_errors(errors, index, action):
+    for error in action_errors(action):
+        action_id = action.get('id') if isinstance(action, dict) else None
+        where = f"действие {index + 1}" + (f" (id {action_id})" if action_id is not None else "")
+        errors.append(f"{where}: {error}")
+
+
+def validate_actions(actions, source=None):
+    """Проверяет действия; при ошибках бросает PlanError со списком всех ошибок"""
+    errors = []
+    for index, action in enumerate(actions):
+        _add_action_errors(errors, index, action)
+    if errors:
+        raise PlanError(errors, source)
+
+
+def validate_binary_scenario(scenario, source=None):
+    """Проверяет двоичный сценарий по записям, не собирая каждое действие.
+
+    Тип действия и наличие обязательных полей читаются из записи; действие
+    собирается и проверяется целиком, только если здесь что-то не так (или
+    поле хранится в extras, например wait с событием).
+    """
+    errors = []
+    for index in range(len(scenario)):
+        name, flags = scenario.kind_flags(index)
+        required = BINARY_REQUIRED_FIELDS.get(name, ())
+        if name in ACTION_NAMES and all(flags & FIELD_BITS[field] for field in required):
+            if name != 'wait' or scenario.number(index, 'time') >= 0:
+                continue
+        _add_action_errors(errors, index, scenario[index])
+    if errors:
+        raise PlanError(errors, source)
+
+
+class ExecutionPlan:
+    """Скомпилированный сценарий: последовательность PlanStep только для чтения.
+
+    Шаги хранятся строками-кортежами (так план быстро читается из кэша), а
+    PlanStep создается при обращении к шагу. Путь к *_rr.png в строке - номер
+    в общем списке rr_names.
+    """
+
+    def __init__(self, rows, rr_names, action_dir):
+        self.rows = rows
+        self.rr_names = rr_names
+        self.rr_paths = [Path(action_dir) / name for name in rr_names]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return PlanStep(self.rows[index], self.rr_paths)
+
+    def __iter__(self):
+        for row in self.rows:
+            yield PlanStep(row, self.rr_paths)
+
+    @property
+    def asset_steps(self):
+        """Один клик на каждый референсный прямоугольник (побеждает последний, как в assets)"""
+        last = {}
+        for index, row in enumerate(self.rows):
+            if row[-1] is not None:
+                last[row[-1]] = index
+        return [self[index] for index in sorted(last.values())]
+
+
+def compile_plan(actions, action_dir, source=None):
+    """Проверяет список действий и строит ExecutionPlan"""
+    validate_actions(actions, source)
+    rr_names = []
+    rr_indexes = {}
+    rows = []
+    for action in actions:
+        name = sys.intern(action['name'])
+        rr_index = None
+        screen = action.get('screen')
+        if name in CLICK_NAMES and screen:
+            # Путь к *_rr.png вычисляется один раз на скриншот
+            rr_name = get_rr_path(action_dir, screen).name
+            rr_index = rr_indexes.get(rr_name)
+            if rr_index is None:
+                rr_index = rr_indexes[rr_name] = len(rr_names)
+                rr_names.append(rr_name)
+        rows.append((action.get('id'), name, action.get('x'), action.get('y'), action.get('button'),
+                     screen, action.get('text'), action.get('time'), action.get('event'), rr_index))
+    return ExecutionPlan(rows, rr_names, action_dir)
+
+
+def get_plan_path(scenario_file):
+    """Файл кэша плана рядом со сценарием: NAME.json -> NAME.plan"""
+    return Path(scenario_file).with_suffix(PLAN_SUFFIX)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_plan(scenario_file, action_dir, plan, state, digest):
+    """Сохраняет план в кэш (через временный файл, чтобы не оставить битый кэш)"""
+    plan_file = get_plan_path(scenario_file)
+    temp_file = plan_file.with_name(plan_file.name + '.tmp')
+    data = {
+        'version': PLAN_VERSION,
+        'action_dir': str(action_dir),
+        'state': state,
+        'sha256': digest,
+        'rows': plan.rows,
+        'rr_names': plan.rr_names,
+    }
+    try:
+        with open(temp_file, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(temp_file, plan_file)
+    except OSError as e:
+        print(f"Предупреждение: не удалось сохранить план {plan_file} ({e})")
+
+
+def _is_plan_data(data):
+    """Кэш плана имеет ожидаемую структуру (файл мог быть подменен или поврежден)"""
+    if not isinstance(data, dict) or not isinstance(data.get('rows'), list) \
+            or not isinstance(data.get('rr_names'), list):
+        return False
+    rows = data['rows']
+    rr_names = data['rr_names']
+    if not all(isinstance(name, str) and Path(name).name == name for name in rr_names):
+        return False
+    # Проверки через map - на сотнях тысяч строк заметно быстрее цикла
+    if set(map(type, rows)) - {tuple} or set(map(len, rows)) - {len(PlanStep.FIELDS)}:
+        return False
+    rr_indexes = set(row[-1] for row in rows)
+    rr_indexes.discard(None)
+    return all(type(index) is int and 0 <= index < len(rr_names) for index in rr_indexes)
+
+
+def load_cached_plan(scenario_file, action_dir):
+    """План из кэша или None, если кэша нет или он устарел"""
+    plan_file = get_plan_path(scenario_file)
+    if not plan_file.exists() or not Path(scenario_file).exists():
+        return None
+    try:
+        with open(plan_file, 'rb') as f:
+            # loads из байтов заметно быстрее, чем marshal.load из файла
+            data = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not _is_plan_data(data) or data.get('version') != PLAN_VERSION \
+            or data.get('action_dir') != str(action_dir):
+        return None
+    state = file_state(scenario_file)
+    if data.get('state') != state:
+        # Размер или mtime изменились - план годится, только если содержимое то же
+        if data.get('sha256') != hash_file(scenario_file):
+            return None
+        plan = ExecutionPlan(data['rows'], data['rr_names'], action_dir)
+        save_plan(scenario_file, action_dir, plan, state, data['sha256'])
+        return plan
+    return ExecutionPlan(data['rows'], data['rr_names'], action_dir)
+
+
+def prepare_scenario(scenario_file, action_dir, use_cache=None):
+    """Загружает и проверяет сценарий перед воспроизведением.
+
+    Возвращает (действия, дерево управляющих конструкций или None). Обычный
+    JSON-сценарий возвращается как ExecutionPlan (из кэша, если он действителен).
+    Ошибки сценария - PlanError или scenario_flow.FlowError.
+    """
+    scenario_file = Path(scenario_file)
+    if use_cache is None:
+        use_cache = get_config().get_plan_cache_enabled()
+    if use_cache:
+        plan = load_cached_plan(scenario_file, action_dir)
+        if plan is not None:
+            return plan, None
+
+    state = file_state(scenario_file)
+    digest = hash_file(scenario_file) if use_cache else None
+    try:
+        actions = load_scenario(scenario_file, action_dir)
+    except TypingParamsError as e:
+        raise PlanError([str(e)], scenario_file.name)
+    if has_control_flow(actions):
+        flow = compile_flow(actions, action_dir, scenario_file.name)
+        try:
+            validate_actions(flow_leaf_actions(flow), scenario_file.name)
+        except PlanError:
+            flow.close()
+            raise
+        return actions, flow
+    if not isinstance(actions, list):
+        # Параметризованный или двоичный сценарий читается лениво
+        if isinstance(actions, BinaryScenario):
+            try:
+                validate_binary_scenario(actions, scenario_file.name)
+            except PlanError:
+                actions.close()
+                raise
+        else:
+            validate_actions(unique_actions(actions), scenario_file.name)
+        return actions, None
+
+    plan = compile_plan(actions, action_dir, scenario_file.name)
+    if use_cache:
+        save_plan(scenario_file, action_dir, plan, state, digest)
+    return plan, None
+
+
+def close_scenario(actions, flow=None):
+    """Закрывает файлы двоичных сценариев (mmap), в том числе включенных в дерево.
+
+    На Windows открытое отображение не дает пересобрать тот же .lsc.
+    """
+    if isinstance(actions, BinaryScenario):
+        actions.close()
+    if flow is not None:
+        flow.close()
+
+
+class ScenarioCache:
+    """Подготовленные сценарии в памяти - для многих запусков в одном процессе (looper serve).
+
+    Запись действительна, пока не изменился файл сценария (и CSV
+    параметризованного сценария). Сценарии с управляющими конструкциями не
+    хранятся: их включаемые файлы могут меняться независимо.
+    """
+
+    def __init__(self):
+        self._entries = {}  # (путь, папка действия) -> (состояние файлов, (действия, дерево))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _state(scenario_file, actions):
+        state = [file_state(scenario_file)]
+        if isinstance(actions, ParameterizedScenario):
+            state.append(file_state(actions.typing_params_file))
+        return state
+
+    def get(self, scenario_file, action_dir):
+        """(действия, дерево) как prepare_scenario, из памяти, если файлы не менялись"""
+        key = (str(scenario_file), str(action_dir))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            state, prepared = entry
+            try:
+                if state == self._state(scenario_file, prepared[0]):
+                    return prepared
+            except OSError:
+                pass
+        prepared = prepare_scenario(scenario_file, action_dir)
+        actions, flow = prepared
+        if flow is None and not isinstance(actions, BinaryScenario):
+            with self._lock:
+                self._entries[key] = (self._state(scenario_file, actions), prepared)
+        return prepared
+
+    def __len__(self):
+        return len(self._entries)
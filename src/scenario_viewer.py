@@ -5,8 +5,11 @@
 
 import argparse
 import sys
+from itertools import islice
 from pathlib import Path
 from scenario_creator import ScenarioCreator
+from scenario_format import load_scenario
+from catalog import KIND_SCENARIO, get_catalog, scenario_info
 from config import get_config
 
 
@@ -19,13 +22,10 @@ def list_scenarios(action_name):
         print(f"Папка действия '{action_name}' не найдена")
         return
     
-    # Ищем файлы сценариев (все .json файлы кроме специальных)
-    scenario_files = []
-    for file in action_dir.glob("*.json"):
-        if file.name not in ["log.json", "actions_base.json"]:
-            scenario_files.append(file)
+    # Сценарии (все .json файлы кроме специальных) и их счетчики - из каталога
+    scenarios = get_catalog().scenarios(action_name)
     
-    if not scenario_files:
+    if not scenarios:
         print(f"Сценарии для действия '{action_name}' не найдены")
         return
     
@@ -33,11 +33,10 @@ def list_scenarios(action_name):
     print("-" * 50)
     
     try:
-        creator = ScenarioCreator(action_name)
-        
-        for scenario_file in sorted(scenario_files):
+        for entry in scenarios:
+            scenario_file = action_dir / entry['name']
             scenario_name = scenario_file.stem
-            info = creator.get_scenario_info(scenario_name)
+            info = scenario_info(entry, scenario_file)
             
             if info and 'error' not in info:
                 print(f"📁 {scenario_name}")
@@ -65,9 +64,7 @@ def show_scenario_details(action_name, scenario_name):
             print(f"Сценарий '{scenario_name}' для действия '{action_name}' не найден")
             return
         
-        import json
-        with open(scenario_file, 'r', encoding='utf-8') as f:
-            scenario_data = json.load(f)
+        scenario_data = load_scenario(scenario_file, cfg.get_action_path(action_name))
         
         info = creator.get_scenario_info(scenario_name)
         
@@ -90,7 +87,7 @@ def show_scenario_details(action_name, scenario_name):
         print("Последовательность действий:")
         print("-" * 30)
         
-        for i, action in enumerate(scenario_data[:10]):  # Показываем первые 10 действий
+        for i, action in enumerate(islice(scenario_data, 10)):  # Показываем первые 10 действий
             action_name = action.get('name', 'unknown')
             action_id = action.get('id', '')
             
@@ -138,25 +135,39 @@ def list_actions():
     print("Доступные действия:")
     print("-" * 30)
     
+    catalog = get_catalog()
     for action_dir in sorted(action_dirs):
         action_name = action_dir.name
-        has_log = (action_dir / "log.json").exists()
-        has_base = (action_dir / "actions_base.json").exists()
+        files = catalog.action_files(action_name)
+        has_log = cfg.get_log_file_path(action_name).name in files
+        base = files.get("actions_base.json")
         
         status_log = "✅" if has_log else "❌"
-        status_base = "✅" if has_base else "❌"
+        status_base = "✅" if base else "❌"
         
         print(f"📁 {action_name}")
         print(f"   Лог: {status_log}  Базовые действия: {status_base}")
+        if base and base['total'] is not None:
+            print(f"   Базовых действий: {base['total']}")
         
         # Считаем количество сценариев
-        scenario_files = [f for f in action_dir.glob("*.json") 
-                         if f.name not in ["log.json", "actions_base.json"]]
-        if scenario_files:
-            print(f"   Сценариев: {len(scenario_files)}")
+        scenarios = [entry for entry in files.values() if entry['kind'] == KIND_SCENARIO]
+        if scenarios:
+            print(f"   Сценариев: {len(scenarios)}")
         print()
 
 
+def render_cursor_screenshots(action_name, screens=None, output_dir=None):
+    """Строит скриншоты с отметкой курсора (xxx_c.png) по координатам из лога"""
+    from cursor_overlay import render_action_cursors
+    
+    output_dir = Path(output_dir) if output_dir else None
+    created = render_action_cursors(action_name, screens, output_dir)
+    for path in created:
+        print(f"Создан файл: {path}")
+    print(f"Скриншотов с курсором: {len(created)}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Утилита для просмотра и анализа сценариев looper",
@@ -177,6 +188,12 @@ def main():
     parser_details.add_argument('action_name', help='Имя действия')
     parser_details.add_argument('scenario_name', help='Имя сценария')
     
+    # Команда для построения скриншотов с курсором
+    parser_cursor = subparsers.add_parser('cursor', help='Построить скриншоты с отметкой курсора (xxx_c.png)')
+    parser_cursor.add_argument('action_name', help='Имя действия')
+    parser_cursor.add_argument('screens', nargs='*', help='Номера скриншотов (по умолчанию все)')
+    parser_cursor.add_argument('--output', '-o', metavar='DIR', help='Папка для файлов (по умолчанию папка действия)')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -190,6 +207,8 @@ def main():
             list_scenarios(args.action_name)
         elif args.command == 'details':
             show_scenario_details(args.action_name, args.scenario_name)
+        elif args.command == 'cursor':
+            render_cursor_screenshots(args.action_name, args.screens, args.output)
     
     except KeyboardInterrupt:
         print("\nПрерывание по запросу пользователя")
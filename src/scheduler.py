@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Планировщик ожиданий при воспроизведении.
+
+Ожидания отсчитываются по монотонным часам до абсолютного срока (deadline),
+а не суммированием коротких time.sleep, поэтому не накапливают погрешность.
+Ожидание прерывается сразу, как только установлено событие остановки
+(его выставляет обработчик ESC/F1).
+
+Планировщик также ведет записанный таймлайн - сумму записанных ожиданий - и
+считает отставание (drift) воспроизведения от него: время, которое ушло на
+клики, поиск и ввод сверх записанного. При включенной компенсации отставание
+вычитается из следующих ожиданий.
+
+Ожидание может закончиться раньше срока, если готова его цель (например,
+фоновый поиск нашел референсный прямоугольник следующего клика). Тогда
+записанное время служит верхней границей, а сэкономленное время
+запоминается по шагам.
+"""
+
+import threading
+import time
+
+
+class PlaybackScheduler:
+    """Ожидания по монотонным срокам с прерыванием по событию остановки"""
+
+    # Как часто проверяется готовность цели ожидания (остановка - без задержки)
+    READY_POLL = 0.01
+
+    def __init__(self, stop_event=None, compensate=False):
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.compensate = compensate
+        self.start_time = None
+        self.recorded_time = 0.0  # сколько времени прошло по записанному таймлайну
+        self.compensated_time = 0.0  # на сколько сокращены ожидания компенсацией
+        self.max_drift = 0.0
+        self.saved = []  # [(шаг, записанное время, фактическое время), ...]
+
+    def start(self):
+        """Начинает отсчет таймлайна воспроизведения"""
+        self.start_time = time.monotonic()
+        self.recorded_time = 0.0
+        self.compensated_time = 0.0
+        self.max_drift = 0.0
+        self.saved = []
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def stop(self):
+        """Прерывает текущее и все последующие ожидания"""
+        self.stop_event.set()
+
+    def elapsed(self):
+        """Реальное время с начала воспроизведения"""
+        if self.start_time is None:
+            return 0.0
+        return time.monotonic() - self.start_time
+
+    def drift(self):
+        """Отставание воспроизведения от записанного таймлайна (секунды, > 0 - отстаем)"""
+        return self.elapsed() - self.recorded_time
+
+    def sleep_until(self, deadline):
+        """Ждет до момента deadline (по time.monotonic). Возвращает False, если ожидание прервано"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return not self.stopped
+            if self.stop_event.wait(remaining):
+                return False
+
+    def sleep_until_ready(self, deadline, ready):
+        """Ждет до deadline или готовности ready (concurrent.futures.Future с непустым результатом).
+
+        Возвращает 'ready', 'deadline' или 'stopped'.
+        """
+        while True:
+            if ready.done():
+                if ready.exception() is None and ready.result():
+                    return 'ready'
+                # Цель не найдена: ждем записанное время до конца
+                return 'deadline' if self.sleep_until(deadline) else 'stopped'
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'stopped' if self.stopped else 'deadline'
+            if self.stop_event.wait(min(remaining, self.READY_POLL)):
+                return 'stopped'
+
+    def sleep(self, duration):
+        """Ждет duration секунд без учета таймлайна (например, пауза перед стартом)"""
+        return self.sleep_until(time.monotonic() + duration)
+
+    def wait(self, duration, ready=None, step=None):
+        """Выполняет записанное ожидание duration секунд.
+
+        Записанный таймлайн продвигается на duration. При компенсации ожидание
+        сокращается на текущее отставание (но не меньше нуля).
+        ready - Future цели ожидания: как только он завершен, ожидание
+        заканчивается, а экономия запоминается для шага step.
+        Возвращает False, если ожидание прервано.
+        """
+        if self.start_time is None:
+            self.start()
+
+        drift = self.drift()
+        self.max_drift = max(self.max_drift, drift)
+        self.recorded_time += duration
+
+        if self.compensate and drift > 0:
+            shortened = min(drift, duration)
+            self.compensated_time += shortened
+            duration -= shortened
+
+        started = time.monotonic()
+        deadline = started + duration
+        if ready is not None:
+            result = self.sleep_until_ready(deadline, ready)
+            if result == 'ready':
+                waited = time.monotonic() - started
+                # Цель готова: таймлайн продвигается только на фактическое ожидание
+                self.recorded_time -= duration - waited
+                self.saved.append((step, duration, waited))
+                return True
+            if result == 'deadline':
+                return True
+        elif self.sleep_until(deadline):
+            return True
+        # Прерванное ожидание учитываем в таймлайне только до момента остановки
+        self.recorded_time -= max(0.0, deadline - time.monotonic())
+        return False
+
+    def print_summary(self):
+        """Выводит отставание от записанного таймлайна"""
+        if self.start_time is None:
+            return
+        print(f"Время воспроизведения: {self.elapsed():.2f} с, по записанным ожиданиям: {self.recorded_time:.2f} с")
+        print(f"Отставание от записанного таймлайна: {self.drift() * 1000:.0f} мс "
+              f"(максимальное перед ожиданием: {self.max_drift * 1000:.0f} мс)")
+        if self.compensate:
+            print(f"Ожидания сокращены компенсацией на {self.compensated_time * 1000:.0f} мс")
+        if self.saved:
+            print("Ожидания, завершенные по появлению цели:")
+            for step, duration, waited in self.saved:
+                print(f"  шаг {step}: {waited:.2f} с из {duration:.2f} с (сэкономлено {duration - waited:.2f} с)")
+            total = sum(duration - waited for _, duration, waited in self.saved)
+            print(f"Всего сэкономлено: {total:.2f} с")
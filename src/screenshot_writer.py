@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Фоновая запись скриншотов во время записи действий.
+
+Обработчик событий pynput только захватывает кадр и кладет его в ограниченную
+очередь; кодирование PNG и запись на диск выполняют фоновые потоки
+(cv2.imwrite отпускает GIL). Если очередь заполнена, обработчик ждет
+освобождения места (back-pressure) не дольше timeout, после чего кадр
+отбрасывается. Счетчики выводятся в конце записи.
+"""
+
+import queue
+import threading
+import time
+
+import cv2
+
+# Сигнал завершения для потоков записи
+_STOP = object()
+
+
+class ScreenshotWriter:
+    """Пул потоков, сохраняющих кадры из ограниченной очереди"""
+
+    def __init__(self, max_queue=8, workers=2, timeout=2.0):
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.waits = 0  # сколько раз обработчику пришлось ждать места в очереди
+        self.wait_time = 0.0
+        self.max_depth = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"screenshot-writer-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, frame, path):
+        """Ставит кадр в очередь на запись. Кадр переходит во владение писателя.
+
+        Возвращает False, если кадр отброшен из-за переполненной очереди.
+        """
+        item = (frame, path)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            try:
+                self._queue.put(item, timeout=self.timeout)
+            except queue.Full:
+                with self._lock:
+                    self.waits += 1
+                    self.wait_time += time.perf_counter() - start
+                    self.dropped += 1
+                return False
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.queued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            frame, path = item
+            try:
+                saved = cv2.imwrite(str(path), frame)
+            except Exception as e:
+                print(f"Ошибка при сохранении скриншота {path}: {e}")
+                saved = False
+            else:
+                if not saved:
+                    # imwrite сообщает об ошибке записи только результатом
+                    print(f"Не удалось сохранить скриншот {path}")
+            with self._lock:
+                if saved:
+                    self.written += 1
+                else:
+                    self.errors += 1
+
+    def close(self):
+        """Дожидается записи всех кадров из очереди и останавливает потоки"""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def print_summary(self):
+        """Выводит счетчики записи скриншотов"""
+        print(f"Скриншоты: сохранено {self.written} из {self.queued}, отброшено {self.dropped}, "
+              f"ошибок записи {self.errors}")
+        print(f"Ожиданий места в очереди: {self.waits} ({self.wait_time * 1000:.0f} мс), "
+              f"максимальная длина очереди: {self.max_depth}")
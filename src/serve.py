@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Демон воспроизведения: looper serve.
+
+Процесс держит в памяти то, что looper -p каждый раз загружает заново:
+импорт cv2/numpy/pynput/win32, конфигурацию, подготовленные сценарии
+(scenario_plan.ScenarioCache) и декодированные шаблоны (кэш шаблонов).
+Задания воспроизведения принимаются по HTTP на localhost и выполняются по
+одному в порядке поступления; вместо паузы в 3 секунды перед каждым
+заданием выполняется проверка готовности экрана и ввода.
+
+API (JSON):
+    GET  /ready          200 {"ready": true} или 503, пока демон не готов
+                         (если экран был недоступен, проверяется заново)
+    GET  /status         состояние демона, текущее задание и очередь
+    GET  /jobs/<id>      состояние задания
+    POST /play           {"action": "open_notepad", "file": "my_scenario",
+                          "dynamic": true, "wait_for_target": null} -> {"job": {...}}
+    POST /stop           прерывает текущее задание; {"clear": true} - и очередь
+
+Запросы принимаются только с Host 127.0.0.1/localhost, POST - только с
+Content-Type: application/json (страница в браузере не может отправить такой
+запрос без разрешения CORS). action - имя папки действия, file - путь
+внутри нее.
+
+Клиент:
+    looper remote play ACTION [-f FILE] [--dynamic] [--wait]
+    looper remote stop [--clear] | status | ready
+"""
+
+import argparse
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import PurePosixPath, PureWindowsPath
+from socketserver import ThreadingMixIn
+from urllib import error, request
+
+from config import get_config
+from results import PLAYBACK_NOT_READY
+
+SERVE_HOST = '127.0.0.1'  # только локальные подключения
+ALLOWED_HOSTS = ('127.0.0.1', 'localhost')  # заголовок Host (защита от DNS rebinding)
+MAX_FINISHED_JOBS = 100  # сколько завершенных заданий хранится для /jobs/<id>
+READY_TIMEOUT = 5.0
+READY_PROBE_TIMEOUT = 1.0  # повторная проверка из /ready и /play
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_STOPPED = 'stopped'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_STOPPED)
+
+
+class Job:
+    """Задание воспроизведения"""
+
+    def __init__(self, job_id, action, actions_file=None, dynamic=False, wait_for_target=None):
+        self.id = job_id
+        self.action = action
+        self.actions_file = actions_file
+        self.dynamic = dynamic
+        self.wait_for_target = wait_for_target
+        self.state = JOB_QUEUED
+        self.error = None
+        self.result = None  # results.PlaybackResult.to_dict()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'action': self.action,
+            'file': self.actions_file,
+            'dynamic': self.dynamic,
+            'state': self.state,
+            'error': self.error,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'duration': self.finished - self.started if self.finished and self.started else None,
+            'result': self.result,
+        }
+
+
+def is_plain_name(name):
+    """Имя действия - одна папка: без разделителей пути и '..'"""
+    return (isinstance(name, str) and name not in ('', '.', '..')
+            and PureWindowsPath(name).name == name and PurePosixPath(name).name == name)
+
+
+def is_relative_file(name):
+    """Файл сценария - путь внутри папки действия: не абсолютный и без '..'"""
+    if not isinstance(name, str) or not name:
+        return False
+    path = PureWindowsPath(name)
+    return not path.anchor and not PurePosixPath(name).is_absolute() and '..' not in path.parts
+
+
+class PlaybackDaemon:
+    """Очередь заданий и поток, выполняющий их через play.play_actions"""
+
+    def __init__(self, preload=None):
+        self.preload = preload or []
+        self.ready = False
+        self.warmed_up = False
+        self.current = None
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._scenarios = None
+        self._control = None
+        self._play = None
+        self._worker = threading.Thread(target=self._run, name='playback', daemon=True)
+
+    def start(self):
+        self._worker.start()
+
+    def warm_up(self):
+        """Загружает модули воспроизведения и прогревает кэши до приема заданий"""
+        started = time.time()
+        import play
+        from scenario_format import unique_actions
+        from scenario_plan import ExecutionPlan, ScenarioCache
+        self._play = play
+        self._scenarios = ScenarioCache()
+        self._control = play.PlaybackControl()
+        cfg = get_config()
+        for action_name in self.preload:
+            # Базовые действия: декомпозиция по кэшу, план и шаблоны в памяти
+            actions_file = cfg.get_actions_base_file_path(action_name)
+            if not play.create_actions_base_if_needed(action_name, actions_file):
+                print(f"{action_name}: нет базовых действий, пропускаем")
+                continue
+            try:
+                actions, _ = self._scenarios.get(actions_file, cfg.get_action_path(action_name))
+                steps = actions.asset_steps if isinstance(actions, ExecutionPlan) else unique_actions(actions)
+                play.preload_reference_rectangles(steps, cfg.get_action_path(action_name))
+            except Exception as e:
+                print(f"{action_name}: не удалось подготовить ({e})")
+        self.ready = play.wait_until_ready(READY_TIMEOUT, self._control)
+        self.warmed_up = True
+        print(f"Демон {'готов' if self.ready else 'не готов'} за {time.time() - started:.1f} с")
+
+    def check_ready(self):
+        """Готовность с повторной проверкой: экран мог быть недоступен при прогреве
+        (сеанс заблокирован, RDP отключен) и стать доступным позже"""
+        if self.ready or not self.warmed_up or self.current is not None:
+            return self.ready
+        with self._probe_lock:
+            if not self.ready:
+                self.ready = self._play.wait_until_ready(READY_PROBE_TIMEOUT, self._play.PlaybackControl())
+        return self.ready
+
+    def submit(self, action, actions_file=None, dynamic=False, wait_for_target=None):
+        job = Job(next(self._ids), action, actions_file, dynamic, wait_for_target)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        self._queue.put(job)
+        return job
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def stop(self, clear=False):
+        """Прерывает текущее задание; clear - снимает и задания в очереди"""
+        cleared = 0
+        if clear:
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                job.state = JOB_STOPPED
+                job.finished = time.time()
+                cleared += 1
+        job = self.current
+        if job is not None and self._control is not None:
+            self._control.stop()
+        return job, cleared
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self):
+        with self._lock:
+            queued = [job.to_dict() for job in self._jobs.values() if job.state == JOB_QUEUED]
+        return {
+            'ready': self.ready,
+            'state': 'playing' if self.current is not None else 'idle',
+            'current': self.current.to_dict() if self.current is not None else None,
+            'queue': queued,
+            'scenarios_cached': len(self._scenarios) if self._scenarios is not None else 0,
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.state != JOB_QUEUED:
+                continue
+            # Сброс до публикации current: /stop, пришедший во время подготовки
+            # сценария, не теряется
+            self._control.reset()
+            self.current = job
+            job.state = JOB_RUNNING
+            job.started = time.time()
+            try:
+                result = self._play.run_playback(job.action, job.actions_file, job.dynamic,
+                                                 wait_for_target=job.wait_for_target, start_delay=0,
+                                                 scenarios=self._scenarios, control=self._control,
+                                                 reset=False)
+                job.result = result.to_dict()
+                # Итог задания - свежая проверка готовности экрана и ввода
+                self.ready = result.status != PLAYBACK_NOT_READY
+                if self._control.stopped:
+                    job.state = JOB_STOPPED
+                else:
+                    job.state = JOB_DONE if result.success else JOB_FAILED
+                job.error = result.error
+            except Exception as e:
+                job.state = JOB_FAILED
+                job.error = str(e)
+                print(f"Ошибка задания {job.id}: {e}")
+            job.finished = time.time()
+            self.current = None
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API демона (см. описание модуля)"""
+
+    daemon = None  # PlaybackDaemon, задается в serve()
+
+    def log_message(self, format, *args):
+        # Запросы не засоряют вывод воспроизведения
+        pass
+
+    def _send(self, code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _host_allowed(self):
+        host = (self.headers.get('Host') or '').strip().lower()
+        if host.startswith('['):
+            return False
+        return host.rsplit(':', 1)[0] in ALLOWED_HOSTS
+
+    def _is_json(self):
+        content_type = self.headers.get('Content-Type') or ''
+        return content_type.split(';', 1)[0].strip().lower() == 'application/json'
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError("ожидается объект JSON")
+        return data
+
+    def do_GET(self):
+        daemon = self.daemon
+        if not self._host_allowed():
+            self._send(403, {'error': 'запросы принимаются только для 127.0.0.1/localhost'})
+            return
+        if self.path == '/ready':
+            ready = daemon.check_ready()
+            self._send(200 if ready else 503, {'ready': ready})
+        elif self.path == '/status':
+            self._send(200, daemon.status())
+        elif self.path.startswith('/jobs/'):
+            try:
+                job = daemon.job(int(self.path[len('/jobs/'):]))
+            except ValueError:
+                job = None
+            if job is None:
+                self._send(404, {'error': 'задание не найдено'})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {'error': f'неизвестный адрес {self.path}'})
+
+    def do_POST(self):
+        daemon = self.daemon
+        if not self._host_allowed():
+            self._send(403, {'error': 'запросы принимаются только для 127.0.0.1/localhost'})
+            return
+        if not self._is_json():
+            self._send(415, {'error': 'ожидается Content-Type: application/json'})
+            return
+        try:
+            data = self._read_json()
+        except ValueError as e:
+            self._send(400, {'error': f'неверный запрос: {e}'})
+            return
+        if self.path == '/play':
+            action = data.get('action')
+            if not is_plain_name(action):
+                self._send(400, {'error': "'action' должен быть именем папки действия"})
+                return
+            actions_file = data.get('file')
+            if actions_file is not None and not is_relative_file(actions_file):
+                self._send(400, {'error': "'file' должен быть путем внутри папки действия"})
+                return
+            if not daemon.check_ready():
+                self._send(503, {'error': 'демон не готов'})
+                return
+            job = daemon.submit(action, actions_file, bool(data.get('dynamic')),
+                                data.get('wait_for_target'))
+            self._send(202, {'job': job.to_dict()})
+        elif self.path == '/stop':
+            job, cleared = daemon.stop(bool(data.get('clear')))
+            self._send(200, {'stopped': job.to_dict() if job else None, 'cleared': cleared})
+        else:
+            self._send(404, {'error': f'неизвестный адрес {self.path}'})
+
+
+def serve(port=None, preload=None):
+    """Запускает демон и обслуживает запросы до Ctrl+C"""
+    if port is None:
+        port = get_config().get_serve_port()
+    daemon = PlaybackDaemon(preload)
+    handler = type('Handler', (DaemonRequestHandler,), {'daemon': daemon})
+    server = ThreadingHTTPServer((SERVE_HOST, port), handler)
+    print(f"Демон воспроизведения: http://{SERVE_HOST}:{port}")
+
+    def prepare():
+        # Пока идет прогрев, /ready отвечает 503, а задания не принимаются
+        daemon.warm_up()
+        daemon.start()
+
+    threading.Thread(target=prepare, name='warm-up', daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nОстановка демона")
+        daemon.stop(clear=True)
+    finally:
+        server.server_close()
+
+
+class DaemonClient:
+    """Тонкий клиент HTTP API демона"""
+
+    def __init__(self, port=None, timeout=10):
+        if port is None:
+            port = get_config().get_serve_port()
+        self.base_url = f"http://{SERVE_HOST}:{port}"
+        self.timeout = timeout
+
+    def _request(self, path, data=None):
+        body = None
+        headers = {}
+        if data is not None:
+            body = json.dumps(data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = request.Request(self.base_url + path, data=body, headers=headers,
+                              method='POST' if data is not None else 'GET')
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read().decode('utf-8'))
+        except error.HTTPError as e:
+            return e.code, json.loads(e.read().decode('utf-8') or '{}')
+
+    def ready(self):
+        return self._request('/ready')[1].get('ready', False)
+
+    def status(self):
+        return self._request('/status')[1]
+
+    def job(self, job_id):
+        return self._request(f'/jobs/{job_id}')[1]
+
+    def play(self, action, actions_file=None, dynamic=False, wait_for_target=None):
+        """Ставит задание в очередь. Возвращает словарь задания; ошибка - RuntimeError"""
+        code, data = self._request('/play', {'action': action, 'file': actions_file, 'dynamic': dynamic,
+                                             'wait_for_target': wait_for_target})
+        if code != 202:
+            raise RuntimeError(data.get('error', f'код ответа {code}'))
+        return data['job']
+
+    def wait(self, job_id, poll=0.2):
+        """Ждет завершения задания и возвращает его итоговое состояние"""
+        while True:
+            job = self.job(job_id)
+            if job.get('state') in FINISHED_STATES or 'state' not in job:
+                return job
+            time.sleep(poll)
+
+    def stop(self, clear=False):
+        return self._request('/stop', {'clear': clear})[1]
+
+
+def client_main(argv=None):
+    """looper remote ... - команды демону. Возвращает код выхода"""
+    parser = argparse.ArgumentParser(prog='looper remote', description="Команды демону looper serve")
+    parser.add_argument('--port', type=int, default=None, help='Порт демона (по умолчанию SERVE_PORT)')
+    commands = parser.add_subparsers(dest='command')
+    play_parser = commands.add_parser('play', help='Поставить воспроизведение в очередь')
+    play_parser.add_argument('action', metavar='ACTION_NAME')
+    play_parser.add_argument('--actions-file', '-f', metavar='FILENAME')
+    play_parser.add_argument('--dynamic', action='store_true')
+    play_parser.add_argument('--wait-for-target', action='store_true', default=None)
+    play_parser.add_argument('--wait', action='store_true', help='Дождаться завершения задания')
+    stop_parser = commands.add_parser('stop', help='Прервать текущее задание')
+    stop_parser.add_argument('--clear', action='store_true', help='Снять и задания в очереди')
+    commands.add_parser('status', help='Состояние демона')
+    commands.add_parser('ready', help='Проверка готовности (код выхода 0 - готов)')
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return 1
+
+    client = DaemonClient(args.port)
+    try:
+        if args.command == 'ready':
+            ready = client.ready()
+            print("Готов" if ready else "Не готов")
+            return 0 if ready else 1
+        if args.command == 'status':
+            print(json.dumps(client.status(), ensure_ascii=False, indent=2))
+            return 0
+        if args.command == 'stop':
+            print(json.dumps(client.stop(args.clear), ensure_ascii=False, indent=2))
+            return 0
+        job = client.play(args.action, args.actions_file, args.dynamic, args.wait_for_target)
+        print(f"Задание {job['id']} поставлено в очередь")
+        if not args.wait:
+            return 0
+        job = client.wait(job['id'])
+        duration = job.get('duration')
+        print(f"Задание {job['id']}: {job.get('state')}" + (f" за {duration:.2f} с" if duration else ""))
+        return 0 if job.get('state') == JOB_DONE else 1
+    except (error.URLError, ConnectionError) as e:
+        print(f"Демон недоступен ({client.base_url}): {e}")
+        return 1
+    except RuntimeError as e:
+        print(f"Ошибка: {e}")
+        return 1
+
+
+def main(argv=None):
+    """looper serve [--port N] [--preload ACTION ...]"""
+    parser = argparse.ArgumentParser(prog='looper serve', description="Демон воспроизведения looper")
+    parser.add_argument('--port', type=int, default=None, help='Порт (по умолчанию SERVE_PORT)')
+    parser.add_argument('--preload', nargs='*', default=[], metavar='ACTION_NAME',
+                        help='Заранее подготовить базовые действия и шаблоны этих действий')
+    args = parser.parse_args(argv)
+    serve(args.port, args.preload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Кэш декодированных референсных прямоугольников (*_rr.png) для динамического режима
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+
+from config import get_config
+
+
+class TemplateCache:
+    """LRU-кэш шаблонов, ключ - путь к файлу и его mtime.
+
+    Изображение декодируется один раз; при изменении файла на диске (другой mtime)
+    старая запись вытесняется. Общий объем ограничен max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (path, mtime, flags) -> ndarray
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(path, flags):
+        path = Path(path)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return None
+        return (str(path.resolve()), mtime, flags)
+
+    def get(self, path, flags=cv2.IMREAD_COLOR):
+        """Возвращает шаблон (ndarray, по умолчанию BGR) из кэша, при необходимости декодирует файл"""
+        key = self._make_key(path, flags)
+        if key is None:
+            return None
+
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+
+        template = cv2.imread(str(path), flags)
+        if template is None:
+            return None
+
+        with self._lock:
+            self.misses += 1
+            self._put(key, template)
+        return template
+
+    def _put(self, key, template):
+        # Удаляем устаревшие версии того же файла
+        for old_key in [k for k in self._entries if k[0] == key[0] and k[1] != key[1]]:
+            self.current_bytes -= self._entries.pop(old_key).nbytes
+
+        if key in self._entries:
+            return
+
+        self._entries[key] = template
+        self.current_bytes += template.nbytes
+
+        # Вытесняем самые давно использованные записи
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+    def preload(self, paths, flags=cv2.IMREAD_COLOR):
+        """Декодирует все переданные шаблоны заранее. Возвращает число загруженных"""
+        loaded = 0
+        for path in paths:
+            if self.get(path, flags) is not None:
+                loaded += 1
+        return loaded
+
+    def clear(self):
+        """Очищает кэш"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Глобальный экземпляр кэша (живет все время работы процесса)
+_template_cache = None
+
+
+def get_template_cache():
+    """Возвращает глобальный экземпляр кэша шаблонов"""
+    global _template_cache
+    if _template_cache is None:
+        max_mb = get_config().get_template_cache_size()
+        _template_cache = TemplateCache(max_bytes=max_mb * 1024 * 1024)
+    return _template_cache